@@ -0,0 +1,121 @@
+"""Import time of the entry points (python -X importtime) and which heavy dependencies they load.
+
+Each entry point is imported in a fresh interpreter --repeat times and the fastest total is kept.
+With --check the script fails (exit 1) if an entry point loads a heavy dependency it should not
+need. Give an earlier result as --baseline to also fail if an entry point got slower than
+--tolerance times the baseline.
+
+    python benchmarks/bench_import_time.py --output baseline.json
+    python benchmarks/bench_import_time.py --check --baseline baseline.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = (
+    'flet',
+    'requests',
+    'polars',
+    'pandas',
+    'sharkadm',
+    'sharkadm.controller',
+    'sharkadm.transformers',
+    'sharkadm.exporters',
+    'sharkadm.validators',
+    'sharkadm.multi_transformers',
+)
+
+# Entry point -> heavy modules it is allowed to load when imported
+ENTRY_POINTS = {
+    'sharkadm_zip_publisher': (),
+    'sharkadm_zip_publisher.cli': (),
+    'sharkadm_zip_publisher.archive_remover': (),
+    'sharkadm_zip_publisher.config_publisher': (),
+    'sharkadm_zip_publisher.async_trigger': (),
+    'sharkadm_zip_publisher.flet_app': ('flet',),
+}
+
+
+def parse_importtime(stderr: str) -> tuple[float, set[str]]:
+    """Returns total import time in seconds and the names of all imported modules"""
+    total_us = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        if not name[1:].startswith(' '):
+            # Top level import (not nested in another import)
+            total_us += int(cumulative)
+    return total_us / 1e6, modules
+
+
+def measure(module: str, repeat: int) -> dict:
+    best = None
+    modules = set()
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                              capture_output=True, text=True)
+        if proc.returncode:
+            return dict(error=proc.stderr.strip().splitlines()[-1])
+        seconds, modules = parse_importtime(proc.stderr)
+        best = seconds if best is None else min(best, seconds)
+    heavy = sorted(name for name in HEAVY_MODULES if name in modules)
+    return dict(seconds=round(best, 4), nr_modules=len(modules), heavy_modules=heavy)
+
+
+def check(result: dict) -> list[str]:
+    problems = []
+    for module, allowed in ENTRY_POINTS.items():
+        info = result['entry_points'].get(module, {})
+        if 'error' in info:
+            problems.append(f'{module}: {info["error"]}')
+            continue
+        not_allowed = [name for name in info.get('heavy_modules', []) if name not in allowed]
+        if not_allowed:
+            problems.append(f'{module} imports {", ".join(not_allowed)}')
+    return problems
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for module, info in result['entry_points'].items():
+        old = baseline.get('entry_points', {}).get(module, {}).get('seconds')
+        new = info.get('seconds')
+        if old and new and new > old * tolerance:
+            regressions.append(f'{module}: {old} s -> {new} s')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='Save the result as json')
+    parser.add_argument('--check', action='store_true',
+                        help='Fail if an entry point imports heavy dependencies it does not need')
+    parser.add_argument('--baseline', help='Earlier result to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.5)
+    args = parser.parse_args()
+
+    result = dict(python=sys.version.split()[0],
+                  entry_points={module: measure(module, args.repeat) for module in ENTRY_POINTS})
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as fid:
+            json.dump(result, fid, indent=2)
+    print(json.dumps(result, indent=2))
+
+    problems = check(result) if args.check else []
+    if args.baseline:
+        with open(args.baseline, encoding='utf8') as fid:
+            baseline = json.load(fid)
+        problems.extend(compare(result, baseline, args.tolerance))
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Throughput of ArchivePublisher on synthetic SHARK packages.
+
+Times update_zip_archives and copy_archives_to_sharkdata for each data type and size, with and
+without restricted data. The result (including the slowest transformers from the profiler) is saved
+as json. Give an earlier result as --baseline to fail (exit 1) if any stage got slower than
+--tolerance times the baseline.
+
+    python benchmarks/bench_publisher.py --nr-rows 1000 --nr-rows 100000 --output baseline.json
+    python benchmarks/bench_publisher.py --nr-rows 1000 --nr-rows 100000 --baseline baseline.json
+    python benchmarks/bench_publisher.py --data-type profile --nr-rows 5000000 --received-data-mb 500
+
+Generated packages are kept in --packages-directory (default in the temp directory) and reused.
+"""
+import argparse
+import json
+import pathlib
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from sharkadm import utils as sharkadm_utils
+
+from sharkadm_zip_publisher.archive_publisher import ArchivePublisher
+from sharkadm_zip_publisher.profiling import get_peak_rss
+
+import synthetic_packages
+
+DEFAULT_NR_ROWS = [1_000, 100_000, 1_000_000, 5_000_000]
+STAGES = ['update_seconds', 'copy_seconds']
+MIN_SECONDS_TO_COMPARE = 0.5
+
+
+def get_package(directory: pathlib.Path, data_type: str, nr_rows: int, received_data_mb: float) -> pathlib.Path:
+    sub_directory = directory / f'received_{received_data_mb:g}mb'
+    path = sub_directory / synthetic_packages.get_package_name(data_type, nr_rows)
+    if path.exists():
+        return path
+    return synthetic_packages.create_package(sub_directory, data_type, nr_rows, received_data_mb=received_data_mb)
+
+
+def run_case(path: pathlib.Path, restrict_data: bool, fused_restriction: bool, nr_processes: int) -> dict:
+    sharkadm_utils.clear_all_in_temp_directory()
+    with tempfile.TemporaryDirectory() as directory:
+        sharkdata_directory = pathlib.Path(directory) / 'sharkdata'
+        zip_directory = pathlib.Path(directory) / 'zip'
+        sharkdata_directory.mkdir()
+        zip_directory.mkdir()
+        publisher = ArchivePublisher(
+            sharkdata_dataset_directory=str(sharkdata_directory),
+            zip_directory=str(zip_directory),
+            trigger_url='',
+            import_url='',
+            restrict_data=restrict_data,
+            nr_processes=nr_processes,
+            fused_restriction=fused_restriction,
+            profile=True,
+        )
+        publisher.set_zip_archive_paths(path)
+
+        t0 = time.perf_counter()
+        publisher.update_zip_archives()
+        update_seconds = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        publisher.copy_archives_to_sharkdata()
+        copy_seconds = time.perf_counter() - t0
+
+        rezipped = list(sharkdata_directory.iterdir())
+        return dict(
+            update_seconds=round(update_seconds, 4),
+            copy_seconds=round(copy_seconds, 4),
+            package_mb=round(path.stat().st_size / 1024 / 1024, 3),
+            rezipped_mb=round(sum(p.stat().st_size for p in rezipped) / 1024 / 1024, 3),
+            slowest_steps=publisher.profiler.get_summary()[:5],
+        )
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for key, case in result['cases'].items():
+        base_case = baseline.get('cases', {}).get(key)
+        if not base_case:
+            continue
+        for stage in STAGES:
+            new, old = case[stage], base_case.get(stage)
+            if old is None or max(new, old) < MIN_SECONDS_TO_COMPARE:
+                continue
+            if new > old * tolerance:
+                regressions.append(f'{key} {stage}: {old:.3f} s -> {new:.3f} s')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-type', choices=sorted(synthetic_packages.DATA_TYPES), action='append',
+                        help='Default is all data types')
+    parser.add_argument('--nr-rows', type=int, action='append',
+                        help=f'Default is {DEFAULT_NR_ROWS}')
+    parser.add_argument('--received-data-mb', type=float, default=0,
+                        help='Size of (incompressible) files in received_data')
+    parser.add_argument('--mode', choices=['unrestricted', 'restricted', 'restricted_fused'], action='append',
+                        help='Default is unrestricted and restricted')
+    parser.add_argument('--nr-processes', type=int, default=1)
+    parser.add_argument('--packages-directory',
+                        default=str(pathlib.Path(tempfile.gettempdir()) / 'sharkadm_zip_publisher_bench'))
+    parser.add_argument('--output', help='Save the result as json to this file')
+    parser.add_argument('--baseline', help='Earlier result to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    parser.add_argument('--remove-packages', action='store_true', help='Remove the generated packages afterwards')
+    args = parser.parse_args()
+
+    packages_directory = pathlib.Path(args.packages_directory)
+    result = dict(
+        python=platform.python_version(),
+        platform=platform.platform(),
+        nr_processes=args.nr_processes,
+        received_data_mb=args.received_data_mb,
+        cases={},
+    )
+    try:
+        for data_type in args.data_type or sorted(synthetic_packages.DATA_TYPES):
+            for nr_rows in args.nr_rows or DEFAULT_NR_ROWS:
+                path = get_package(packages_directory, data_type, nr_rows, args.received_data_mb)
+                for mode in args.mode or ['unrestricted', 'restricted']:
+                    key = f'{data_type}_{nr_rows}_{mode}'
+                    case = run_case(path,
+                                    restrict_data=mode != 'unrestricted',
+                                    fused_restriction=mode == 'restricted_fused',
+                                    nr_processes=args.nr_processes)
+                    # High-water mark of the whole benchmark process so far
+                    case['process_peak_rss_mb'] = round((get_peak_rss() or 0) / 1024 / 1024, 1)
+                    result['cases'][key] = case
+                    print(f'{key}: update {case["update_seconds"]:.3f} s, copy {case["copy_seconds"]:.3f} s',
+                          file=sys.stderr)
+    finally:
+        if args.remove_packages:
+            shutil.rmtree(packages_directory, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as fid:
+            json.dump(result, fid, indent=2)
+    print(json.dumps(result, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf8') as fid:
+            baseline = json.load(fid)
+        regressions = compare(result, baseline, args.tolerance)
+        for line in regressions:
+            print(f'Regression: {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
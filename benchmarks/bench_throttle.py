@@ -0,0 +1,116 @@
+"""Wall clock time of the publish loop for a batch of packages with and without the throttle.
+
+The real loop (update_zip_archives and copy_archives_to_sharkdata one package at a time, clearing
+the temp directory every 20 packages as in the GUI and the cli) is run on --nr-packages synthetic
+packages in each mode:
+
+    legacy       the old fixed sleep of --legacy-sleep seconds per package
+    no_throttle  Throttle() (the default, no limit)
+    throttle     Throttle(--max-packages-per-minute)
+
+All modes are measured, so the legacy mode takes at least nr_packages * legacy_sleep seconds.
+
+    python benchmarks/bench_throttle.py --nr-packages 100
+    python benchmarks/bench_throttle.py --nr-packages 100 --mode no_throttle --mode throttle
+"""
+import argparse
+import json
+import pathlib
+import shutil
+import sys
+import tempfile
+import time
+
+from sharkadm import utils as sharkadm_utils
+
+from sharkadm_zip_publisher.archive_publisher import ArchivePublisher
+from sharkadm_zip_publisher.throttle import Throttle
+
+import synthetic_packages
+
+MODES = ['legacy', 'no_throttle', 'throttle']
+
+
+def create_packages(directory: pathlib.Path, data_type: str, nr_rows: int, nr_packages: int) -> list[pathlib.Path]:
+    """One synthetic package copied to nr_packages different names"""
+    template = synthetic_packages.create_package(directory / 'template', data_type, nr_rows)
+    paths = []
+    for nr in range(nr_packages):
+        path = directory / template.name.replace(f'_BENCH{nr_rows}_', f'_BENCH{nr_rows}N{nr}_')
+        shutil.copy2(template, path)
+        paths.append(path)
+    return paths
+
+
+def run_loop(paths: list[pathlib.Path], wait, directory: pathlib.Path) -> dict:
+    sharkdata_directory = directory / 'sharkdata'
+    zip_directory = directory / 'zip'
+    shutil.rmtree(sharkdata_directory, ignore_errors=True)
+    shutil.rmtree(zip_directory, ignore_errors=True)
+    sharkdata_directory.mkdir()
+    zip_directory.mkdir()
+    sharkadm_utils.clear_all_in_temp_directory()
+    publisher = ArchivePublisher(
+        sharkdata_dataset_directory=str(sharkdata_directory),
+        zip_directory=str(zip_directory),
+        trigger_url='',
+        import_url='',
+        restrict_data=False,
+    )
+    wait_seconds = 0.0
+    next_clear_nr = 20
+    t0 = time.perf_counter()
+    for nr, path in enumerate(paths):
+        t_wait = time.perf_counter()
+        wait()
+        wait_seconds += time.perf_counter() - t_wait
+        if nr >= next_clear_nr:
+            sharkadm_utils.clear_all_in_temp_directory()
+            next_clear_nr = nr + 20
+        publisher.set_zip_archive_paths(path)
+        publisher.update_zip_archives()
+        publisher.copy_archives_to_sharkdata()
+    seconds = time.perf_counter() - t0
+    publisher.close()
+    return dict(seconds=round(seconds, 3),
+                wait_seconds=round(wait_seconds, 3),
+                packages_per_minute=round(60 * len(paths) / seconds, 2))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nr-packages', type=int, default=100)
+    parser.add_argument('--nr-rows', type=int, default=1000)
+    parser.add_argument('--data-type', choices=sorted(synthetic_packages.DATA_TYPES), default='physicalchemical')
+    parser.add_argument('--mode', choices=MODES, action='append', help=f'Default is {MODES}')
+    parser.add_argument('--legacy-sleep', type=float, default=2.0,
+                        help='Fixed sleep per package in the legacy mode')
+    parser.add_argument('--max-packages-per-minute', type=float, default=600)
+    parser.add_argument('--output', help='Save the result as json')
+    args = parser.parse_args()
+
+    waits = dict(
+        legacy=lambda: time.sleep(args.legacy_sleep),
+        no_throttle=Throttle().wait,
+        throttle=Throttle(max_per_minute=args.max_packages_per_minute).wait,
+    )
+    result = dict(nr_packages=args.nr_packages,
+                  nr_rows=args.nr_rows,
+                  data_type=args.data_type,
+                  legacy_sleep=args.legacy_sleep,
+                  max_packages_per_minute=args.max_packages_per_minute,
+                  modes={})
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        paths = create_packages(directory / 'packages', args.data_type, args.nr_rows, args.nr_packages)
+        for mode in args.mode or MODES:
+            result['modes'][mode] = run_loop(paths, waits[mode], directory)
+            print(f'{mode}: {result["modes"][mode]["seconds"]} s', file=sys.stderr)
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as fid:
+            json.dump(result, fid, indent=2)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
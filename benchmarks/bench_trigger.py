@@ -0,0 +1,118 @@
+"""Round trips and TCP connections per import trigger against a local stub of the sharkdata API.
+
+Compares the old way (requests.get twice for the status and requests.post, each with a new
+connection) with Trigger (one status request per check over a pooled keep-alive session).
+
+    python benchmarks/bench_trigger.py --nr-triggers 50
+    python benchmarks/bench_trigger.py --nr-triggers 50 --latency 0.02
+"""
+import argparse
+import http.server
+import json
+import socket
+import threading
+import time
+
+import requests
+
+from sharkadm_zip_publisher.trigger import Trigger
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.latency = latency
+        self.nr_connections = 0
+        self.nr_requests = 0
+        self._lock = threading.Lock()
+
+    def count(self, connection: bool = False) -> None:
+        with self._lock:
+            if connection:
+                self.nr_connections += 1
+            else:
+                self.nr_requests += 1
+
+    def reset(self) -> None:
+        self.nr_connections = 0
+        self.nr_requests = 0
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately. Avoid Nagle + delayed ack on the kept alive connection
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.count(connection=True)
+
+    def _respond(self, body: bytes) -> None:
+        self.server.count()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(b'AVAILABLE')
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self._respond(b'OK')
+
+    def log_message(self, *args):
+        pass
+
+
+def legacy_trigger(status_url: str, trigger_url: str) -> None:
+    print(f'{requests.get(status_url).content.decode()=}')
+    if requests.get(status_url).content.decode() != 'AVAILABLE':
+        raise RuntimeError('Not available')
+    requests.post(trigger_url)
+
+
+def run(server: StubServer, nr_triggers: int, func) -> dict:
+    server.reset()
+    t0 = time.perf_counter()
+    for _ in range(nr_triggers):
+        func()
+    seconds = time.perf_counter() - t0
+    return dict(seconds=round(seconds, 4),
+                requests=server.nr_requests,
+                connections=server.nr_connections,
+                ms_per_trigger=round(1000 * seconds / nr_triggers, 3))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nr-triggers', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help='Server side delay per request in seconds')
+    args = parser.parse_args()
+
+    server = StubServer(latency=args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    status_url = f'{server.url}/status'
+    trigger_url = f'{server.url}/trigger'
+    try:
+        result = dict(nr_triggers=args.nr_triggers, latency=args.latency)
+        result['legacy'] = run(server, args.nr_triggers, lambda: legacy_trigger(status_url, trigger_url))
+        trigger = Trigger(trigger_url=trigger_url, status_url=status_url)
+        result['trigger'] = run(server, args.nr_triggers, trigger.trigger_import)
+    finally:
+        server.shutdown()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Regression check: shark_data.txt written by PolarsSHARKdataTxtExporter must be byte-identical to
+the sharkadm pandas path (ConvertFromPolarsToPandas + SHARKdataTxtAsGiven).
+
+    python benchmarks/compare_exporters.py path/to/SHARK_*.zip
+
+Prints the export time of both paths and exits with 1 if any package differs.
+"""
+import argparse
+import json
+import pathlib
+import sys
+import tempfile
+import time
+
+from sharkadm import controller, exporters, transformers
+from sharkadm.data import get_polars_zip_archive_data_holder
+
+from sharkadm_zip_publisher.polars_exporter import PolarsSHARKdataTxtExporter
+
+
+def compare(path: pathlib.Path, directory: pathlib.Path) -> dict:
+    data_holder = get_polars_zip_archive_data_holder(path)
+    cont = controller.SHARKadmPolarsController()
+    cont.set_data_holder(data_holder)
+    data = cont.data
+    result = dict(package=path.name, rows=len(data), can_export=PolarsSHARKdataTxtExporter.can_export(data))
+    if not result['can_export']:
+        return result
+
+    polars_path = directory / f'{path.stem}_polars.txt'
+    t0 = time.perf_counter()
+    PolarsSHARKdataTxtExporter(polars_path, encoding='cp1252').export(data)
+    result['polars_seconds'] = time.perf_counter() - t0
+
+    pandas_path = directory / f'{path.stem}_pandas.txt'
+    t0 = time.perf_counter()
+    cont.transform(transformers.ConvertFromPolarsToPandas())
+    cont.export(exporters.SHARKdataTxtAsGiven(encoding='cp1252',
+                                              export_directory=directory,
+                                              export_file_name=pandas_path))
+    result['pandas_seconds'] = time.perf_counter() - t0
+    result['identical'] = polars_path.read_bytes() == pandas_path.read_bytes()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('zip_files', nargs='+')
+    args = parser.parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for path in args.zip_files:
+            results.append(compare(pathlib.Path(path), pathlib.Path(directory)))
+    print(json.dumps(results, indent=2))
+    if any(result.get('identical') is False for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
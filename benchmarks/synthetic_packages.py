@@ -0,0 +1,228 @@
+"""Synthetic SHARK zip packages of controllable size for the benchmarks.
+
+The packages have the layout of the packages on the data host (shark_data.txt, shark_metadata.txt,
+processed_data/ and received_data/) with made up but plausible values. They are meant for timing,
+not for checking transformer results.
+
+    python benchmarks/synthetic_packages.py output_dir --data-type physicalchemical --nr-rows 100000
+"""
+import argparse
+import os
+import pathlib
+import zipfile
+
+import polars as pl
+
+DATA_TYPES = {
+    'physicalchemical': dict(
+        delivery_datatype='Physical and Chemical',
+        name='PhysicalChemical',
+        parameters=[('Temperature CTD', 'C'), ('Salinity CTD', 'o/oo psu'), ('Secchi depth', 'm'),
+                    ('Dissolved oxygen O2 bottle', 'ml/l'), ('Phosphate PO4-P', 'umol/l')],
+        extra_columns=['secchi_depth_m', 'secchi_depth_quality_flag'],
+    ),
+    'epibenthos': dict(
+        delivery_datatype='Epibenthos',
+        name='Epibenthos',
+        parameters=[('Cover', '%'), ('Section sediment cover', '%'), ('Sand cover', '%'),
+                    ('Silt cover', '%'), ('Abundance class', 'classes')],
+        extra_columns=['transect_min_depth_m', 'transect_max_depth_m', 'section_start_depth_m',
+                       'section_end_depth_m', 'scientific_name', 'reported_scientific_name'],
+    ),
+    'profile': dict(
+        delivery_datatype='Profile',
+        name='Profile',
+        parameters=[('Temperature CTD', 'C'), ('Salinity CTD', 'o/oo psu'), ('Pressure CTD', 'dbar')],
+        extra_columns=[],
+    ),
+    'phytoplankton': dict(
+        delivery_datatype='Phytoplankton',
+        name='Phytoplankton',
+        parameters=[('Abundance', 'ind/l'), ('Biovolume concentration', 'mm3/l'),
+                    ('Carbon concentration', 'ugC/l')],
+        extra_columns=['scientific_name', 'reported_scientific_name', 'sampled_volume_l'],
+    ),
+    'zoobenthos': dict(
+        delivery_datatype='Zoobenthos',
+        name='Zoobenthos',
+        parameters=[('Abundance', 'ind/m2'), ('Wet weight', 'g/m2')],
+        extra_columns=['scientific_name', 'reported_scientific_name', 'sieve_mesh_size_um'],
+    ),
+    'chlorophyll': dict(
+        delivery_datatype='Chlorophyll',
+        name='Chlorophyll',
+        parameters=[('Chlorophyll-a bottle', 'ug/l')],
+        extra_columns=[],
+    ),
+}
+
+COMMON_COLUMNS = [
+    'delivery_datatype',
+    'visit_year',
+    'visit_date',
+    'sample_date',
+    'sample_time',
+    'station_name',
+    'reported_station_name',
+    'sample_latitude_dd',
+    'sample_longitude_dd',
+    'water_depth_m',
+    'sample_depth_m',
+    'sample_min_depth_m',
+    'sample_max_depth_m',
+    'sample_project_code',
+    'sample_orderer_code',
+    'sampling_laboratory_code',
+    'analytical_laboratory_code',
+    'reporting_institute_code',
+    'parameter',
+    'value',
+    'unit',
+    'quality_flag',
+    'visit_comment',
+    'sample_comment',
+    'variable_comment',
+    'shark_sample_id_md5',
+]
+
+STATIONS = ['BY5 BORNHOLMSDJ', 'BY31 LANDSORTSDJ', 'ANHOLT E', 'SLÄGGÖ', 'Å17', 'FLADEN', 'REFM1V1']
+SPECIES = ['Fucus vesiculosus', 'Mytilus edulis', 'Skeletonema marinoi', 'Macoma balthica', 'Zostera marina']
+PROJECTS = ['NAT', 'PROJ', 'SHARK']
+
+
+def get_package_name(data_type: str, nr_rows: int, version: str = '2024-01-01') -> str:
+    return f'SHARK_{DATA_TYPES[data_type]["name"]}_2020_BENCH{nr_rows}_SMHI_version_{version}.zip'
+
+
+def _pick(values: list[str], index: pl.Expr, step: int = 1) -> pl.Expr:
+    return pl.lit(pl.Series(values)).get((index // step) % len(values))
+
+
+def get_shark_data(data_type: str, nr_rows: int) -> pl.DataFrame:
+    info = DATA_TYPES[data_type]
+    parameters = [par for par, _ in info['parameters']]
+    units = [unit for _, unit in info['parameters']]
+    nr_par = len(parameters)
+    i = pl.int_range(0, nr_rows, dtype=pl.Int64)
+    sample = i // nr_par
+    day = (sample // 10) % 365
+    exprs = dict(
+        delivery_datatype=pl.lit(info['delivery_datatype']),
+        visit_year=pl.lit('2020'),
+        visit_date=pl.lit('2020-01-01').str.to_date() + pl.duration(days=day),
+        sample_date=pl.lit('2020-01-01').str.to_date() + pl.duration(days=day),
+        sample_time=pl.format('{}:{}', (sample % 24).cast(pl.String).str.zfill(2), pl.lit('00')),
+        station_name=_pick(STATIONS, sample, 10),
+        reported_station_name=_pick(STATIONS, sample, 10),
+        sample_latitude_dd=(55 + (sample % 900) / 100).round(4),
+        sample_longitude_dd=(11 + (sample % 800) / 100).round(4),
+        water_depth_m=(20 + sample % 80).cast(pl.String),
+        sample_depth_m=(sample % 20).cast(pl.String),
+        sample_min_depth_m=(sample % 20).cast(pl.String),
+        sample_max_depth_m=(sample % 20 + 1).cast(pl.String),
+        sample_project_code=_pick(PROJECTS, sample, 100),
+        sample_orderer_code=pl.lit('HAV'),
+        sampling_laboratory_code=pl.lit('SMHI'),
+        analytical_laboratory_code=pl.lit('SMHI'),
+        reporting_institute_code=pl.lit('SMHI'),
+        parameter=_pick(parameters, i),
+        value=((i * 7919) % 10000 / 100).round(2),
+        unit=_pick(units, i),
+        quality_flag=pl.when(i % 50 == 0).then(pl.lit('B')).otherwise(pl.lit('')),
+        visit_comment=pl.when(sample % 13 == 0).then(pl.lit('Hård vind, "sjögång"')).otherwise(pl.lit('')),
+        sample_comment=pl.when(sample % 17 == 0).then(pl.lit('Prov\ttaget vid bryggan')).otherwise(pl.lit('')),
+        variable_comment=pl.lit(''),
+        shark_sample_id_md5=(sample * 2654435761 % 2 ** 32).cast(pl.String).str.zfill(32),
+        secchi_depth_m=(sample % 12).cast(pl.String),
+        secchi_depth_quality_flag=pl.lit(''),
+        transect_min_depth_m=(sample % 5).cast(pl.String),
+        transect_max_depth_m=(sample % 5 + 10).cast(pl.String),
+        section_start_depth_m=(sample % 5).cast(pl.String),
+        section_end_depth_m=(sample % 5 + 2).cast(pl.String),
+        scientific_name=_pick(SPECIES, i, 3),
+        reported_scientific_name=_pick(SPECIES, i, 3),
+        sampled_volume_l=pl.lit('0.5'),
+        sieve_mesh_size_um=pl.lit('1000'),
+    )
+    columns = COMMON_COLUMNS + info['extra_columns']
+    return pl.select([exprs[col].cast(pl.String).alias(col) for col in columns])
+
+
+def get_shark_metadata(data_type: str, package_name: str) -> str:
+    info = DATA_TYPES[data_type]
+    return '\n'.join([
+        f'dataset_name: {package_name.removesuffix(".zip")}',
+        f'dataset_file_name: {package_name}',
+        f'delivery_datatype: {info["delivery_datatype"]}',
+        'reporting_institute_code: SMHI',
+        'created: 2024-01-01',
+        'description: Synthetic package for benchmarks',
+        '',
+    ])
+
+
+def _write_received_data(zip_file: zipfile.ZipFile, received_data_mb: float) -> None:
+    """Mostly incompressible data, like the xlsx/zip files usually delivered"""
+    remaining = int(received_data_mb * 1024 * 1024)
+    nr = 0
+    while remaining > 0:
+        size = min(remaining, 64 * 1024 * 1024)
+        with zip_file.open(f'received_data/delivery_{nr}.bin', 'w', force_zip64=True) as fid:
+            written = 0
+            while written < size:
+                chunk = os.urandom(min(1024 * 1024, size - written))
+                fid.write(chunk)
+                written += len(chunk)
+        remaining -= size
+        nr += 1
+
+
+def create_package(directory: str | pathlib.Path,
+                   data_type: str,
+                   nr_rows: int,
+                   received_data_mb: float = 0,
+                   encoding: str = 'cp1252') -> pathlib.Path:
+    if data_type not in DATA_TYPES:
+        raise KeyError(f'Unknown data type: {data_type}')
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = get_package_name(data_type, nr_rows)
+    path = directory / name
+    utf8_path = directory / f'{name}.utf8.txt'
+    data_path = directory / f'{name}.shark_data.txt'
+    get_shark_data(data_type, nr_rows).write_csv(utf8_path, separator='\t', line_terminator='\r\n')
+    try:
+        with open(utf8_path, encoding='utf8', newline='') as source, \
+                open(data_path, 'w', encoding=encoding, newline='') as target:
+            while chunk := source.read(16 * 1024 * 1024):
+                target.write(chunk)
+        utf8_path.unlink()
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.write(data_path, 'shark_data.txt')
+            zip_file.writestr('shark_metadata.txt', get_shark_metadata(data_type, name).encode(encoding))
+            zip_file.writestr('README.txt', 'Synthetic package for benchmarks\n')
+            zip_file.writestr('processed_data/delivery_note.txt',
+                              f'format: {DATA_TYPES[data_type]["delivery_datatype"]}\n'.encode(encoding))
+            zip_file.write(data_path, 'processed_data/data.txt')
+            if received_data_mb:
+                _write_received_data(zip_file, received_data_mb)
+    finally:
+        utf8_path.unlink(missing_ok=True)
+        data_path.unlink(missing_ok=True)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('directory')
+    parser.add_argument('--data-type', choices=sorted(DATA_TYPES), action='append')
+    parser.add_argument('--nr-rows', type=int, action='append')
+    parser.add_argument('--received-data-mb', type=float, default=0)
+    args = parser.parse_args()
+    for data_type in args.data_type or sorted(DATA_TYPES):
+        for nr_rows in args.nr_rows or [1000]:
+            print(create_package(args.directory, data_type, nr_rows, received_data_mb=args.received_data_mb))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,9 @@
+import multiprocessing
+
 import sharkadm_zip_publisher
 
 
 if __name__ == '__main__':
-    sharkadm_zip_publisher.run_app()
\ No newline at end of file
+    # Worker processes (see ArchivePublisher nr_processes) start by running this file again in the frozen app
+    multiprocessing.freeze_support()
+    sharkadm_zip_publisher.run_app()
@@ -1,3 +1,3 @@
-from sharkadm_zip_publisher.flet_app import run_app
-
-from sharkadm import adm_logger
+def run_app():
+    from sharkadm_zip_publisher.flet_app import run_app
+    return run_app()
@@ -1,3 +1,6 @@
+import concurrent.futures
+import contextlib
+import importlib.metadata
 import os
 import pathlib
 import shutil
@@ -10,11 +13,173 @@ from sharkadm.data import get_zip_archive_data_holder, get_polars_zip_archive_da
 from sharkadm.transformers import PolarsTransformer
 from sharkadm.utils import data_filter
 
+from sharkadm_zip_publisher import cache
+from sharkadm_zip_publisher import journal
+from sharkadm_zip_publisher import polars_exporter
 from sharkadm_zip_publisher import restrict
+from sharkadm_zip_publisher import restriction
+from sharkadm_zip_publisher import rezip
+from sharkadm_zip_publisher import transfer
 from sharkadm_zip_publisher import utils
+from sharkadm_zip_publisher import worker_log
+from sharkadm_zip_publisher import zip_index
+from sharkadm_zip_publisher.exceptions import PackageUpdateError
+from sharkadm_zip_publisher.polars_exporter import PolarsSHARKdataTxtExporter
+from sharkadm_zip_publisher.profiling import TransformerProfiler
+from sharkadm_zip_publisher.restriction import PolarsRestrictData, get_rule_set
 from sharkadm_zip_publisher.trigger import Trigger
 
 
+def create_filters() -> dict:
+    return dict(
+        main_filter=data_filter.PolarsDataFilterRestrictAreaRredorO(),
+        # main_filter=data_filter.PolarsDataFilterRestrictAreaGandC(),
+        r_filter=data_filter.PolarsDataFilterRestrictAreaRred(),
+        par_cover_filter=data_filter.PolarsDataFilterMatchInColumn(
+            column='scientific_name',
+            pattern="^COVER.*$"),
+        rep_par_cover_filter=data_filter.PolarsDataFilterMatchInColumn(
+            column='reported_scientific_name',
+            pattern="^COVER.*$"),
+        secchi_qf_filter=(data_filter.PolarsDataFilterMatchInColumn(
+            column='quality_flag',
+            pattern=".+") & data_filter.PolarsDataFilterMatchInColumn(
+                column="parameter",
+                pattern="Secchi depth"
+        )),
+    )
+
+
+def create_transformers(restrict_data: bool,
+                        fused_restriction: bool = False,
+                        filters: dict = None) -> dict[str, list[PolarsTransformer]]:
+    """Returns the mandatory, restricted and cleanup transformers in the order they are run"""
+    filters = filters or create_filters()
+    mandatory = [
+        transformers.PolarsAddSwedishProjectName(),
+        transformers.PolarsAddSwedishSampleOrderer(),
+        transformers.PolarsAddSwedishSamplingLaboratory(),
+        transformers.PolarsAddSwedishAnalyticalLaboratory(),
+        transformers.PolarsAddSwedishReportingInstitute(),
+        transformers.PolarsFixTimeFormat(),
+        transformers.PolarsAddReportedDates(),
+        transformers.PolarsAddSampleDate(),
+        transformers.PolarsCreateFakeFullDates(),
+
+        transformers.PolarsManualSealPathology(),
+        transformers.PolarsManualHarbourPorpoise(),
+        transformers.PolarsManualEpibenthos(),
+        transformers.PolarsAddDatatypePlanktonBarcoding(),
+        ]
+
+    cleanup = [
+        transformers.PolarsRemoveColumns(
+            "row_number",
+        )
+
+        # transformers.PolarsRemoveColumns(
+        #     "row_number",
+        #     "location_ra",
+        #     "location_rb",
+        #     "location_rc",
+        #     "location_rg",
+        #     "location_rh",
+        #     "location_ro",
+        #     "location_r",
+        #     "location_wb",
+        #     "location_county",
+        #     "approved_key",
+        #     "sample_sweref99tm_x",
+        #     "sample_sweref99tm_y",
+        #     "reported_visit_date",
+        #     "reported_sample_date",
+        # ),
+        # transformers.PolarsRemoveColumns(
+        #     "sample_project_name_sv",
+        #     "sample_orderer_name_sv",
+        #     "sampling_laboratory_name_sv",
+        #     "analytical_laboratory_name_sv",
+        #     "reporting_institute_name_sv",
+        # ),
+        # transformers.PolarsRemoveColumns(
+        #     "approved_key",
+        # )
+    ]
+
+    restricted = []
+
+    if restrict_data:
+        restricted.extend([
+
+            transformers.PolarsAddSamplePositionSweref99tm(),
+            # transformers.PolarsAddLocationRA(),
+            # transformers.PolarsAddLocationRB(),
+            transformers.PolarsAddLocationRC(),
+            transformers.PolarsAddLocationRG(),
+            # transformers.PolarsAddLocationRH(),
+            transformers.PolarsAddLocationRO(),
+            # transformers.PolarsAddLocationR(),
+
+            transformers.PolarsRemoveProfiles(data_filter=filters['main_filter']),  # has to be before RemoveMask
+        ])
+        if fused_restriction:
+            restricted.append(PolarsRestrictData.from_restrict_settings(
+                main_filter=filters['main_filter'],
+                r_filter=filters['r_filter'],
+                par_cover_filter=filters['par_cover_filter'],
+                rep_par_cover_filter=filters['rep_par_cover_filter'],
+                secchi_qf_filter=filters['secchi_qf_filter'],
+            ))
+            return dict(mandatory=mandatory, restricted=restricted, cleanup=cleanup)
+        rule_set = get_rule_set()
+        restricted.extend([
+            transformers.PolarsRemoveValueInColumns(
+                *rule_set.get_patterns('remove_values'),
+                replace_value=restrict.REPLACE_COLUMN_VALUE,
+                data_filter=filters['main_filter']),
+
+            transformers.PolarsRemoveValueInColumns(
+                *rule_set.get_patterns('comments'),
+                replace_value=restrict.REPLACE_COMMENT_VALUE,
+                data_filter=filters['main_filter']),
+
+            transformers.PolarsRemoveValueInRowsForParameters(
+                *rule_set.sorted_parameters,
+                replace_value=restrict.REPLACE_PARAMETER_VALUE,
+                data_filter=filters['main_filter']),
+
+            transformers.PolarsReplaceColumnWithMask(
+                valid_data_types=("epibenthos",),
+                column="scientific_name",
+                replace_value=restrict.REPLACE_SCIENTIFIC_NAME_VALUE,
+                data_filter=filters['main_filter'] & filters['par_cover_filter']),
+
+            transformers.PolarsReplaceColumnWithMask(
+                valid_data_types=("epibenthos",),
+                column="reported_scientific_name",
+                replace_value=restrict.REPLACE_SCIENTIFIC_NAME_VALUE,
+                data_filter=filters['main_filter'] & filters['rep_par_cover_filter']),
+
+            transformers.PolarsReplaceColumnWithMask(
+                valid_data_types=("physicalchemical",),
+                column="quality_flag",
+                replace_value=restrict.REPLACE_SECCHI_VALUE,
+                data_filter=filters['main_filter'] & filters['secchi_qf_filter']),
+
+            # No ox
+            transformers.PolarsRemoveValueInColumns(
+                *rule_set.get_patterns('all_but_ox'),
+                replace_value=restrict.REPLACE_COLUMN_VALUE,
+                data_filter=filters['r_filter']),
+        ])
+    return dict(mandatory=mandatory, restricted=restricted, cleanup=cleanup)
+
+
+# Modules (besides this one) whose code affects the updated packages. A change in any of them
+# invalidates the cached updates
+OUTPUT_MODULES = (polars_exporter, restrict, restriction, rezip, utils)
+
+
 class ArchivePublisher(Trigger):
 
     def __init__(self,
@@ -23,6 +188,15 @@ class ArchivePublisher(Trigger):
                  trigger_url=None,
                  import_url=None,
                  restrict_data=None,  # If None restriction is decided from restrict.RESTRICT_DATA
+                 nr_processes: int = 1,  # Number of worker processes used in update_zip_archives
+                 temp_subdirectory: str = 'rezipped_archives',
+                 use_cache: bool = False,  # Reuse earlier updates of unchanged packages
+                 cache_max_size_mb: float = 5000,
+                 polars_export: bool = True,  # Export shark_data.txt directly from polars (no conversion to pandas)
+                 fused_restriction: bool = False,  # Apply all restricted value replacements in one pass
+                 profile: bool = False,  # Record time, rows and memory for each transformer (see self.profiler)
+                 persist_zip_directory_index: bool = False,  # Reuse the listing of zip_directory between sessions
+                 nr_copy_threads: int = 4,  # Number of archives copied at the same time in copy_archives_to_sharkdata
                  ):
         self._config = dict(
             sharkdata_dataset_directory=sharkdata_dataset_directory,
@@ -39,25 +213,41 @@ class ArchivePublisher(Trigger):
         self._validators_after: list[validators.Validator] = []
         self._updated_zip_archive_paths: list[pathlib.Path] = []
         self._publish_not_allowed_packs: list[pathlib.Path] = []
+        self._failed_packs: dict[str, str] = {}
 
         self._restrict_data = restrict_data
+        self._nr_processes = max(1, int(nr_processes or 1))
+        self._temp_subdirectory = temp_subdirectory
+        self._use_cache = use_cache
+        self._cache_max_size_mb = cache_max_size_mb
+        self._cache = cache.PublishCache(max_size_mb=cache_max_size_mb) if use_cache else None
+        self._config_fingerprints: dict[bool, str] = {}
+        self._polars_export = polars_export
+        self._fused_restriction = fused_restriction
+        self._profiler = TransformerProfiler() if profile else None
+        self._current_package = ''
+        self._persist_zip_directory_index = persist_zip_directory_index
+        self._nr_copy_threads = max(1, int(nr_copy_threads or 1))
+        self._copied_checksums: dict[str, str] = {}
+        self._journal: journal.RunJournal | None = None
+        self._journal_tag = ''
+        self._executor: concurrent.futures.ProcessPoolExecutor | None = None
+        self._worker_kwargs = dict(
+            restrict_data=restrict_data,
+            use_cache=use_cache,
+            cache_max_size_mb=cache_max_size_mb,
+            polars_export=polars_export,
+            fused_restriction=fused_restriction,
+            profile=profile,
+        )
 
         # Filters
-        self._main_filter = data_filter.PolarsDataFilterRestrictAreaRredorO()
-        # self._main_filter = data_filter.PolarsDataFilterRestrictAreaGandC()
-        self._r_filter = data_filter.PolarsDataFilterRestrictAreaRred()
-        self._par_cover_filter = data_filter.PolarsDataFilterMatchInColumn(
-            column='scientific_name',
-            pattern="^COVER.*$")
-        self._rep_par_cover_filter = data_filter.PolarsDataFilterMatchInColumn(
-            column='reported_scientific_name',
-            pattern="^COVER.*$")
-        self._secchi_qf_filter = (data_filter.PolarsDataFilterMatchInColumn(
-            column='quality_flag',
-            pattern=".+") & data_filter.PolarsDataFilterMatchInColumn(
-                column="parameter",
-                pattern="Secchi depth"
-        ))
+        filters = create_filters()
+        self._main_filter = filters['main_filter']
+        self._r_filter = filters['r_filter']
+        self._par_cover_filter = filters['par_cover_filter']
+        self._rep_par_cover_filter = filters['rep_par_cover_filter']
+        self._secchi_qf_filter = filters['secchi_qf_filter']
 
         # self._controller = controller.SHARKadmController()
         self._controller = controller.SHARKadmPolarsController()
@@ -115,55 +305,261 @@ class ArchivePublisher(Trigger):
         if len(files_left) != 3:
             adm_logger.log_workflow(f'More than 3 expected files left in the restricted zip package: {sorted(files_left)}', level=adm_logger.WARNING)
 
-    def update_zip_archives(self) -> dict:
+    def update_zip_archives(self, unrestricted_publisher: 'ArchivePublisher' = None) -> dict:
+        """If unrestricted_publisher is given the mandatory transformers are only applied once per package.
+        The data is then forked and the unrestricted output is handed over to unrestricted_publisher
+        (ready for copy_archives_to_sharkdata) while this publisher gets the restricted output.
+
+        In parallel mode a failing package does not stop the others. The packages that were updated are
+        handled as usual and PackageUpdateError is raised at the end. Failed packages are not copied."""
         publish_not_allowed = []
         self._updated_zip_archive_paths = []
         self._publish_not_allowed_packs = []
-        for path in self._zip_archive_paths:
-            # data_holder = get_zip_archive_data_holder(path)
-            data_holder = get_polars_zip_archive_data_holder(path)
-            if not self._package_is_ok_to_publish(data_holder):
-                publish_not_allowed.append(f'{path.name} (data type {data_holder.data_type} not allowed)')
-                self._publish_not_allowed_packs.append(path.name)
+        self._failed_packs = {}
+        fork_unrestricted = unrestricted_publisher is not None
+        if self._nr_processes > 1 and len(self._zip_archive_paths) > 1:
+            results, self._failed_packs = self._update_zip_archives_in_parallel(fork_unrestricted=fork_unrestricted)
+        else:
+            results = [self._update_zip_archive(path, fork_unrestricted=fork_unrestricted)
+                       for path in self._zip_archive_paths]
+        for result in results:
+            worker_log.replay_events(adm_logger, result.pop('log_events', []))
+            if self._profiler:
+                self._profiler.extend(result.pop('profile', []))
+            if fork_unrestricted and result['unrestricted_path']:
+                unrestricted_publisher.mark_in_journal(result['path'].name, journal.UPDATED,
+                                                       path=result['unrestricted_path'])
+            if result['not_allowed']:
+                publish_not_allowed.append(result['not_allowed'])
+                self._publish_not_allowed_packs.append(result['path'].name)
+                self.mark_in_journal(result['path'].name, journal.PUBLISH_NOT_ALLOWED)
                 continue
-            self._controller.set_data_holder(data_holder)
-            len_data_before = len(self._controller.data)
-            # print(f"A {[col for col in self._controller.data_holder.data.columns if 'location' in col]}")
-            self._run_transformers()
-            # print(f"B {[col for col in self._controller.data_holder.data.columns if 'location' in col]}")
-            # mask = self._main_filter.get_filter_mask(self._controller.data_holder)
-            # filt_df = self._controller.data.filter(~mask)
-            # len_filt_data = len(filt_df)
-            self._run_cleanup_transformers()
-
-            # if len_filt_data != len_data_before:
-            self._run_validators_after()
-            # if not len(self._controller.data):
-            #     adm_logger.log_workflow(f'Skipping empty package: {self._controller.dataset_name}', level=adm_logger.WARNING)
-            #     continue
-            encoding = 'cp1252'
-            exporter = exporters.SHARKdataTxtAsGiven(encoding=encoding,
-                                                     export_directory=data_holder.unzipped_archive_directory,
-                                                     export_file_name=data_holder.unzipped_archive_directory / 'shark_data.txt',
-                                                     exclude_columns=(
-                                                         # 'sample_sweref99tm_x',
-                                                         # 'sample_sweref99tm_y',
-                                                         # 'location_wb',
-                                                         # 'location_county',
-                                                     ))
-            adm_logger.log_workflow(f'Encoding is {encoding} for package {path}', level=adm_logger.DEBUG)
-
-            self._controller.transform(transformers.ConvertFromPolarsToPandas())
-            self._controller.export(exporter)
-            # self._restrict_data_holder(data_holder)
-
-            rezipped_archive_path = self._zip_directory(data_holder.unzipped_archive_directory)
-            self._updated_zip_archive_paths.append(pathlib.Path(rezipped_archive_path))
+            self._updated_zip_archive_paths.append(result['rezipped_path'])
+            self.mark_in_journal(result['path'].name, journal.UPDATED, path=result['rezipped_path'])
+        if fork_unrestricted:
+            unrestricted_publisher.set_updated_zip_archive_paths(*[result['unrestricted_path'] for result in results])
+            unrestricted_publisher.set_failed_packages(self._failed_packs)
+
+        if self._failed_packs:
+            for name, error in self._failed_packs.items():
+                adm_logger.log_workflow(f'Could not update package {name}: {error}', level=adm_logger.WARNING)
+            raise PackageUpdateError(dict(self._failed_packs), publish_not_allowed=publish_not_allowed)
 
         return dict(
             publish_not_allowed=publish_not_allowed,
             )
 
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        """The worker processes are started on the first parallel update and reused until close()"""
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._nr_processes,
+                                                                    initializer=_init_worker,
+                                                                    initargs=(self._worker_kwargs,))
+        return self._executor
+
+    def close(self) -> None:
+        """Shuts down the worker processes (if any)"""
+        if self._executor is None:
+            return
+        self._executor.shutdown()
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _update_zip_archives_in_parallel(self, fork_unrestricted: bool = False) -> tuple[list[dict], dict[str, str]]:
+        """Each package is a separate task. Returns the results of the updated packages (in the same order as
+        self._zip_archive_paths) and the error for each package that failed"""
+        adm_logger.log_workflow(f'Updating {len(self._zip_archive_paths)} packages using {self._nr_processes} processes',
+                                level=adm_logger.DEBUG)
+        executor = self._get_executor()
+        futures = [executor.submit(_update_zip_archive_in_worker, path, fork_unrestricted)
+                   for path in self._zip_archive_paths]
+        results = []
+        failed = {}
+        pool_is_broken = False
+        for path, future in zip(self._zip_archive_paths, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                failed[path.name] = str(e) or e.__class__.__name__
+                pool_is_broken = pool_is_broken or isinstance(e, concurrent.futures.BrokenExecutor)
+        if pool_is_broken:
+            # A worker process died. New workers are started on the next update
+            self.close()
+        return results, failed
+
+    def _update_zip_archive(self, path: pathlib.Path, fork_unrestricted: bool = False) -> dict:
+        if not self._cache:
+            return self._process_zip_archive(path, fork_unrestricted=fork_unrestricted)
+        file_hash = cache.get_file_hash(path)
+        key = self._get_cache_key(file_hash, restricted=self.restrict_data)
+        unrestricted_key = self._get_cache_key(file_hash, restricted=False) if fork_unrestricted else None
+        result = self._get_cached_result(path, key, unrestricted_key)
+        if result:
+            adm_logger.log_workflow(f'Using cached update of package {path.name}', level=adm_logger.INFO)
+            return result
+        result = self._process_zip_archive(path, fork_unrestricted=fork_unrestricted)
+        self._cache.put(key, result['rezipped_path'], source=path.name, not_allowed=result['not_allowed'])
+        if unrestricted_key:
+            self._cache.put(unrestricted_key, result['unrestricted_path'], source=path.name, not_allowed=None)
+        return result
+
+    def _get_cache_key(self, file_hash: str, restricted: bool) -> str:
+        if restricted not in self._config_fingerprints:
+            self._config_fingerprints[restricted] = self._get_config_fingerprint(restricted)
+        return f'{file_hash}_{self._config_fingerprints[restricted][:16]}'
+
+    def _get_config_fingerprint(self, restricted: bool) -> str:
+        """Fingerprint of everything (except the package itself) that affects the updated package"""
+        def is_primitive(value) -> bool:
+            if isinstance(value, (list, tuple)):
+                return all(is_primitive(item) for item in value)
+            return value is None or isinstance(value, (str, int, float, bool))
+
+        def describe(obj) -> list:
+            return [obj.__class__.__name__,
+                    {key: value for key, value in vars(obj).items() if is_primitive(value)}]
+
+        versions = {}
+        for package in ['sharkadm', 'nodc-codes', 'nodc-geography']:
+            try:
+                versions[package] = importlib.metadata.version(package)
+            except importlib.metadata.PackageNotFoundError:
+                versions[package] = None
+        restrict_settings = {key: value for key, value in vars(restrict).items()
+                             if key.isupper() and is_primitive(value)}
+        source_hashes = [cache.get_file_hash(module.__file__) for module in OUTPUT_MODULES]
+        source_hashes.append(cache.get_file_hash(__file__))
+        return cache.get_fingerprint(
+            restricted,
+            self._fused_restriction,
+            self._polars_export,
+            versions,
+            source_hashes,
+            restrict_settings,
+            self._unrestricted_packages,
+            [describe(trans) for trans in self._transformers],
+            [describe(trans) for trans in self._restricted_transformers] if restricted else [],
+            [describe(trans) for trans in self._cleanup_transformers],
+            [describe(val) for val in self._validators_after],
+        )
+
+    def _get_cached_result(self, path: pathlib.Path, key: str, unrestricted_key: str = None) -> dict | None:
+        entry = self._cache.get(key)
+        if not entry:
+            return None
+        unrestricted_entry = None
+        if unrestricted_key:
+            unrestricted_entry = self._cache.get(unrestricted_key)
+            if not unrestricted_entry:
+                return None
+        result = dict(path=path, not_allowed=entry.get('not_allowed'), rezipped_path=None, unrestricted_path=None)
+        if entry.get('path'):
+            result['rezipped_path'] = self._copy_from_cache(entry['path'], self._temp_subdirectory)
+        if unrestricted_entry:
+            result['unrestricted_path'] = self._copy_from_cache(unrestricted_entry['path'],
+                                                                f'{self._temp_subdirectory}_unrestricted')
+        return result
+
+    @staticmethod
+    def _copy_from_cache(cached_path: pathlib.Path, temp_subdirectory: str) -> pathlib.Path:
+        target_path = sharkadm_utils.get_temp_directory(temp_subdirectory) / cached_path.name
+        shutil.copy2(cached_path, target_path)
+        return target_path
+
+    def _process_zip_archive(self, path: pathlib.Path, fork_unrestricted: bool = False) -> dict:
+        result = dict(path=path, not_allowed=None, rezipped_path=None, unrestricted_path=None)
+        self._current_package = path.name
+        # data_holder = get_zip_archive_data_holder(path)
+        data_holder = get_polars_zip_archive_data_holder(path)
+        is_ok_to_publish = self._package_is_ok_to_publish(data_holder)
+        if not is_ok_to_publish:
+            result['not_allowed'] = f'{path.name} (data type {data_holder.data_type} not allowed)'
+            if not fork_unrestricted:
+                return result
+        self._controller.set_data_holder(data_holder)
+        # print(f"A {[col for col in self._controller.data_holder.data.columns if 'location' in col]}")
+        self._run_transformers()
+        # print(f"B {[col for col in self._controller.data_holder.data.columns if 'location' in col]}")
+
+        restrict = is_ok_to_publish and self._restricted_transformers_apply()
+        if fork_unrestricted and (restrict or not is_ok_to_publish):
+            base_data = self._controller.data.clone()
+            result['unrestricted_path'] = self._export_and_zip(
+                data_holder, temp_subdirectory=f'{self._temp_subdirectory}_unrestricted')
+            if not is_ok_to_publish:
+                return result
+            self._controller.set_data_holder(data_holder)
+            data_holder.data = base_data
+
+        if restrict:
+            self._run_restricted_transformers()
+        result['rezipped_path'] = self._export_and_zip(data_holder)
+        if fork_unrestricted and not result['unrestricted_path']:
+            # Nothing restricted: the same output is valid for both
+            result['unrestricted_path'] = result['rezipped_path']
+        return result
+
+    def _export_and_zip(self, data_holder, temp_subdirectory: str = None) -> pathlib.Path:
+        # mask = self._main_filter.get_filter_mask(self._controller.data_holder)
+        # filt_df = self._controller.data.filter(~mask)
+        # len_filt_data = len(filt_df)
+        self._run_cleanup_transformers()
+
+        # if len_filt_data != len_data_before:
+        self._run_validators_after()
+        # if not len(self._controller.data):
+        #     adm_logger.log_workflow(f'Skipping empty package: {self._controller.dataset_name}', level=adm_logger.WARNING)
+        #     continue
+        encoding = 'cp1252'
+        export_file_path = data_holder.unzipped_archive_directory / 'shark_data.txt'
+        exclude_columns = (
+            # 'sample_sweref99tm_x',
+            # 'sample_sweref99tm_y',
+            # 'location_wb',
+            # 'location_county',
+        )
+        adm_logger.log_workflow(f'Encoding is {encoding} for package {data_holder.zip_archive_path}', level=adm_logger.DEBUG)
+
+        if self._polars_export and PolarsSHARKdataTxtExporter.can_export(self._controller.data):
+            exporter = PolarsSHARKdataTxtExporter(export_file_path,
+                                                  encoding=encoding,
+                                                  exclude_columns=exclude_columns)
+            with self._measure('export', exporter.__class__.__name__):
+                exporter.export(self._controller.data)
+        else:
+            exporter = exporters.SHARKdataTxtAsGiven(encoding=encoding,
+                                                     export_directory=data_holder.unzipped_archive_directory,
+                                                     export_file_name=export_file_path,
+                                                     exclude_columns=exclude_columns)
+            self._transform(transformers.ConvertFromPolarsToPandas(), 'export')
+            with self._measure('export', exporter.__class__.__name__):
+                self._controller.export(exporter)
+        # self._restrict_data_holder(data_holder)
+
+        with self._measure('rezip', 'rezip'):
+            rezipped_archive_path = self._zip_directory(data_holder.unzipped_archive_directory,
+                                                        temp_subdirectory=temp_subdirectory,
+                                                        source_zip_path=data_holder.zip_archive_path)
+        return pathlib.Path(rezipped_archive_path)
+
+    @property
+    def profiler(self) -> TransformerProfiler | None:
+        return self._profiler
+
+    def _measure(self, stage: str, name: str):
+        if not self._profiler:
+            return contextlib.nullcontext()
+        return self._profiler.measure(self._current_package, stage, name, get_rows=lambda: len(self._controller.data))
+
+    def _transform(self, trans, stage: str) -> None:
+        with self._measure(stage, trans.__class__.__name__):
+            self._controller.transform(trans)
+
     def publish_is_allowed(self, pack_name: str, allow_all: bool = False) -> bool:
         if allow_all:
             return True
@@ -173,45 +569,73 @@ class ArchivePublisher(Trigger):
             return False
         return True
 
-    def copy_archives_to_sharkdata(self, allow_all: bool = False):
-        for source_path in self.zip_archive_paths:
-            if not self.publish_is_allowed(source_path.name, allow_all=allow_all):
-                continue
-            self._copy_archive_to_sharkdata(source_path)
-            self._copy_archive_to_zip_directory(source_path)
+    def get_paths_to_copy(self, allow_all: bool = False) -> list[pathlib.Path]:
+        """The archives copy_archives_to_sharkdata would copy right now"""
+        return [path for path in self.zip_archive_paths
+                if path.name not in self._failed_packs and self.publish_is_allowed(path.name, allow_all=allow_all)]
+
+    def copy_archives_to_sharkdata(self, allow_all: bool = False, paths: list[pathlib.Path] = None):
+        """Archives are copied in parallel (nr_copy_threads). Each archive is read once and written to both
+        sharkdata and zip_directory (see transfer.fan_out_copy). Each copy is written to a temporary name,
+        verified and renamed in place. An old version in zip_directory is removed after the new version is in place.
+
+        If paths (from get_paths_to_copy) is given exactly those archives are copied. This is used when the
+        next packages are updated while the previous are copied (see pipeline)."""
+        if paths is None:
+            source_paths = self.get_paths_to_copy(allow_all=allow_all)
+        else:
+            source_paths = [pathlib.Path(path) for path in paths]
+        if self._nr_copy_threads == 1 or len(source_paths) < 2:
+            for source_path in source_paths:
+                self._copy_archive(source_path)
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._nr_copy_threads) as executor:
+            # Raises the first exception (in package order) when all copies are done
+            list(executor.map(self._copy_archive, source_paths))
         # self._copy_archives_to_sharkdata()
         # self._copy_archives_to_zip_directory()
 
-    def _copy_archive_to_sharkdata(self, source_path: pathlib.Path):
-        target_root = pathlib.Path(self._config['sharkdata_dataset_directory'])
-        target_path = target_root / source_path.name
-        shutil.copy2(source_path, target_path)
-
-    def _copy_archive_to_zip_directory(self, source_path: pathlib.Path):
+    def _copy_archive(self, source_path: pathlib.Path) -> str:
+        """Copies to sharkdata and zip_directory reading the source once. Returns the sha256 of the archive"""
+        zip_directory = self._get_zip_directory()
+        if not zip_directory:
+            return self._copy_to_sharkdata(source_path)
+        index = zip_index.get_zip_directory_index(zip_directory, persist=self._persist_zip_directory_index)
+        # The temporary files and renames of copies running in other threads are known to the index
+        with index.own_change():
+            zip_to_remove = index.get(source_path.stem)
+            target_path = zip_directory / source_path.name
+            checksum = self._copy_to_sharkdata(source_path, target_path)
+            # Remove old zips when the new one is in place
+            if zip_to_remove and zip_to_remove != target_path:
+                adm_logger.log_workflow(f'Removing old package: {zip_to_remove}')
+                os.remove(zip_to_remove)
+                index.discard(zip_to_remove)
+            index.add(target_path)
+        self.mark_in_journal(source_path.name, journal.COPIED_ZIP_DIRECTORY, path=target_path, checksum=checksum)
+        return checksum
+
+    def _copy_to_sharkdata(self, source_path: pathlib.Path, *other_target_paths: pathlib.Path) -> str:
+        target_path = pathlib.Path(self._config['sharkdata_dataset_directory']) / source_path.name
+        checksum = transfer.fan_out_copy(source_path, target_path, *other_target_paths)
+        self._copied_checksums[source_path.name] = checksum
+        self.mark_in_journal(source_path.name, journal.COPIED_SHARKDATA, path=target_path, checksum=checksum)
+        return checksum
+
+    def _get_zip_directory(self) -> pathlib.Path | None:
         if not self._config['zip_directory']:
             adm_logger.log_workflow(f'No zip_directory given. Could not copy "locally"!')
-            return
+            return None
         target_root = pathlib.Path(self._config['zip_directory'])
         if not target_root.exists():
             adm_logger.log_workflow(f'Invalid zip_directory: {target_root}')
-            return
+            return None
+        return target_root
 
-        current_mapped_zips = utils.get_zip_name_path_mapping(target_root)
-        zip_to_remove = None
-
-        source_name_no_date = utils.get_zip_name_without_date(source_path.stem)
-        current_zip = current_mapped_zips.get(source_name_no_date)
-        if current_zip:
-            zip_to_remove = current_zip
-        target_path = target_root / source_path.name
-
-        # Remove old zips
-        if zip_to_remove:
-            adm_logger.log_workflow(f'Removing old package: {zip_to_remove}')
-            os.remove(zip_to_remove)
-
-        # Copy new zips
-        shutil.copy2(source_path, target_path)
+    @property
+    def copied_checksums(self) -> dict[str, str]:
+        """sha256 of the archives copied by copy_archives_to_sharkdata"""
+        return dict(self._copied_checksums)
 
     @property
     def all_transformers(self) -> dict[str, list[PolarsTransformer]]:
@@ -229,142 +653,131 @@ class ArchivePublisher(Trigger):
         return self._config['sharkdata_dataset_directory']
 
     def _create_transformers(self):
-        self._transformers = [
-            transformers.PolarsAddSwedishProjectName(),
-            transformers.PolarsAddSwedishSampleOrderer(),
-            transformers.PolarsAddSwedishSamplingLaboratory(),
-            transformers.PolarsAddSwedishAnalyticalLaboratory(),
-            transformers.PolarsAddSwedishReportingInstitute(),
-            transformers.PolarsFixTimeFormat(),
-            transformers.PolarsAddReportedDates(),
-            transformers.PolarsAddSampleDate(),
-            transformers.PolarsCreateFakeFullDates(),
-
-            transformers.PolarsManualSealPathology(),
-            transformers.PolarsManualHarbourPorpoise(),
-            transformers.PolarsManualEpibenthos(),
-            transformers.PolarsAddDatatypePlanktonBarcoding(),
-            ]
-
-        self._cleanup_transformers = [
-            transformers.PolarsRemoveColumns(
-                "row_number",
-            )
-
-            # transformers.PolarsRemoveColumns(
-            #     "row_number",
-            #     "location_ra",
-            #     "location_rb",
-            #     "location_rc",
-            #     "location_rg",
-            #     "location_rh",
-            #     "location_ro",
-            #     "location_r",
-            #     "location_wb",
-            #     "location_county",
-            #     "approved_key",
-            #     "sample_sweref99tm_x",
-            #     "sample_sweref99tm_y",
-            #     "reported_visit_date",
-            #     "reported_sample_date",
-            # ),
-            # transformers.PolarsRemoveColumns(
-            #     "sample_project_name_sv",
-            #     "sample_orderer_name_sv",
-            #     "sampling_laboratory_name_sv",
-            #     "analytical_laboratory_name_sv",
-            #     "reporting_institute_name_sv",
-            # ),
-            # transformers.PolarsRemoveColumns(
-            #     "approved_key",
-            # )
-        ]
-
-        self._restricted_transformers = [
-        ]
-
-        if self.restrict_data:
-            self._restricted_transformers.extend([
-
-                transformers.PolarsAddSamplePositionSweref99tm(),
-                # transformers.PolarsAddLocationRA(),
-                # transformers.PolarsAddLocationRB(),
-                transformers.PolarsAddLocationRC(),
-                transformers.PolarsAddLocationRG(),
-                # transformers.PolarsAddLocationRH(),
-                transformers.PolarsAddLocationRO(),
-                # transformers.PolarsAddLocationR(),
-
-                transformers.PolarsRemoveProfiles(data_filter=self._main_filter),  # has to be before RemoveMask
-
-                transformers.PolarsRemoveValueInColumns(
-                    *restrict.REMOVE_VALUES_FOR_COLUMNS,
-                    replace_value=restrict.REPLACE_COLUMN_VALUE,
-                    data_filter=self._main_filter),
-
-                transformers.PolarsRemoveValueInColumns(
-                    *restrict.COMMENT_COLUMNS,
-                    replace_value=restrict.REPLACE_COMMENT_VALUE,
-                    data_filter=self._main_filter),
-
-                transformers.PolarsRemoveValueInRowsForParameters(
-                    *restrict.REMOVE_VALUES_FOR_PARAMETERS,
-                    replace_value=restrict.REPLACE_PARAMETER_VALUE,
-                    data_filter=self._main_filter),
-
-                transformers.PolarsReplaceColumnWithMask(
-                    valid_data_types=("epibenthos",),
-                    column="scientific_name",
-                    replace_value=restrict.REPLACE_SCIENTIFIC_NAME_VALUE,
-                    data_filter=self._main_filter & self._par_cover_filter),
-
-                transformers.PolarsReplaceColumnWithMask(
-                    valid_data_types=("epibenthos",),
-                    column="reported_scientific_name",
-                    replace_value=restrict.REPLACE_SCIENTIFIC_NAME_VALUE,
-                    data_filter=self._main_filter & self._rep_par_cover_filter),
-
-                transformers.PolarsReplaceColumnWithMask(
-                    valid_data_types=("physicalchemical",),
-                    column="quality_flag",
-                    replace_value=restrict.REPLACE_SECCHI_VALUE,
-                    data_filter=self._main_filter & self._secchi_qf_filter),
-
-                # No ox
-                transformers.PolarsRemoveValueInColumns(
-                    *restrict.ALL_BUT_OX,
-                    replace_value=restrict.REPLACE_COLUMN_VALUE,
-                    data_filter=self._r_filter),
-            ])
+        all_transformers = create_transformers(
+            restrict_data=self.restrict_data,
+            fused_restriction=self._fused_restriction,
+            filters=dict(
+                main_filter=self._main_filter,
+                r_filter=self._r_filter,
+                par_cover_filter=self._par_cover_filter,
+                rep_par_cover_filter=self._rep_par_cover_filter,
+                secchi_qf_filter=self._secchi_qf_filter,
+            ))
+        self._transformers = all_transformers['mandatory']
+        self._restricted_transformers = all_transformers['restricted']
+        self._cleanup_transformers = all_transformers['cleanup']
 
     def _run_transformers(self) -> None:
         for trans in self._transformers:
-            self._controller.transform(trans)
+            self._transform(trans, 'mandatory')
+
+    def _restricted_transformers_apply(self) -> bool:
         if not self.restrict_data:
-            return
+            return False
         if self._controller.data_holder.data_type_internal in restrict.UNRESTRICTED_DATA_TYPES:
-            return
+            return False
         if self._package_is_unrestricted(self._controller.dataset_name):
-            return
+            return False
+        return True
+
+    def _run_restricted_transformers(self) -> None:
         for trans in self._restricted_transformers:
-            self._controller.transform(trans)
+            self._transform(trans, 'restricted')
 
     def _run_cleanup_transformers(self):
         for trans in self._cleanup_transformers:
-            self._controller.transform(trans)
+            self._transform(trans, 'cleanup')
 
     def _run_validators_after(self) -> None:
         for val in self._validators_after:
-            self._controller.validate(val)
-
-    def _zip_directory(self, directory: pathlib.Path):
-        output_filename = sharkadm_utils.get_temp_directory('rezipped_archives') / directory.name
+            with self._measure('validation', val.__class__.__name__):
+                self._controller.validate(val)
+
+    def _zip_directory(self, directory: pathlib.Path, temp_subdirectory: str = None, source_zip_path: pathlib.Path = None):
+        output_filename = sharkadm_utils.get_temp_directory(temp_subdirectory or self._temp_subdirectory) / directory.name
+        if source_zip_path:
+            # Only shark_data.txt is rewritten. All other members are copied as they are from the source zip
+            try:
+                return rezip.rezip_directory(directory, source_zip_path, output_filename.parent / f'{output_filename.name}.zip')
+            except Exception as e:
+                adm_logger.log_workflow(f'Could not copy members from {source_zip_path}. Compressing the whole '
+                                        f'directory instead: {e}', level=adm_logger.WARNING)
         return shutil.make_archive(str(output_filename), 'zip', str(directory))
 
     def set_zip_archive_paths(self, *args):
         self._zip_archive_paths = []
+        self._failed_packs = {}
         for arg in args:
             path = pathlib.Path(arg)
             if not path.exists():
                 raise FileNotFoundError(path)
             self._zip_archive_paths.append(path)
+
+    def set_journal(self, run_journal: journal.RunJournal | None, tag: str = '') -> None:
+        """Progress is recorded in run_journal. Use tag to separate publishers sharing the same journal"""
+        self._journal = run_journal
+        self._journal_tag = tag
+
+    def _get_journal_stage(self, stage: str) -> str:
+        if not self._journal_tag:
+            return stage
+        return f'{stage}_{self._journal_tag}'
+
+    def mark_in_journal(self, package: str, stage: str, **kwargs) -> None:
+        if not self._journal:
+            return
+        self._journal.mark(package, self._get_journal_stage(stage), **kwargs)
+
+    def journal_is_done(self, package: str, update: bool = True, copy: bool = True) -> bool:
+        """True if the journal shows that the package has already gone through the given steps"""
+        if not self._journal:
+            return False
+        package = pathlib.Path(package).name
+        if self._journal.get(package, self._get_journal_stage(journal.PUBLISH_NOT_ALLOWED)):
+            return True
+        stages = []
+        if copy:
+            stages.append(journal.COPIED_SHARKDATA)
+            if self._config['zip_directory']:
+                stages.append(journal.COPIED_ZIP_DIRECTORY)
+        elif update:
+            stages.append(journal.UPDATED)
+        if not stages:
+            return False
+        return self._journal.is_done(package, [self._get_journal_stage(stage) for stage in stages])
+
+    def set_updated_zip_archive_paths(self, *args):
+        """Sets already updated archives (for example from a forked run) to be used by copy_archives_to_sharkdata"""
+        self._updated_zip_archive_paths = [pathlib.Path(arg) for arg in args]
+        self._publish_not_allowed_packs = []
+        self._failed_packs = {}
+
+    def set_failed_packages(self, failed: dict[str, str]) -> None:
+        """Packages (name -> error) that could not be updated and should not be copied"""
+        self._failed_packs = dict(failed)
+
+    @property
+    def failed_packages(self) -> dict[str, str]:
+        """Packages (name -> error) that failed in the latest update_zip_archives"""
+        return dict(self._failed_packs)
+
+
+_worker_publisher: ArchivePublisher | None = None
+_worker_log: worker_log.LogCollector | None = None
+
+
+def _init_worker(publisher_kwargs: dict) -> None:
+    """Each worker process owns its own publisher (and controller) and its own temp subdirectory"""
+    global _worker_publisher, _worker_log
+    _worker_publisher = ArchivePublisher(temp_subdirectory=f'rezipped_archives_{os.getpid()}',
+                                         **publisher_kwargs)
+    _worker_log = worker_log.LogCollector(adm_logger)
+
+
+def _update_zip_archive_in_worker(path: pathlib.Path, fork_unrestricted: bool = False) -> dict:
+    """The log events and profile records of the package are returned with the result"""
+    result = _worker_publisher._update_zip_archive(path, fork_unrestricted=fork_unrestricted)
+    result['log_events'] = _worker_log.pop_events()
+    if _worker_publisher.profiler:
+        result['profile'] = _worker_publisher.profiler.pop_records()
+    return result
@@ -1,12 +1,8 @@
 import os
 import pathlib
 
-import requests
-from sharkadm import adm_logger
-
-from sharkadm_zip_publisher.exceptions import ImportNotAvailable
 from sharkadm_zip_publisher.trigger import Trigger
-from sharkadm_zip_publisher import utils
+from sharkadm_zip_publisher import zip_index
 
 
 class ArchiveRemover(Trigger):
@@ -39,32 +35,18 @@ class ArchiveRemover(Trigger):
         return pathlib.Path(self._config['sharkdata_datasets_directory'])
 
     @property
-    def url_import_status(self) -> str:
-        return self._config['url_import_status']
-
-    @property
-    def url_trigger_import(self) -> str:
-        return self._config['url_trigger_import']
+    def zip_directory(self) -> str:
+        return self._config['zip_directory']
 
     @property
     def remove_file_path(self) -> pathlib.Path:
         return self.sharkdata_datasets_directory / 'remove.txt'
 
-    @property
-    def _import_status_is_available(self):
-        if requests.get(self.url_import_status).content.decode() == 'AVAILABLE':
-            return True
-        return False
-
-    # def trigger_import(self):
-    #     if not self._import_status_is_available:
-    #         raise ImportNotAvailable()
-    #     requests.post(self._config['url_trigger_import'])
-
     def set_remove_names(self, names: list[str]):
         self._remove_names = names
 
     def remove_old_packs_in_zip_directory(self, names: list[str]) -> None:
+        from sharkadm import adm_logger
         if not self._config['zip_directory']:
             adm_logger.log_workflow(f'No zip_directory given. Could not copy "locally"!')
             return
@@ -72,11 +54,10 @@ class ArchiveRemover(Trigger):
         if not target_root.exists():
             adm_logger.log_workflow(f'Invalid zip_directory: {target_root}')
             return
-        current_mapped_zips = utils.get_zip_name_path_mapping(target_root)
+        index = zip_index.get_zip_directory_index(target_root)
         zips_to_remove = []
         for name in names:
-            source_name_no_date = utils.get_zip_name_without_date(name)
-            current_zip = current_mapped_zips.get(source_name_no_date)
+            current_zip = index.get(name)
             if current_zip:
                 zips_to_remove.append(current_zip)
 
@@ -84,6 +65,7 @@ class ArchiveRemover(Trigger):
         for path in zips_to_remove:
             adm_logger.log_workflow(f'Removing old package: {path}')
             os.remove(path)
+            index.discard(path)
 
     def get_packages_waiting_to_be_removed(self) -> list[str] | None:
         """Returns none if no file exits"""
@@ -0,0 +1,142 @@
+import asyncio
+import pathlib
+import time
+from typing import Callable
+
+from sharkadm_zip_publisher import file_watcher
+from sharkadm_zip_publisher.exceptions import ImportNotAvailable
+from sharkadm_zip_publisher.trigger import Trigger
+
+TRIGGER_TIMEOUT = 10
+WAIT_TIMEOUT = 3600
+# With inotify the file is also checked this often in case an event is missed
+RECHECK_INTERVAL = 10
+
+
+class Backoff:
+    """Exponential backoff: initial, initial * factor, ... up to max_delay seconds"""
+
+    def __init__(self, initial: float = 0.2, factor: float = 2.0, max_delay: float = 5.0):
+        self.initial = initial
+        self.factor = factor
+        self.max_delay = max_delay
+        self._delay = initial
+
+    def reset(self) -> None:
+        self._delay = self.initial
+
+    def next_delay(self) -> float:
+        delay = self._delay
+        self._delay = min(self._delay * self.factor, self.max_delay)
+        return delay
+
+
+def _emit(on_event: Callable[[dict], None] | None, event: str, msg: str, **kwargs) -> None:
+    if on_event:
+        on_event(dict(event=event, msg=msg, **kwargs))
+
+
+async def trigger_with_retry(trigger: Trigger,
+                             timeout: float = TRIGGER_TIMEOUT,
+                             backoff: Backoff = None,
+                             on_event: Callable[[dict], None] = None) -> None:
+    """Triggers the import. Retries with backoff while the import is not available.
+    Raises ImportNotAvailable if it is still not available after timeout seconds"""
+    backoff = backoff or Backoff()
+    t0 = time.monotonic()
+    while True:
+        try:
+            await asyncio.to_thread(trigger.trigger_import)
+            _emit(on_event, 'triggered', 'Importen är triggad')
+            return
+        except ImportNotAvailable:
+            elapsed = time.monotonic() - t0
+            if elapsed > timeout:
+                raise ImportNotAvailable(f'Triggern är inte tillgänglig. Försökte i {timeout} sekunder')
+            delay = backoff.next_delay()
+            _emit(on_event, 'not_available', 'Triggern är inte tillgänglig. Försöker igen...',
+                  elapsed=elapsed, next_delay=delay)
+            await asyncio.sleep(delay)
+
+
+async def _wait_with_inotify(path: pathlib.Path,
+                             watcher: file_watcher.InotifyWatcher,
+                             on_event: Callable[[dict], None] | None,
+                             recheck_interval: float) -> None:
+    loop = asyncio.get_running_loop()
+    readable = asyncio.Event()
+    loop.add_reader(watcher.fileno(), readable.set)
+    t0 = time.monotonic()
+    try:
+        # The watch is in place before the first check so that a removal in between is not missed
+        while path.exists():
+            _emit(on_event, 'waiting', f'Väntar på att {path.name} ska tas bort...',
+                  elapsed=time.monotonic() - t0, method='inotify')
+            try:
+                await asyncio.wait_for(readable.wait(), recheck_interval)
+            except TimeoutError:
+                pass
+            readable.clear()
+            watcher.read_events()
+    finally:
+        loop.remove_reader(watcher.fileno())
+
+
+async def _wait_with_polling(path: pathlib.Path,
+                             on_event: Callable[[dict], None] | None,
+                             backoff: Backoff) -> None:
+    t0 = time.monotonic()
+    while await asyncio.to_thread(path.exists):
+        delay = backoff.next_delay()
+        _emit(on_event, 'waiting', f'Väntar på att {path.name} ska tas bort...',
+              elapsed=time.monotonic() - t0, next_delay=delay, method='poll')
+        await asyncio.sleep(delay)
+
+
+async def wait_until_removed(path: str | pathlib.Path,
+                             backoff: Backoff = None,
+                             on_event: Callable[[dict], None] = None,
+                             timeout: float = None,
+                             recheck_interval: float = RECHECK_INTERVAL) -> None:
+    """Waits until path (remove.txt) has been consumed by sharkdata.
+
+    Uses inotify on the parent directory when possible. On network mounts (where removals made by
+    sharkdata are not reported) and other platforms the file is polled with backoff.
+    Raises TimeoutError if the file is still there after timeout seconds"""
+    path = pathlib.Path(path)
+    async with asyncio.timeout(timeout):
+        if file_watcher.can_watch(path):
+            try:
+                with file_watcher.InotifyWatcher(path.parent) as watcher:
+                    await _wait_with_inotify(path, watcher, on_event, recheck_interval)
+                return
+            except (OSError, NotImplementedError):
+                # No inotify instances left or an event loop without add_reader
+                pass
+        await _wait_with_polling(path, on_event, backoff or Backoff(initial=0.2, max_delay=10))
+
+
+async def trigger_import(trigger: Trigger,
+                         remove_file_path: str | pathlib.Path = None,
+                         trigger_timeout: float = TRIGGER_TIMEOUT,
+                         timeout: float = WAIT_TIMEOUT,
+                         on_event: Callable[[dict], None] = None,
+                         backoff: Backoff = None,
+                         poll_backoff: Backoff = None,
+                         on_removed: Callable[[], None] = None) -> None:
+    """Triggers the import and (if remove_file_path is given) waits until the file has been consumed.
+    on_removed (e.g. removing the old packages in the zip directory) is then called in a worker thread.
+
+    Raises ImportNotAvailable if the import could not be triggered within trigger_timeout and
+    TimeoutError if everything is not done within timeout seconds. Can be cancelled as any task."""
+    try:
+        async with asyncio.timeout(timeout):
+            await trigger_with_retry(trigger, timeout=trigger_timeout, backoff=backoff, on_event=on_event)
+            if remove_file_path:
+                await wait_until_removed(remove_file_path, backoff=poll_backoff, on_event=on_event)
+    except TimeoutError:
+        raise TimeoutError(f'Importen blev inte klar inom {timeout} sekunder')
+    if remove_file_path and on_removed:
+        _emit(on_event, 'removing', 'Tar bort gamla paket...')
+        await asyncio.to_thread(on_removed)
+    _emit(on_event, 'done', 'Importen är klar')
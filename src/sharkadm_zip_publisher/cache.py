@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import time
+import uuid
+
+from sharkadm_zip_publisher import utils
+
+ENTRY_FILE_NAME = 'entry.json'
+
+
+def get_cache_directory() -> pathlib.Path:
+    return utils.get_user_directory() / 'cache'
+
+
+def get_file_hash(path: str | pathlib.Path, chunk_size: int = 1024 * 1024) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fid:
+        for chunk in iter(lambda: fid.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def get_fingerprint(*items) -> str:
+    """Hash of the json representation of items. Use only primitives, lists and dicts"""
+    text = json.dumps(items, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class PublishCache:
+    """Persistent cache of updated (rezipped) archives.
+
+    Every entry is a directory named by key containing the archive and an entry.json file.
+    The modification time of entry.json is used as "last used" so that the least recently
+    used entries are removed first when the cache grows above max_size_mb.
+    Entries are written to a temporary directory and renamed in place so that several processes
+    can use the cache at the same time."""
+
+    def __init__(self, directory: str | pathlib.Path = None, max_size_mb: float = 5000):
+        self._directory = pathlib.Path(directory or get_cache_directory())
+        self._max_size = max_size_mb * 1024 * 1024
+
+    @property
+    def directory(self) -> pathlib.Path:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        return self._directory
+
+    def get(self, key: str) -> dict | None:
+        """Returns the entry with path to the cached archive (or None if not cached)"""
+        entry_path = self.directory / key / ENTRY_FILE_NAME
+        if not entry_path.exists():
+            return None
+        try:
+            with open(entry_path, encoding='utf8') as fid:
+                entry = json.load(fid)
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            return None
+        if entry.get('file_name'):
+            entry['path'] = self.directory / key / entry['file_name']
+            if not entry['path'].exists():
+                return None
+        return entry
+
+    def put(self, key: str, path: str | pathlib.Path | None = None, **info) -> None:
+        """Adds the archive at path (may be None) with the extra info to the cache"""
+        final_directory = self.directory / key
+        if final_directory.exists():
+            return
+        temp_directory = self.directory / f'.tmp_{key}_{uuid.uuid4().hex}'
+        temp_directory.mkdir(parents=True)
+        entry = dict(info, created=time.time(), file_name=None)
+        if path:
+            path = pathlib.Path(path)
+            shutil.copy2(path, temp_directory / path.name)
+            entry['file_name'] = path.name
+        with open(temp_directory / ENTRY_FILE_NAME, 'w', encoding='utf8') as fid:
+            json.dump(entry, fid, default=str)
+        try:
+            os.rename(temp_directory, final_directory)
+        except OSError:
+            # Added by another process in the meantime
+            shutil.rmtree(temp_directory, ignore_errors=True)
+        self.evict()
+
+    def _get_entries(self) -> list[tuple[float, int, pathlib.Path]]:
+        entries = []
+        for directory in self.directory.iterdir():
+            entry_path = directory / ENTRY_FILE_NAME
+            if directory.name.startswith('.') or not entry_path.exists():
+                continue
+            size = sum(path.stat().st_size for path in directory.iterdir() if path.is_file())
+            entries.append((entry_path.stat().st_mtime, size, directory))
+        return entries
+
+    @property
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._get_entries())
+
+    def evict(self) -> None:
+        entries = sorted(self._get_entries())
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, directory in entries:
+            if total_size <= self._max_size:
+                break
+            shutil.rmtree(directory, ignore_errors=True)
+            total_size -= size
+
+    def clear(self) -> None:
+        for directory in self.directory.iterdir():
+            shutil.rmtree(directory, ignore_errors=True)
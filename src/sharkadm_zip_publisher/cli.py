@@ -0,0 +1,390 @@
+"""Headless entry point that runs the publish, remove and config workflows without the Flet GUI.
+
+Examples:
+    sharkadm-zip-publisher-cli publish --env TEST --trigger-import "D:/packages/*.zip"
+    sharkadm-zip-publisher-cli remove --env TEST SHARK_Epibenthos_2020_XYZ
+    sharkadm-zip-publisher-cli config --env TEST D:/config/*.txt
+
+Paths and URLs default to the values saved by the GUI for the given env and can be overridden
+with options. A JSON summary is written to stdout.
+
+Exit codes: 0 ok, 1 some packages failed, 2 invalid input, 3 import not available,
+4 the import was not done within --max-wait-time, 5 the log reports could not be written.
+A failing import is also recorded in the summary (under "trigger") next to the updated
+and copied packages.
+"""
+import argparse
+import asyncio
+import functools
+import glob
+import json
+import pathlib
+import sys
+
+import yaml
+
+from sharkadm_zip_publisher import utils
+from sharkadm_zip_publisher.exceptions import ImportNotAvailable, LogReportError, PackageUpdateError
+from sharkadm_zip_publisher.throttle import Throttle
+
+ENVS = ['TEST', 'PROD', 'UTVTST', 'UTV', 'LOKALT']
+
+EXIT_OK = 0
+EXIT_PACKAGE_ERRORS = 1
+EXIT_INVALID_INPUT = 2
+EXIT_IMPORT_NOT_AVAILABLE = 3
+EXIT_IMPORT_TIMEOUT = 4
+EXIT_REPORT_ERROR = 5
+
+
+def get_saved_env_config(env: str) -> dict[str, str]:
+    """Returns paths and urls saved by the GUI for the given env. The GUI resolves the user directory
+    when it starts, so if it is not known there is nothing saved"""
+    directory = utils.get_known_user_directory()
+    if not directory:
+        return {}
+    path = directory / f'zip_archive_publisher_saves_{env.upper()}.yaml'
+    if not path.exists():
+        return {}
+    with open(path) as fid:
+        data = yaml.safe_load(fid) or {}
+    suffix = '_dynamic' if env.upper() == 'LOKALT' else ''
+    return dict(
+        trigger_url=data.get('_trigger_url') or '',
+        status_url=data.get('_status_url') or '',
+        datasets_directory=data.get(f'_datasets_directory{suffix}') or '',
+        zip_directory=data.get(f'_zip_directory{suffix}') or '',
+        config_directory=data.get(f'_config_directory{suffix}') or '',
+    )
+
+
+def expand_paths(patterns: list[str]) -> list[pathlib.Path]:
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern)
+        if not matches and pathlib.Path(pattern).exists():
+            matches = [pattern]
+        paths.update(pathlib.Path(match) for match in matches)
+    return sorted(paths)
+
+
+def trigger_import(trigger_url: str,
+                   status_url: str,
+                   datasets_directory: str = None,
+                   zip_directory: str = None,
+                   max_time: float = 10,
+                   max_wait_time: float = 3600) -> dict:
+    """Triggers the import and waits for sharkdata to consume remove.txt (if any)"""
+    from sharkadm_zip_publisher import async_trigger
+    from sharkadm_zip_publisher.archive_remover import ArchiveRemover
+    from sharkadm_zip_publisher.trigger import Trigger
+
+    trig = Trigger(trigger_url=trigger_url, status_url=status_url)
+    rem = ArchiveRemover(sharkdata_datasets_directory=datasets_directory,
+                         zip_directory=zip_directory)
+    packs = rem.get_packages_waiting_to_be_removed() if datasets_directory else None
+    asyncio.run(async_trigger.trigger_import(trig,
+                                             remove_file_path=rem.remove_file_path if datasets_directory else None,
+                                             trigger_timeout=max_time,
+                                             timeout=max_wait_time,
+                                             on_removed=functools.partial(rem.remove_old_packs_in_zip_directory, packs) if packs else None))
+    return dict(triggered=True, removed_packages=packs or [])
+
+
+def record_trigger_import(summary: dict, key: str, *args, **kwargs) -> int:
+    """Runs trigger_import and puts the result (or the error) in summary[key] so that the rest of the
+    summary is kept. Returns the exit code of the trigger"""
+    try:
+        summary[key] = trigger_import(*args, **kwargs)
+    except ImportNotAvailable as e:
+        summary[key] = dict(triggered=False, error=str(e) or 'Import is not available')
+        return EXIT_IMPORT_NOT_AVAILABLE
+    except TimeoutError as e:
+        summary[key] = dict(triggered=False, timed_out=True, error=str(e) or 'Import timed out')
+        return EXIT_IMPORT_TIMEOUT
+    return EXIT_OK
+
+
+def run_publish(args: argparse.Namespace) -> tuple[dict, int]:
+    from sharkadm import utils as sharkadm_utils
+    from sharkadm.sharkadm_logger import adm_logger
+    from sharkadm_zip_publisher import report
+    from sharkadm_zip_publisher.archive_publisher import ArchivePublisher
+    from sharkadm_zip_publisher.journal import RunJournal
+
+    paths = expand_paths(args.zip_files)
+    if not paths and (args.update or args.copy):
+        return dict(error='No zip files matching the given patterns'), EXIT_INVALID_INPUT
+    if args.copy and not args.datasets_directory:
+        return dict(error='No datasets directory given'), EXIT_INVALID_INPUT
+
+    if args.clear_cache:
+        from sharkadm_zip_publisher.cache import PublishCache
+        PublishCache().clear()
+    sharkadm_utils.clear_all_in_temp_directory()
+    publisher = ArchivePublisher(
+        sharkdata_dataset_directory=args.datasets_directory,
+        zip_directory=args.zip_directory,
+        trigger_url=args.trigger_url,
+        import_url=args.status_url,
+        restrict_data=args.restrict,
+        nr_processes=args.nr_processes,
+        use_cache=args.use_cache,
+        cache_max_size_mb=args.cache_max_size_mb,
+        fused_restriction=args.fused_restriction,
+        profile=bool(args.profile_directory),
+        persist_zip_directory_index=args.persist_zip_index,
+        nr_copy_threads=args.nr_copy_threads,
+    )
+
+    unrestricted_publisher = None
+    unrestricted_config = {}
+    if args.unrestricted_env:
+        unrestricted_config = get_saved_env_config(args.unrestricted_env)
+        if args.copy and not unrestricted_config.get('datasets_directory'):
+            return dict(error=f'No datasets directory saved for env {args.unrestricted_env}'), EXIT_INVALID_INPUT
+        unrestricted_publisher = ArchivePublisher(
+            sharkdata_dataset_directory=unrestricted_config.get('datasets_directory'),
+            zip_directory=unrestricted_config.get('zip_directory'),
+            trigger_url=unrestricted_config.get('trigger_url'),
+            import_url=unrestricted_config.get('status_url'),
+            restrict_data=False,
+            persist_zip_directory_index=args.persist_zip_index,
+            nr_copy_threads=args.nr_copy_threads,
+        )
+
+    journal = RunJournal.get_or_create(args.env,
+                                       resume=args.resume,
+                                       packages=[path.name for path in paths],
+                                       update=args.update,
+                                       copy=args.copy)
+    publisher.set_journal(journal)
+    if unrestricted_publisher:
+        unrestricted_publisher.set_journal(journal, tag='unrestricted')
+    publishers = [pub for pub in [publisher, unrestricted_publisher] if pub]
+    skipped = [path.name for path in paths
+               if all(pub.journal_is_done(path, update=args.update, copy=args.copy) for pub in publishers)]
+    paths = [path for path in paths if path.name not in skipped]
+
+    summary = dict(env=args.env,
+                   restrict_data=publisher.restrict_data,
+                   total=len(paths),
+                   updated=[],
+                   copied=[],
+                   publish_not_allowed=[],
+                   failed=[],
+                   skipped=skipped,
+                   journal=str(journal.path))
+    nr = 0
+    next_clear_nr = 20
+    throttle = Throttle(max_per_minute=args.max_packages_per_minute)
+    for batch in utils.get_batches(paths, args.nr_processes):
+        throttle.wait(len(batch))
+        if nr >= next_clear_nr:
+            sharkadm_utils.clear_all_in_temp_directory()
+            next_clear_nr = nr + 20
+        nr += len(batch)
+        failed = {}
+        try:
+            publisher.set_zip_archive_paths(*batch)
+            if unrestricted_publisher:
+                unrestricted_publisher.set_zip_archive_paths(*batch)
+            if args.update:
+                try:
+                    info = publisher.update_zip_archives(unrestricted_publisher=unrestricted_publisher)
+                except PackageUpdateError as e:
+                    # The other packages in the batch are updated and copied as usual
+                    info = dict(publish_not_allowed=e.publish_not_allowed)
+                    failed = e.failed
+                summary['publish_not_allowed'].extend(info.get('publish_not_allowed', []))
+                summary['updated'].extend(path.name for path in publisher.get_paths_to_copy())
+            if args.copy:
+                publisher.copy_archives_to_sharkdata(allow_all=False)
+                summary['copied'].extend(path.name for path in publisher.get_paths_to_copy())
+                if unrestricted_publisher:
+                    unrestricted_publisher.copy_archives_to_sharkdata(allow_all=False)
+        except Exception as e:
+            summary['failed'].extend(dict(package=path.name, error=str(e)) for path in batch
+                                     if path.name not in failed)
+        summary['failed'].extend(dict(package=name, error=error) for name, error in failed.items())
+    publisher.close()
+
+    trigger_exit_code = EXIT_OK
+    if args.trigger_import:
+        trigger_exit_code = record_trigger_import(summary, 'trigger', args.trigger_url, args.status_url,
+                                                  datasets_directory=args.datasets_directory,
+                                                  zip_directory=args.zip_directory,
+                                                  max_wait_time=args.max_wait_time)
+        if unrestricted_publisher:
+            trigger_exit_code = record_trigger_import(
+                summary, 'unrestricted_trigger',
+                unrestricted_config.get('trigger_url'), unrestricted_config.get('status_url'),
+                datasets_directory=unrestricted_config.get('datasets_directory'),
+                zip_directory=unrestricted_config.get('zip_directory'),
+                max_wait_time=args.max_wait_time) or trigger_exit_code
+    if args.copy:
+        sharkadm_utils.clear_all_in_temp_directory()
+    if not summary['failed']:
+        journal.finish()
+    report_exit_code = EXIT_OK
+    if args.report_directory:
+        report_directory = pathlib.Path(args.report_directory)
+        report_directory.mkdir(parents=True, exist_ok=True)
+        try:
+            summary['reports'] = [str(path) for path in
+                                  report.create_log_reports(adm_logger, report_directory, fmt=args.report_format)]
+        except LogReportError as e:
+            summary['reports'] = dict(error=str(e))
+            report_exit_code = EXIT_REPORT_ERROR
+    if args.profile_directory:
+        summary['profile'] = [str(path) for path in publisher.profiler.save(args.profile_directory)]
+    if trigger_exit_code:
+        return summary, trigger_exit_code
+    if summary['failed']:
+        return summary, EXIT_PACKAGE_ERRORS
+    return summary, report_exit_code
+
+
+def run_remove(args: argparse.Namespace) -> tuple[dict, int]:
+    from sharkadm_zip_publisher.archive_remover import ArchiveRemover
+
+    if not args.datasets_directory:
+        return dict(error='No datasets directory given'), EXIT_INVALID_INPUT
+    names = sorted(set(pathlib.Path(name).name for name in args.names))
+    remover = ArchiveRemover(sharkdata_datasets_directory=args.datasets_directory,
+                             zip_directory=args.zip_directory,
+                             trigger_url=args.trigger_url,
+                             import_url=args.status_url)
+    summary = dict(env=args.env, remove_names=names)
+    if names:
+        remover.set_remove_names(names)
+        remover.create_remove_file()
+    if args.trigger_import:
+        return summary, record_trigger_import(summary, 'trigger', args.trigger_url, args.status_url,
+                                              datasets_directory=args.datasets_directory,
+                                              zip_directory=args.zip_directory,
+                                              max_wait_time=args.max_wait_time)
+    return summary, EXIT_OK
+
+
+def run_config(args: argparse.Namespace) -> tuple[dict, int]:
+    from sharkadm_zip_publisher.config_publisher import ConfigPublisher
+
+    paths = expand_paths(args.config_files)
+    if paths and not args.config_directory:
+        return dict(error='No config directory given'), EXIT_INVALID_INPUT
+    publisher = ConfigPublisher(sharkdata_config_directory=args.config_directory,
+                                trigger_url=args.trigger_url,
+                                import_url=args.status_url)
+    summary = dict(env=args.env, copied=[path.name for path in paths])
+    if paths:
+        publisher.set_config_paths(paths)
+        publisher.copy_config_files_to_sharkdata()
+    if args.trigger_import:
+        return summary, record_trigger_import(summary, 'trigger', args.trigger_url, args.status_url)
+    return summary, EXIT_OK
+
+
+def _add_common_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--env', choices=ENVS, default='TEST', type=str.upper,
+                        help='Environment. Paths and urls saved by the GUI for this env are used as defaults')
+    parser.add_argument('--trigger-url')
+    parser.add_argument('--status-url')
+    parser.add_argument('--trigger-import', action='store_true', help='Trigger the sharkdata import when done')
+    parser.add_argument('--max-wait-time', type=float, default=3600,
+                        help='Max seconds to wait for sharkdata to consume remove.txt after triggering')
+    parser.add_argument('--verbose', action='store_true', help='Print workflow log to stderr')
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='sharkadm-zip-publisher-cli',
+                                     description='Publish Data host zip packages without the GUI')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    publish = subparsers.add_parser('publish', help='Update, copy and import zip packages')
+    _add_common_arguments(publish)
+    publish.add_argument('zip_files', nargs='*', help='Zip files or glob patterns')
+    publish.add_argument('--datasets-directory')
+    publish.add_argument('--zip-directory')
+    publish.add_argument('--restrict', action=argparse.BooleanOptionalAction, default=False,
+                         help='Restrict data before publishing')
+    publish.add_argument('--fused-restriction', action='store_true',
+                         help='Apply all restricted value replacements in one pass')
+    publish.add_argument('--update', action=argparse.BooleanOptionalAction, default=True,
+                         help='Update the zip packages')
+    publish.add_argument('--copy', action=argparse.BooleanOptionalAction, default=True,
+                         help='Copy the zip packages to the datasets directory')
+    publish.add_argument('--unrestricted-env', choices=ENVS, type=str.upper,
+                         help='Also publish the unrestricted version to the paths saved for this env. '
+                              'The mandatory transformers are only applied once per package')
+    publish.add_argument('--nr-processes', type=int, default=1)
+    publish.add_argument('--use-cache', action='store_true',
+                         help='Reuse earlier updates of packages that have not changed')
+    publish.add_argument('--cache-max-size-mb', type=float, default=5000)
+    publish.add_argument('--clear-cache', action='store_true', help='Empty the cache before starting')
+    publish.add_argument('--max-packages-per-minute', type=float, default=0,
+                         help='Limit the rate packages are handled in. 0 means no limit')
+    publish.add_argument('--report-directory', help='Directory for the log reports')
+    publish.add_argument('--report-format', choices=['xlsx', 'csv', 'parquet'], default='xlsx',
+                         help='csv or parquet is a lot faster than xlsx for large runs')
+    publish.add_argument('--resume', action='store_true',
+                         help='Skip packages that are done according to the latest unfinished run for this env')
+    publish.add_argument('--nr-copy-threads', type=int, default=4,
+                         help='Number of archives copied to sharkdata and the zip directory at the same time')
+    publish.add_argument('--persist-zip-index', action='store_true',
+                         help='Save the listing of the zip directory and reuse it while the directory is unchanged')
+    publish.add_argument('--profile-directory',
+                         help='Record time, rows and memory for each transformer and save as csv/json in this directory')
+    publish.set_defaults(func=run_publish)
+
+    remove = subparsers.add_parser('remove', help='Create remove.txt and optionally trigger the import')
+    _add_common_arguments(remove)
+    remove.add_argument('names', nargs='*', help='Names of the zip packages to remove')
+    remove.add_argument('--datasets-directory')
+    remove.add_argument('--zip-directory')
+    remove.set_defaults(func=run_remove)
+
+    config = subparsers.add_parser('config', help='Copy config files and optionally trigger the import')
+    _add_common_arguments(config)
+    config.add_argument('config_files', nargs='*', help='Config files or glob patterns')
+    config.add_argument('--config-directory')
+    config.set_defaults(func=run_config)
+    return parser
+
+
+def _set_defaults_from_saves(args: argparse.Namespace) -> None:
+    for key, value in get_saved_env_config(args.env).items():
+        if hasattr(args, key) and not getattr(args, key):
+            setattr(args, key, value)
+
+
+def _print_log_workflow(data: dict) -> None:
+    level = data.get('level', '').lower()
+    if level == 'debug':
+        return
+    print(f'{level.upper()}: {data.get("msg")}', file=sys.stderr)
+
+
+def main(argv: list[str] = None) -> int:
+    args = get_parser().parse_args(argv)
+    _set_defaults_from_saves(args)
+    if args.trigger_import and not (args.trigger_url and args.status_url):
+        summary, exit_code = dict(error='Both trigger url and status url are needed to trigger import'), EXIT_INVALID_INPUT
+    else:
+        if args.verbose:
+            from sharkadm import event
+            event.subscribe('log_workflow', _print_log_workflow)
+        try:
+            summary, exit_code = args.func(args)
+        except ImportNotAvailable:
+            summary, exit_code = dict(error='Import is not available'), EXIT_IMPORT_NOT_AVAILABLE
+        except TimeoutError as e:
+            summary, exit_code = dict(error=str(e) or 'Import timed out'), EXIT_IMPORT_TIMEOUT
+    summary['command'] = args.command
+    summary['exit_code'] = exit_code
+    print(json.dumps(summary, indent=2, default=str))
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
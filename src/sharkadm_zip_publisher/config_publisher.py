@@ -1,10 +1,6 @@
 import pathlib
 import shutil
 
-import flet as ft
-import requests
-
-from sharkadm_zip_publisher.exceptions import ImportNotAvailable
 from sharkadm_zip_publisher.trigger import Trigger
 
 
@@ -38,45 +34,6 @@ class ConfigPublisher(Trigger):
     def sharkdata_config_directory(self) -> str:
         return self._config['sharkdata_config_directory']
 
-    @property
-    def url_import_status(self) -> str:
-        return self._config['url_import_status']
-
-    @property
-    def url_trigger_import(self) -> str:
-        return self._config['url_trigger_import']
-
-    @property
-    def _import_status_is_available(self):
-        if requests.get(self.url_import_status).content.decode() == 'AVAILABLE':
-            return True
-        return False
-
-    def trigger_import(self):
-        if not self._import_status_is_available:
-            raise ImportNotAvailable()
-        requests.post(self._config['url_trigger_import'])
-
     def set_config_paths(self, paths: list[str | pathlib.Path]):
         self._config_files = paths
 
-
-class ConfigPath(ft.UserControl):
-    def __init__(self, path: str, on_delete=None):
-        super().__init__()
-        self.path = str(path)
-        self._on_delete = on_delete
-
-    def build(self):
-        return ft.Row([
-            ft.IconButton(
-                ft.icons.DELETE_OUTLINE,
-                tooltip="Ta bort",
-                on_click=self._delete,
-            ),
-            ft.Text(self.path),
-
-        ])
-
-    def _delete(self, e):
-        self._on_delete(self)
@@ -1,4 +1,21 @@
 
 
 class ImportNotAvailable(Exception):
-    pass
\ No newline at end of file
+    pass
+
+
+class CopyVerificationError(Exception):
+    pass
+
+
+class LogReportError(Exception):
+    pass
+
+
+class PackageUpdateError(Exception):
+    """Some packages in a parallel update failed. The other packages were updated as usual"""
+
+    def __init__(self, failed: dict[str, str], publish_not_allowed: list[str] = None):
+        self.failed = failed
+        self.publish_not_allowed = publish_not_allowed or []
+        super().__init__('Could not update ' + ', '.join(f'{name} ({error})' for name, error in failed.items()))
@@ -0,0 +1,129 @@
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import struct
+import sys
+
+# From <sys/inotify.h>
+IN_MOVED_FROM = 0x00000040
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+REMOVED_MASK = IN_MOVED_FROM | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+# inotify only sees changes made by the local kernel. Files removed by another machine are not reported
+NETWORK_FILESYSTEMS = {
+    'nfs',
+    'nfs4',
+    'cifs',
+    'smb3',
+    'smbfs',
+    '9p',
+    'afs',
+    'ceph',
+    'glusterfs',
+    'fuse.sshfs',
+    'fuse.gvfsd-fuse',
+}
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    return _libc
+
+
+def inotify_available() -> bool:
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        return hasattr(_get_libc(), 'inotify_init1')
+    except OSError:
+        return False
+
+
+def get_filesystem_type(path: str | pathlib.Path) -> str | None:
+    """Returns the type of the filesystem that path is on (from /proc/mounts). None if not known"""
+    try:
+        path = pathlib.Path(path).resolve()
+        with open('/proc/mounts', encoding='utf8') as fid:
+            mounts = [line.split()[1:3] for line in fid if len(line.split()) > 2]
+    except OSError:
+        return None
+    fs_type = None
+    longest = -1
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        if (path == pathlib.Path(mount_point) or pathlib.Path(mount_point) in path.parents) and len(mount_point) > longest:
+            fs_type = mount_type
+            longest = len(mount_point)
+    return fs_type
+
+
+def can_watch(path: str | pathlib.Path) -> bool:
+    """True if removal of path can be detected with inotify"""
+    if not inotify_available():
+        return False
+    directory = pathlib.Path(path).parent
+    if not directory.is_dir():
+        return False
+    return get_filesystem_type(directory) not in NETWORK_FILESYSTEMS
+
+
+class InotifyWatcher:
+    """Watches a directory for files being removed or moved away. Use fileno() with select or
+    loop.add_reader and read_events() when the descriptor is readable."""
+
+    def __init__(self, directory: str | pathlib.Path, mask: int = REMOVED_MASK):
+        self._directory = pathlib.Path(directory)
+        libc = _get_libc()
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        wd = libc.inotify_add_watch(self._fd, os.fsencode(self._directory), ctypes.c_uint32(mask))
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, os.strerror(errno), str(self._directory))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def read_events(self) -> list[tuple[int, str]]:
+        """Returns (mask, name) for all pending events. Name is empty for events on the directory itself"""
+        events = []
+        while True:
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buf):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(buf, offset)
+                offset += _EVENT_HEADER.size
+                name = buf[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+                offset += length
+                events.append((mask, name))
+        return events
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
@@ -1,26 +1,24 @@
-import os
+import asyncio
+import functools
 import pathlib
 import shutil
-import time
 
 import flet as ft
-from sharkadm import event
-from sharkadm import utils as sharkadm_utils
 
+from sharkadm_zip_publisher import async_trigger
 from sharkadm_zip_publisher.archive_remover import ArchiveRemover
 from sharkadm_zip_publisher.exceptions import ImportNotAvailable
+from sharkadm_zip_publisher.flet_app import jobs
 from sharkadm_zip_publisher.flet_app import utils
 from sharkadm_zip_publisher.flet_app.constants import COLOR_DATASETS_MAIN
 from sharkadm_zip_publisher.flet_app.page_add_archive import PageAddArchive
 from sharkadm_zip_publisher.flet_app.page_config import PageConfig
 from sharkadm_zip_publisher.flet_app.page_log import PageLog
 from sharkadm_zip_publisher.flet_app.page_transformers import PageTransformers
+from sharkadm_zip_publisher.log_writer import BufferedLogWriter
 from sharkadm_zip_publisher.flet_app.page_remove_archive import PageRemoveArchive
 from sharkadm_zip_publisher.trigger import Trigger
 
-USER_DIR = utils.USER_DIR
-SAVES_PATH = utils.SAVES_PATH
-
 from sharkadm_zip_publisher.flet_app.saves import publisher_saves
 from sharkadm_zip_publisher.flet_app import saves
 
@@ -29,13 +27,19 @@ class ZipArchivePublisherGUI:
     def __init__(self):
 
         self.page = None
+        self._ui_queue: jobs.UiUpdateQueue | None = None
 
         self._saves = {}
+        self._trigger_tasks = []
+        self._nr_active_triggers = 0
 
         self.logging_level = 'DEBUG'
         self.logging_format = '%(asctime)s [%(levelname)10s]    %(pathname)s [%(lineno)d] => %(funcName)s():    %(message)s'
         self.logging_format_stdout = '[%(levelname)10s] %(filename)s: %(funcName)s() [%(lineno)d] %(message)s'
 
+        self._log_writer = BufferedLogWriter(self.log_file_path, encoding='cp1252')
+
+        from sharkadm import event
         event.subscribe('log_workflow', self._on_log_workflow)
 
         self.app = ft.app(target=self.main)
@@ -44,7 +48,7 @@ class ZipArchivePublisherGUI:
 
     @property
     def log_file_path(self) -> pathlib.Path:
-        return USER_DIR / 'zip_publisher_log.txt'
+        return utils.get_user_directory() / 'zip_publisher_log.txt'
 
     @property
     def env(self) -> str:
@@ -55,12 +59,10 @@ class ZipArchivePublisherGUI:
         return self._restrict_data.value
 
     def _remove_log_file(self):
-        if self.log_file_path.exists():
-            os.remove(self.log_file_path)
+        self._log_writer.remove()
 
     def _add_to_log_file(self, text: str) -> None:
-        with open(self.log_file_path, 'a', encoding='cp1252') as fid:
-            fid.write(f'{text}\n')
+        self._log_writer.write(text)
 
     @property
     def _log_directory(self):
@@ -73,6 +75,8 @@ class ZipArchivePublisherGUI:
         self.page.title = 'Zip archive publisher'
         self.page.window_height = 1000
         self.page.window_width = 1200
+        self._ui_queue = jobs.UiUpdateQueue(page, self._apply_ui_updates)
+        self._ui_queue.start()
         self._build()
         self._add_controls_to_save()
         publisher_saves.import_saves(self)
@@ -133,7 +137,8 @@ class ZipArchivePublisherGUI:
                     content=self.page_transformers,
                 ),
             ],
-            expand=1, expand_loose=True
+            expand=1, expand_loose=True,
+            on_change=self._on_change_tab,
         )
 
         self._tabs.selected_index = 0
@@ -150,7 +155,22 @@ class ZipArchivePublisherGUI:
         self.page.controls.append(progress_row)
         self.update_page()
 
+    def _on_change_tab(self, event=None) -> None:
+        if self._tabs.tabs[self._tabs.selected_index].content is self.page_transformers:
+            self.page_transformers.load()
+
     def update_progress(self, data: dict) -> None:
+        """Can be called from any thread. Only the latest progress in each frame is shown"""
+        self._ui_queue.post(jobs.PROGRESS, data)
+
+    def reset_progress(self):
+        self._ui_queue.post(jobs.PROGRESS, None)
+
+    def _set_progress(self, data: dict | None) -> None:
+        if not data:
+            self._progress_text.value = ""
+            self._progress_bar.value = 0
+            return
         current = data.get('current', 1)
         total = data.get('total', 1)
         if current > total:
@@ -159,14 +179,35 @@ class ZipArchivePublisherGUI:
         msg = data.get('msg') or f'{data.get("title", "")} ({current} / {total})'
         self._progress_text.value = msg
         self._progress_bar.value = int(10 * current / total) / 10
-        self._progress_text.update()
-        self._progress_bar.update()
 
-    def reset_progress(self):
-        self._progress_text.value = ""
-        self._progress_bar.value = 0
-        self._progress_text.update()
-        self._progress_bar.update()
+    def _apply_ui_updates(self, items: list[tuple[str, object]]) -> None:
+        """Applies the updates posted to the ui queue since the last frame with one page update"""
+        log_lines = []
+        dialogs = []
+        info = None
+        progress = ()
+        for kind, value in items:
+            if kind == jobs.INFO:
+                log_lines.append(value)
+                info = value
+            elif kind == jobs.STATUS:
+                info = value
+            elif kind == jobs.PROGRESS:
+                progress = value
+            elif kind == jobs.DIALOG:
+                log_lines.append(value)
+                dialogs.append(value)
+        if log_lines:
+            self.page_log.add_lines(log_lines, update=False)
+        if info is not None:
+            self._info_text.value = info
+        if progress != ():
+            self._set_progress(progress)
+        if dialogs:
+            self._dialog_text.value = '\n'.join(dialogs)
+            self.page.dialog = self._dlg
+            self._dlg.open = True
+        self.update_page()
 
     def _get_paths_row(self) -> ft.Row:
 
@@ -312,16 +353,19 @@ class ZipArchivePublisherGUI:
     def _open_datasets_directory(self, event=None):
         if not self.datasets_directory:
             return
+        from sharkadm import utils as sharkadm_utils
         sharkadm_utils.open_file_or_directory(self.datasets_directory)
 
     def _open_zip_directory(self, event=None):
         if not self.zip_directory:
             return
+        from sharkadm import utils as sharkadm_utils
         sharkadm_utils.open_file_or_directory(self.zip_directory)
 
     def _open_config_directory(self, event=None):
         if not self.config_directory:
             return
+        from sharkadm import utils as sharkadm_utils
         sharkadm_utils.open_file_or_directory(self.config_directory)
 
     def _get_option_column(self) -> ft.Column:
@@ -349,7 +393,11 @@ class ZipArchivePublisherGUI:
                                               bgcolor='green')
         self._check_status_btn = ft.ElevatedButton(text='Kolla API status',
                                                    on_click=self._check_status)
-        return ft.Row([self._trigger_btn, self._check_status_btn])
+        self._cancel_trigger_btn = ft.ElevatedButton(text='Avbryt import',
+                                                     tooltip='Slutar vänta på importen',
+                                                     on_click=self.cancel_trigger_import,
+                                                     disabled=True)
+        return ft.Row([self._trigger_btn, self._check_status_btn, self._cancel_trigger_btn])
 
     def _get_import_config_button(self) -> ft.Row:
         pick_config_files_dialog = ft.FilePicker(on_result=self._on_pick_config_files)
@@ -444,6 +492,7 @@ class ZipArchivePublisherGUI:
         self._on_change_env()
 
     def trigger_import(self, *args, on_remove=False):
+        from sharkadm import utils as sharkadm_utils
         if not (self.trigger_url and self.status_url):
             self.show_dialog('Du måste fylla i fälten för URL!')
             return
@@ -480,37 +529,53 @@ class ZipArchivePublisherGUI:
         self.show_dialog(msg)
 
     def _trigger_import(self, event=None):
-        t0 = time.time()
-        max_time = 10
+        """Starts the import in the background. Progress is shown in the info field"""
         if hasattr(self, '_trigger_dlg'):
             self.page.close(self._trigger_dlg)
         self.show_info(f'Triggar import...')
         trig = Trigger(trigger_url=self.trigger_url, status_url=self.status_url)
-        # time.sleep(0.2)
         rem = ArchiveRemover(sharkdata_datasets_directory=self.datasets_directory,
                              zip_directory=self.zip_directory, )
+        self._trigger_tasks = [task for task in self._trigger_tasks if not task.done()]
+        self._trigger_tasks.append(self.page.run_task(self._run_trigger_import, trig, rem))
+
+    async def _run_trigger_import(self, trig: Trigger, rem: ArchiveRemover):
         packs = rem.get_packages_waiting_to_be_removed()
         self._disable_on_trigger_import()
-        while True:
-            try:
-                trig.trigger_import()
-                while rem.remove_file_path.exists():
-                    time.sleep(0.2)
-                break
-            except ImportNotAvailable:
-                self.show_info('Triggern är inte tillgänglig. Försöker igen...')
-                time.sleep(0.2)
-                if (time.time() - t0) > max_time:
-                    self.show_info(f'Triggern är inte tillgänglig. Försökte i {max_time} sekunder men nu ger jag upp!')
-                    self._enable_on_trigger_import()
-                    return
-        if packs:
+        try:
+            await async_trigger.trigger_import(trig,
+                                               remove_file_path=rem.remove_file_path,
+                                               on_event=self._on_trigger_event,
+                                               on_removed=functools.partial(rem.remove_old_packs_in_zip_directory, packs) if packs else None)
+            self.show_info(f'Importen/borttagningen är klar!')
+        except ImportNotAvailable as e:
+            self.show_info(f'{e}. Nu ger jag upp!')
+        except TimeoutError as e:
+            self.show_info(str(e))
+        except asyncio.CancelledError:
+            self.show_info('Väntan på importen avbruten')
+            raise
+        finally:
+            self._enable_on_trigger_import()
+
+    def _on_trigger_event(self, event: dict) -> None:
+        if event['event'] == 'removing':
             self.show_info(f'Tar bort gamla paket under: {self.zip_directory}!')
-            rem.remove_old_packs_in_zip_directory(packs)
-        self._enable_on_trigger_import()
-        self.show_info(f'Importen/borttagningen är klar!')
+            return
+        if event['event'] == 'waiting':
+            # Only shown in the info field, not logged for every poll
+            self._ui_queue.post(jobs.STATUS, event['msg'])
+            return
+        self.show_info(event['msg'])
+
+    def cancel_trigger_import(self, *args):
+        for task in self._trigger_tasks:
+            task.cancel()
 
     def _disable_on_trigger_import(self):
+        self._nr_active_triggers += 1
+        self._cancel_trigger_btn.disabled = False
+        self._cancel_trigger_btn.update()
         self._tabs.disabled = True
         self._tabs.update()
         self._trigger_btn.disabled = True
@@ -520,6 +585,11 @@ class ZipArchivePublisherGUI:
             self._trigger_dlg.update()
 
     def _enable_on_trigger_import(self):
+        self._nr_active_triggers = max(0, self._nr_active_triggers - 1)
+        if self._nr_active_triggers:
+            return
+        self._cancel_trigger_btn.disabled = True
+        self._cancel_trigger_btn.update()
         self._tabs.disabled = False
         self._tabs.update()
         self._trigger_btn.disabled = False
@@ -555,14 +625,7 @@ class ZipArchivePublisherGUI:
         return self._zip_directory_dynamic.value.strip()
 
     def show_dialog(self, text: str):
-        self.page_log.add_text(text)
-        self._dialog_text.value = text
-        self._open_dlg()
-
-    def _open_dlg(self, *args):
-        self.page.dialog = self._dlg
-        self._dlg.open = True
-        self.update_page()
+        self._ui_queue.post(jobs.DIALOG, text)
 
     def _on_log_workflow(self, data: dict) -> None:
         self.log_workflow(data)
@@ -578,9 +641,8 @@ class ZipArchivePublisherGUI:
         self.show_info(text)
 
     def show_info(self, msg: str = '') -> None:
-        self.page_log.add_text(msg)
-        self._info_text.value = msg
-        self._info_text.update()
+        """Can be called from any thread. The text is shown in the next frame"""
+        self._ui_queue.post(jobs.INFO, msg)
 
     def _add_controls_to_save(self):
 
@@ -598,6 +660,15 @@ class ZipArchivePublisherGUI:
         publisher_saves.add_control('page_add_archive._option_update_zip_archives', self.page_add_archive._option_update_zip_archives)
         publisher_saves.add_control('page_add_archive._option_copy_zip_archives_to_sharkdata', self.page_add_archive._option_copy_zip_archives_to_sharkdata)
         publisher_saves.add_control('page_add_archive._option_trigger_dataset_import', self.page_add_archive._option_trigger_dataset_import)
+        publisher_saves.add_control('page_add_archive._option_shared_prod_run', self.page_add_archive._option_shared_prod_run)
+        publisher_saves.add_control('page_add_archive._option_use_cache', self.page_add_archive._option_use_cache)
+        publisher_saves.add_control('page_add_archive._option_profile', self.page_add_archive._option_profile)
+        publisher_saves.add_control('page_add_archive._option_fused_restriction', self.page_add_archive._option_fused_restriction)
+        publisher_saves.add_control('page_add_archive._option_nr_processes', self.page_add_archive._option_nr_processes)
+        publisher_saves.add_control('page_add_archive._option_max_packages_per_minute', self.page_add_archive._option_max_packages_per_minute)
+        publisher_saves.add_control('page_add_archive._option_pipeline', self.page_add_archive._option_pipeline)
+        publisher_saves.add_control('page_add_archive._option_queue_depth', self.page_add_archive._option_queue_depth)
+        publisher_saves.add_control('page_add_archive._option_report_format', self.page_add_archive._option_report_format)
 
         publisher_saves.add_control('page_remove_archive._option_create_remove_file', self.page_remove_archive._option_create_remove_file)
         publisher_saves.add_control('page_remove_archive._option_trigger_remove_file', self.page_remove_archive._option_trigger_remove_file)
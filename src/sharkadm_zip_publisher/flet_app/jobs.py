@@ -0,0 +1,112 @@
+import asyncio
+import concurrent.futures
+import queue
+import threading
+import traceback
+from typing import Callable
+
+import flet as ft
+
+# Max number of times per second the UI is updated from the queue
+UI_FPS = 10
+
+# Kinds of UI updates
+INFO = 'info'  # Shown in the info field and added to the log tab
+STATUS = 'status'  # Only shown in the info field
+PROGRESS = 'progress'  # Progress dict or None to reset
+DIALOG = 'dialog'
+
+
+class UiUpdateQueue:
+    """UI updates posted from any thread. They are applied on the event loop at most fps times per second
+    with one page update per frame, so a worker never waits for a round trip to the Flet client.
+    apply is called with all (kind, value) posted since the last frame."""
+
+    def __init__(self, page: ft.Page, apply: Callable[[list[tuple[str, object]]], None], fps: float = UI_FPS):
+        self._page = page
+        self._apply = apply
+        self._interval = 1 / fps
+        self._queue = queue.SimpleQueue()
+        self._task: concurrent.futures.Future | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = self._page.run_task(self._drain_loop)
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def post(self, kind: str, value: object = None) -> None:
+        self._queue.put((kind, value))
+
+    def get_pending(self) -> list[tuple[str, object]]:
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def flush(self) -> None:
+        items = self.get_pending()
+        if items:
+            self._apply(items)
+
+    async def _drain_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                self.flush()
+            except Exception:
+                # A failing update must not stop the following ones
+                traceback.print_exc()
+
+
+class JobExecutor:
+    """Runs long jobs (like a publish run) in a worker thread so that the button callback returns directly.
+    One job at a time. cancel() sets cancel_event that the job is expected to check between packages."""
+
+    def __init__(self, on_error: Callable[[BaseException], None] = None):
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='publish_job')
+        self._cancel_event = threading.Event()
+        self._future: concurrent.futures.Future | None = None
+        self._on_error = on_error
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._future) and not self._future.done()
+
+    @property
+    def cancel_event(self) -> threading.Event:
+        return self._cancel_event
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+    def submit(self, func: Callable, *args, **kwargs) -> concurrent.futures.Future:
+        if self.busy:
+            raise RuntimeError('Ett jobb körs redan')
+        self._cancel_event.clear()
+        self._future = self._executor.submit(func, *args, **kwargs)
+        self._future.add_done_callback(self._on_done)
+        return self._future
+
+    def _on_done(self, future: concurrent.futures.Future) -> None:
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if not exc:
+            return
+        traceback.print_exception(exc)
+        if self._on_error:
+            self._on_error(exc)
+
+    def shutdown(self) -> None:
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
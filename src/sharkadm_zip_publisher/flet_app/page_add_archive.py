@@ -1,18 +1,22 @@
 import pathlib
 
 import flet as ft
-from sharkadm import utils as sharkadm_utils
-from sharkadm.sharkadm_logger import create_xlsx_report, adm_logger
 
-from sharkadm_zip_publisher.archive_publisher import ArchivePublisher
+from sharkadm_zip_publisher import report
+from sharkadm_zip_publisher.exceptions import LogReportError, PackageUpdateError
 from sharkadm_zip_publisher.flet_app import utils
 from sharkadm_zip_publisher.flet_app.constants import COLOR_DATASETS_MAIN
+from sharkadm_zip_publisher.flet_app.jobs import JobExecutor
 from sharkadm_zip_publisher.flet_app.saves import publisher_saves
+from sharkadm_zip_publisher.journal import RunJournal
+from sharkadm_zip_publisher.pipeline import Pipeline, Stage
+from sharkadm_zip_publisher.throttle import Throttle
+from sharkadm_zip_publisher.utils import get_batches
 from sharkadm_zip_publisher.zip import ZipPath
-from sharkadm import sharkadm_exceptions
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
+    from sharkadm_zip_publisher.archive_publisher import ArchivePublisher
     from sharkadm_zip_publisher.flet_app.app import ZipArchivePublisherGUI
 
 
@@ -23,6 +27,8 @@ class PageAddArchive(ft.Row):
         self.main_app: 'ZipArchivePublisherGUI' = main_app
         self._zip_paths = set()
         self._run = None
+        self._journal: RunJournal | None = None
+        self._jobs = JobExecutor(on_error=self._on_job_error)
 
     def build(self):
         self._zip_paths_column = ft.Column(tight=True, scroll=ft.ScrollMode.ALWAYS)
@@ -30,10 +36,52 @@ class PageAddArchive(ft.Row):
                                                        tooltip='Uppdaterar zip-peketen med _sv-columner. Uppdaterade paket skriver INTE över befintliga.')
         self._option_copy_zip_archives_to_sharkdata = ft.Checkbox(label='Kopiera zip-paket till "datasets"')
         self._option_trigger_dataset_import = ft.Checkbox(label='Importera zip-paketen')
+        self._option_shared_prod_run = ft.Checkbox(label='PROD: transformera en gång för både PROD och UTVTST',
+                                                   value=False,
+                                                   tooltip='Paketen läses och transformeras en gång. '
+                                                           'Den begränsade versionen publiceras på PROD och '
+                                                           'den obegränsade på UTVTST.')
+        self._option_fused_restriction = ft.Checkbox(label='Begränsa data i en passage',
+                                                     tooltip='Alla ersättningar av begränsade värden görs i ett '
+                                                             'steg. Snabbare, samma resultat')
+        self._option_profile = ft.Checkbox(label='Mät tid per transformation',
+                                           tooltip='Tid, rader och minne för varje transformation sparas i '
+                                                   'loggmappen. Gör körningen något långsammare')
+        self._option_use_cache = ft.Checkbox(label='Använd cache',
+                                             tooltip='Oförändrade paket som redan uppdaterats med samma '
+                                                     'transformationer uppdateras inte igen')
+        self._option_resume = ft.Checkbox(label='Återuppta senaste avbrutna körning',
+                                          tooltip='Paket som blev klara i den senaste avbrutna körningen '
+                                                  '(i samma miljö) hoppas över')
+        self._option_nr_processes = ft.TextField(label='Antal processer', value='1', width=150,
+                                                 tooltip='Antal paket som uppdateras parallellt')
+        self._option_max_packages_per_minute = ft.TextField(label='Max paket per minut', value='0', width=150,
+                                                            tooltip='0 betyder ingen begränsning')
+        self._option_pipeline = ft.Checkbox(label='Överlappa uppdatering och kopiering',
+                                            tooltip='Nästa paket uppdateras medan föregående paket kopieras')
+        self._option_queue_depth = ft.TextField(label='Kö till kopiering', value='1', width=150,
+                                                tooltip='Antal uppdaterade paketgrupper som får vänta på '
+                                                        'kopiering innan uppdateringen väntar in kopieringen')
+        self._option_report_format = ft.Dropdown(label='Format på loggrapporter', width=200,
+                                                 value='xlsx',
+                                                 options=[ft.dropdown.Option(fmt) for fmt in report.FORMATS],
+                                                 tooltip='csv eller parquet går mycket fortare än xlsx för stora körningar')
         options_column = ft.Column([
             self._option_update_zip_archives,
             self._option_copy_zip_archives_to_sharkdata,
-            self._option_trigger_dataset_import
+            self._option_trigger_dataset_import,
+            self._option_shared_prod_run,
+            self._option_fused_restriction,
+            self._option_use_cache,
+            self._option_resume,
+            self._option_profile,
+            self._option_pipeline,
+            ft.Row([
+                self._option_nr_processes,
+                self._option_max_packages_per_minute,
+                self._option_queue_depth,
+                self._option_report_format,
+            ]),
         ])
         container_paths = ft.Container(bgcolor='#82b2ff',
                                        content=self._zip_paths_column,
@@ -94,6 +142,7 @@ class PageAddArchive(ft.Row):
         self._abort_button.text = msg
         self._abort_button.update()
         self._run = False
+        self._jobs.cancel()
 
     def _reset_abort_button(self) -> None:
         self._abort_button.text = 'Avbryt'
@@ -131,6 +180,62 @@ class PageAddArchive(ft.Row):
         self._nr_zip_packages.value = text
         self._nr_zip_packages.update()
 
+    @property
+    def nr_processes(self) -> int:
+        try:
+            return max(1, int(self._option_nr_processes.value))
+        except (TypeError, ValueError):
+            return 1
+
+    @property
+    def max_packages_per_minute(self) -> float:
+        try:
+            return max(0.0, float(self._option_max_packages_per_minute.value))
+        except (TypeError, ValueError):
+            return 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        try:
+            return max(1, int(self._option_queue_depth.value))
+        except (TypeError, ValueError):
+            return 1
+
+    @property
+    def use_pipeline(self) -> bool:
+        """Only worth it when the packages are both updated and copied"""
+        return bool(self._option_pipeline.value and self._option_update_zip_archives.value
+                    and self._option_copy_zip_archives_to_sharkdata.value)
+
+    def _get_path_batches(self, *publishers: 'ArchivePublisher') -> list[list[str]]:
+        """Packages that are already done according to the journal of the publishers are left out"""
+        paths = sorted(self._zip_paths)
+        publishers = [pub for pub in publishers if pub]
+        if publishers:
+            update = bool(self._option_update_zip_archives.value)
+            copy = bool(self._option_copy_zip_archives_to_sharkdata.value)
+            paths = [path for path in paths
+                     if not all(pub.journal_is_done(path, update=update, copy=copy) for pub in publishers)]
+            nr_done = len(self._zip_paths) - len(paths)
+            if nr_done:
+                self.main_app.show_info(f'Hoppar över {nr_done} paket som är klara enligt {self._journal.path}')
+        return get_batches(paths, self.nr_processes)
+
+    def _set_journal(self, publisher: 'ArchivePublisher') -> RunJournal:
+        self._journal = RunJournal.get_or_create(
+            self.main_app.env,
+            resume=bool(self._option_resume.value),
+            packages=[pathlib.Path(path).name for path in self._zip_paths],
+            update=bool(self._option_update_zip_archives.value),
+            copy=bool(self._option_copy_zip_archives_to_sharkdata.value),
+        )
+        publisher.set_journal(self._journal)
+        return self._journal
+
+    def _finish_journal(self) -> None:
+        if self._journal and self._run:
+            self._journal.finish()
+
     def _enable_buttons(self):
         for btn in [
             self._pick_zip_files_button, self._go_dataset_button,
@@ -151,7 +256,16 @@ class PageAddArchive(ft.Row):
         self._abort_button.text = 'Avbryt'
         self._abort_button.update()
 
+    def _on_job_error(self, exc: BaseException) -> None:
+        self.main_app.show_info(f'Körningen avbröts av ett fel: {exc}')
+        self.main_app.reset_progress()
+        self._enable_buttons()
+
     def _run_zip(self, *args):
+        """Checks the input and starts the run in the job thread. Returns directly"""
+        if self._jobs.busy:
+            self.main_app.show_dialog('En körning pågår redan!')
+            return
         try:
             if not any([self._option_trigger_dataset_import.value, self._option_update_zip_archives.value,
                         self._option_copy_zip_archives_to_sharkdata.value]):
@@ -171,7 +285,18 @@ class PageAddArchive(ft.Row):
 
             self._disable_buttons()
             publisher_saves.export_saves()
+        except Exception as e:
+            self.main_app.show_dialog(f'Något gick fel:\n{e}')
+            self._enable_buttons()
+            raise
+        self._jobs.submit(self._publish)
 
+    def _publish(self):
+        """Runs in the job thread. UI updates are posted to the ui queue of the main app"""
+        # Imported here since it loads all of sharkadm and polars
+        from sharkadm import utils as sharkadm_utils
+        from sharkadm_zip_publisher.archive_publisher import ArchivePublisher
+        try:
             # sharkadm_utils.clear_temp_directory()
             sharkadm_utils.clear_all_in_temp_directory()
 
@@ -181,29 +306,62 @@ class PageAddArchive(ft.Row):
                 trigger_url=self.main_app.trigger_url,
                 import_url=self.main_app.status_url,
                 restrict_data=self.main_app.restrict_data,
+                nr_processes=self.nr_processes,
+                use_cache=bool(self._option_use_cache.value),
+                fused_restriction=bool(self._option_fused_restriction.value),
+                profile=bool(self._option_profile.value),
             )
+            self._set_journal(publisher)
 
         except Exception as e:
             self.main_app.show_dialog(f'Något gick fel:\n{e}')
             self._enable_buttons()
             raise
 
-        if self.main_app.env.upper() == 'TEST':
-            self._run_zip_test(publisher)
-        elif self.main_app.env.upper() == 'PROD':
-            self._run_zip_other(publisher)
-            self._change_env_with_same_options('UTVTST')
-            dev_publisher = ArchivePublisher(
-                sharkdata_dataset_directory=self.main_app.datasets_directory,
-                zip_directory=self.main_app.zip_directory,
-                trigger_url=self.main_app.trigger_url,
-                import_url=self.main_app.status_url,
-                restrict_data=False,
-            )
-            self._run_zip_other(dev_publisher)
-            self._change_env_with_same_options('PROD')
-        else:
-            self._run_zip_other(publisher)
+        # Closing the publishers stops their worker processes
+        with publisher:
+            if self.main_app.env.upper() == 'TEST':
+                self._run_zip_test(publisher)
+            elif self.main_app.env.upper() == 'PROD' and self._option_shared_prod_run.value:
+                dev_publisher = self._get_unrestricted_publisher('UTVTST')
+                dev_publisher.set_journal(self._journal, tag='unrestricted')
+                if self._option_copy_zip_archives_to_sharkdata.value and not dev_publisher.sharkdata_dataset_directory:
+                    self.main_app.show_dialog('Ingen mapp för dataset sparad för UTVTST!')
+                    self._enable_buttons()
+                    return
+                self._run_zip_other(publisher, unrestricted_publisher=dev_publisher)
+            elif self.main_app.env.upper() == 'PROD':
+                self._run_zip_other(publisher)
+                publisher.close()
+                self._change_env_with_same_options('UTVTST')
+                dev_publisher = ArchivePublisher(
+                    sharkdata_dataset_directory=self.main_app.datasets_directory,
+                    zip_directory=self.main_app.zip_directory,
+                    trigger_url=self.main_app.trigger_url,
+                    import_url=self.main_app.status_url,
+                    restrict_data=False,
+                    nr_processes=self.nr_processes,
+                    use_cache=bool(self._option_use_cache.value),
+                    profile=bool(self._option_profile.value),
+                )
+                self._set_journal(dev_publisher)
+                with dev_publisher:
+                    self._run_zip_other(dev_publisher)
+                self._change_env_with_same_options('PROD')
+            else:
+                self._run_zip_other(publisher)
+
+    def _get_unrestricted_publisher(self, env: str) -> 'ArchivePublisher':
+        from sharkadm_zip_publisher.archive_publisher import ArchivePublisher
+        saved = publisher_saves.get_saved_values(env)
+        return ArchivePublisher(
+            sharkdata_dataset_directory=saved.get('_datasets_directory') or '',
+            zip_directory=saved.get('_zip_directory') or '',
+            trigger_url=saved.get('_trigger_url') or '',
+            import_url=saved.get('_status_url') or '',
+            restrict_data=False,
+            profile=bool(self._option_profile.value),
+        )
 
     def _change_env_with_same_options(self, env: str):
         option_update = self._option_update_zip_archives.value
@@ -217,21 +375,35 @@ class PageAddArchive(ft.Row):
         self._option_copy_zip_archives_to_sharkdata.update()
         self._option_trigger_dataset_import.update()
 
-    def _do_publish_stuff(self, publisher: ArchivePublisher, path: pathlib.Path) -> list:
+    def _do_publish_stuff(self, publisher: 'ArchivePublisher', *paths: str,
+                          unrestricted_publisher: 'ArchivePublisher' = None) -> list:
+        """If some of the packages fail to update the others are still copied before PackageUpdateError is raised"""
         publish_not_allowed = []
-        p = pathlib.Path(path)
-        publisher.set_zip_archive_paths(path)
+        update_error = None
+        publisher.set_zip_archive_paths(*paths)
+        if unrestricted_publisher:
+            unrestricted_publisher.set_zip_archive_paths(*paths)
         if self._option_update_zip_archives.value:
-            self.main_app.show_info(f'Uppdaterar {path}...')
-            info = publisher.update_zip_archives()
-            publish_not_allowed = info.get('publish_not_allowed')
+            self.main_app.show_info(f'Uppdaterar {", ".join(paths)}...')
+            try:
+                info = publisher.update_zip_archives(unrestricted_publisher=unrestricted_publisher)
+                publish_not_allowed = info.get('publish_not_allowed')
+            except PackageUpdateError as e:
+                update_error = e
+                publish_not_allowed = e.publish_not_allowed
         if self._option_copy_zip_archives_to_sharkdata.value:
-            if publisher.publish_is_allowed(p.name, allow_all=False):
+            for path in publisher.get_paths_to_copy():
                 self.main_app.show_info(f'Kopierar {path}...')
             publisher.copy_archives_to_sharkdata(allow_all=False)
+            if unrestricted_publisher:
+                self.main_app.show_info(f'Kopierar obegränsade paket till {unrestricted_publisher.sharkdata_dataset_directory}...')
+                unrestricted_publisher.copy_archives_to_sharkdata(allow_all=False)
+        if update_error:
+            raise update_error
         return publish_not_allowed
 
     def _trigger_and_copy(self):
+        from sharkadm import utils as sharkadm_utils
         if self._option_trigger_dataset_import.value:
             self.main_app.trigger_import()
         if self._option_copy_zip_archives_to_sharkdata.value:
@@ -246,34 +418,47 @@ class PageAddArchive(ft.Row):
         for name in publish_not_allowed:
             self.main_app.log_workflow(dict(msg=f'    {name}'))
 
-    def _run_zip_test(self, publisher: ArchivePublisher):
+    def _run_zip_test(self, publisher: 'ArchivePublisher'):
+        from sharkadm import sharkadm_exceptions
+        from sharkadm import utils as sharkadm_utils
         failing_zips = []
         publish_not_allowed = set()
         self._run = True
-        tot_nr = len(self._zip_paths)
+        batches = self._get_path_batches(publisher)
+        tot_nr = sum(len(paths) for paths in batches)
         nr = 0
-        for nr, path in enumerate(sorted(self._zip_paths)):
+        next_clear_nr = 0
+        throttle = Throttle(max_per_minute=self.max_packages_per_minute)
+        for paths in batches:
             if not self._run:
                 break
-            if not nr % 20:
+            throttle.wait(len(paths), cancel_event=self._jobs.cancel_event)
+            if self._jobs.cancelled:
+                break
+            if nr >= next_clear_nr:
                 sharkadm_utils.clear_all_in_temp_directory()
-            p = pathlib.Path(path)
+                next_clear_nr = nr + 20
+            names = ', '.join(pathlib.Path(path).name for path in paths)
             try:
-                p_not_allowed = self._do_publish_stuff(publisher, path)
+                p_not_allowed = self._do_publish_stuff(publisher, *paths)
                 publish_not_allowed.update(p_not_allowed)
             except sharkadm_exceptions.SHARKadmException as e:
-                failing_zips.append(f'{p.name} -> {e}')
+                failing_zips.append(f'{names} -> {e}')
+                raise
+            except PackageUpdateError as e:
+                failing_zips.extend(f'{name} -> {error}' for name, error in e.failed.items())
                 raise
             except Exception as e:
-                failing_zips.append(f'{p.name} -> {e}')
+                failing_zips.append(f'{names} -> {e}')
                 self.main_app.log_workflow(dict(
-                    level='warning', msg=f'FEL I PAKET (ej hanterat av SHARKadm) {pathlib.Path(path).name}: {e}'
+                    level='warning', msg=f'FEL I PAKET (ej hanterat av SHARKadm) {names}: {e}'
                 ))
                 raise
             finally:
-                pass
+                nr += len(paths)
         self._trigger_and_copy()
-        self._create_reports()
+        self._finish_journal()
+        self._create_reports(publisher)
         self._enable_buttons()
         self._log_publish_not_allowed(publish_not_allowed)
         if not self._run:
@@ -291,30 +476,48 @@ class PageAddArchive(ft.Row):
         else:
             self.main_app.show_dialog('Allt klart!')
 
-    def _run_zip_other(self, publisher: ArchivePublisher):
+    def _run_zip_other(self, publisher: 'ArchivePublisher', unrestricted_publisher: 'ArchivePublisher' = None):
+        """If unrestricted_publisher is given (PROD) the unrestricted output is published to UTVTST in the same run"""
+        from sharkadm import utils as sharkadm_utils
         publish_not_allowed = set()
         try:
             self._run = True
-            tot_nr = len(self._zip_paths)
+            batches = self._get_path_batches(publisher, unrestricted_publisher)
+            tot_nr = sum(len(paths) for paths in batches)
             nr = 0
-            for nr, path in enumerate(sorted(self._zip_paths)):
-                if not self._run:
-                    break
-                self.main_app.update_progress(
-                    dict(
-                        title=f"Arbetar med paket {pathlib.Path(path).name}",
-                        current=nr + 1,
-                        total=tot_nr
+            next_clear_nr = 0
+            throttle = Throttle(max_per_minute=self.max_packages_per_minute)
+            if self.use_pipeline:
+                nr = self._run_pipelined(publisher, batches, throttle, publish_not_allowed,
+                                         unrestricted_publisher=unrestricted_publisher)
+            else:
+                for paths in batches:
+                    if not self._run:
+                        break
+                    throttle.wait(len(paths), cancel_event=self._jobs.cancel_event)
+                    if self._jobs.cancelled:
+                        break
+                    self.main_app.update_progress(
+                        dict(
+                            title=f"Arbetar med paket {', '.join(pathlib.Path(path).name for path in paths)}",
+                            current=nr + len(paths),
+                            total=tot_nr
+                        )
                     )
-                )
-                import time
-                time.sleep(2)
-                if not nr % 20:
-                    sharkadm_utils.clear_all_in_temp_directory()
-                p_not_allowed = self._do_publish_stuff(publisher, path)
-                publish_not_allowed.update(p_not_allowed)
+                    if nr >= next_clear_nr:
+                        sharkadm_utils.clear_all_in_temp_directory()
+                        next_clear_nr = nr + 20
+                    p_not_allowed = self._do_publish_stuff(publisher, *paths,
+                                                           unrestricted_publisher=unrestricted_publisher)
+                    publish_not_allowed.update(p_not_allowed)
+                    nr += len(paths)
             self._trigger_and_copy()
-            self._create_reports()
+            if unrestricted_publisher:
+                self._change_env_with_same_options('UTVTST')
+                self._trigger_and_copy()
+                self._change_env_with_same_options('PROD')
+            self._finish_journal()
+            self._create_reports(publisher, unrestricted_publisher)
             self._enable_buttons()
             self._log_publish_not_allowed(publish_not_allowed)
             if not self._run:
@@ -330,9 +533,78 @@ class PageAddArchive(ft.Row):
             self.main_app.reset_progress()
             self._enable_buttons()
 
-    def _create_reports(self) -> None:
-        create_xlsx_report(adm_logger.reset_filter(), export_directory=utils.LOG_DIRECTORY)
-        create_xlsx_report(adm_logger.reset_filter().filter('>warning', 'transformation'),
-                           export_directory=utils.LOG_DIRECTORY, tag='transformation')
-        create_xlsx_report(adm_logger.reset_filter().filter('>info', 'validation'),
-                           export_directory=utils.LOG_DIRECTORY, tag='validation')
+    def _run_pipelined(self, publisher: 'ArchivePublisher', batches: list[list[str]], throttle: Throttle,
+                       publish_not_allowed: set, unrestricted_publisher: 'ArchivePublisher' = None) -> int:
+        """Batch n is copied while batch n + 1 is updated. Unzip, transform, export and rezip stay in the update
+        stage since they share the data holder in the publisher (and its worker processes).
+        Returns the number of copied packages"""
+        from sharkadm import utils as sharkadm_utils
+        tot_nr = sum(len(paths) for paths in batches)
+        pipe = None
+        next_clear_nr = 0
+        update_errors = []
+
+        def throttled_batches():
+            for paths in batches:
+                throttle.wait(len(paths), cancel_event=self._jobs.cancel_event)
+                yield paths
+
+        def update(paths: list[str]) -> dict:
+            nonlocal next_clear_nr
+            nr_updated = pipe.stages[0].nr_done
+            if nr_updated >= next_clear_nr:
+                # The copy stage reads from the temp directory
+                pipe.wait_until_idle('copy')
+                sharkadm_utils.clear_all_in_temp_directory()
+                next_clear_nr = nr_updated + 20
+            publisher.set_zip_archive_paths(*paths)
+            if unrestricted_publisher:
+                unrestricted_publisher.set_zip_archive_paths(*paths)
+            try:
+                info = publisher.update_zip_archives(unrestricted_publisher=unrestricted_publisher)
+                publish_not_allowed.update(info.get('publish_not_allowed') or [])
+            except PackageUpdateError as e:
+                # The updated packages of the batch are still copied. The error is raised when the run is done
+                update_errors.append(e)
+                publish_not_allowed.update(e.publish_not_allowed)
+            return dict(paths=paths,
+                        copy_paths=publisher.get_paths_to_copy(),
+                        unrestricted_copy_paths=unrestricted_publisher.get_paths_to_copy() if unrestricted_publisher else [])
+
+        def copy(item: dict) -> list[str]:
+            publisher.copy_archives_to_sharkdata(paths=item['copy_paths'])
+            if unrestricted_publisher:
+                unrestricted_publisher.copy_archives_to_sharkdata(paths=item['unrestricted_copy_paths'])
+            return item['paths']
+
+        def on_progress(pipeline: Pipeline) -> None:
+            stats = pipeline.stats
+            self.main_app.update_progress(dict(
+                msg=f'Uppdaterade {stats["update"]["done"]}/{tot_nr} ({stats["update"]["per_minute"]:.1f}/min) | '
+                    f'Kopierade {stats["copy"]["done"]}/{tot_nr} ({stats["copy"]["per_minute"]:.1f}/min) | '
+                    f'I kö: {stats["copy"]["queued"]}',
+                current=stats['copy']['done'],
+                total=tot_nr,
+            ))
+
+        pipe = Pipeline([Stage('update', update, size=len),
+                         Stage('copy', copy, queue_depth=self.queue_depth, size=lambda item: len(item['paths']))],
+                        on_progress=on_progress,
+                        cancel_event=self._jobs.cancel_event)
+        pipe.run(throttled_batches())
+        if update_errors:
+            raise PackageUpdateError({name: error for e in update_errors for name, error in e.failed.items()},
+                                     publish_not_allowed=sorted(publish_not_allowed))
+        return pipe.stats['copy']['done']
+
+    def _create_reports(self, *publishers: 'ArchivePublisher') -> None:
+        from sharkadm.sharkadm_logger import adm_logger
+        for publisher in publishers:
+            if publisher and publisher.profiler and publisher.profiler.records:
+                tag = 'restricted' if publisher.restrict_data else 'unrestricted'
+                publisher.profiler.save(utils.get_log_directory(), tag=f'transformer_profile_{tag}')
+        self.main_app.show_info('Skapar loggrapporter...')
+        try:
+            report.create_log_reports(adm_logger, utils.get_log_directory(), fmt=self._option_report_format.value or 'xlsx')
+        except LogReportError as e:
+            self.main_app.show_dialog(f'Kunde inte skapa loggrapporter:\n{e}')
@@ -1,9 +1,9 @@
 import flet as ft
-from sharkadm import utils as sharkadm_utils
 
-from sharkadm_zip_publisher.config_publisher import ConfigPath, ConfigPublisher
+from sharkadm_zip_publisher.config_publisher import ConfigPublisher
 from sharkadm_zip_publisher.flet_app.constants import COLOR_CONFIG_MAIN, COLOR_DATASETS_MAIN
 from sharkadm_zip_publisher.flet_app.saves import publisher_saves
+from sharkadm_zip_publisher.zip import ConfigPath
 
 
 class PageConfig(ft.Row):
@@ -87,6 +87,7 @@ class PageConfig(ft.Row):
         self.update()
 
     def _run_config(self, *args):
+        from sharkadm import utils as sharkadm_utils
         try:
             if not any([self._option_trigger_config_import.value,
                         self._option_copy_config_to_sharkdata.value]):
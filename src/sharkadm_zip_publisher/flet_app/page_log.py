@@ -1,36 +1,63 @@
+import collections
+
 import flet as ft
 from sharkadm_zip_publisher.flet_app import utils
-from sharkadm import utils as sharkadm_utils
+
+# Max number of lines kept in the log tab. All lines are written to the log file
+MAX_LINES = 2000
 
 
 class PageLog(ft.Row):
 
-    def __init__(self, main_app):
+    def __init__(self, main_app, max_lines: int = MAX_LINES):
         super().__init__()
         self.main_app = main_app
+        self._max_lines = max_lines
+        self._lines: collections.deque[ft.Text] = collections.deque(maxlen=max_lines)
+        self._nr_dropped = 0
 
     def build(self):
         self.lv = ft.ListView(expand=1, spacing=10, padding=20, auto_scroll=True)
+        self._dropped_text = ft.Text(visible=False, italic=True)
         self.expand = True
         col = ft.Column([
             ft.ElevatedButton(text='Öppna mappen med loggar', on_click=self._open_log_directory),
+            self._dropped_text,
             self.lv
         ], expand=True)
 
         return col
 
+    @property
+    def max_lines(self) -> int:
+        return self._max_lines
+
     def _open_log_directory(self, *args):
-        if not utils.LOG_DIRECTORY.exists():
-            return
-        sharkadm_utils.open_file_or_directory(utils.LOG_DIRECTORY)
+        from sharkadm import utils as sharkadm_utils
+        sharkadm_utils.open_file_or_directory(utils.get_log_directory())
 
     def clear_text(self) -> None:
+        self._lines.clear()
+        self._nr_dropped = 0
         self.lv.controls = []
-        self.lv.update()
+        self._dropped_text.visible = False
+        self.update()
 
     def add_text(self, text: str) -> None:
-        self.lv.controls.append(ft.Text(text))
-        self.lv.update()
+        self.add_lines([text])
+
+    def add_lines(self, lines: list[str], update: bool = True) -> None:
+        """Only the last max_lines lines are kept. The oldest are dropped from the view"""
+        lines = lines[-self._max_lines:]
+        nr_dropped = max(0, len(self._lines) + len(lines) - self._max_lines)
+        self._lines.extend(ft.Text(text) for text in lines)
+        if nr_dropped:
+            self._nr_dropped += nr_dropped
+            self._dropped_text.value = f'{self._nr_dropped} äldre rader visas inte här. Se loggfilen.'
+            self._dropped_text.visible = True
+        self.lv.controls = list(self._lines)
+        if update:
+            self.update()
 
     def add_empty_line(self) -> None:
         self.add_text('\n')
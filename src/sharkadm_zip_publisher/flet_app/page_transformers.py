@@ -1,15 +1,18 @@
+import threading
+
 import flet as ft
 
-from sharkadm_zip_publisher.archive_publisher import ArchivePublisher
-from sharkadm_zip_publisher.flet_app import utils
-from sharkadm import utils as sharkadm_utils
+from sharkadm_zip_publisher import transformer_registry
 
 
 class PageTransformers(ft.Row):
+    """The transformers are listed the first time the tab is opened (see load)"""
 
     def __init__(self, main_app):
         super().__init__()
         self.main_app = main_app
+        self._loaded = False
+        self._load_lock = threading.Lock()
 
     def build(self):
         self.lv = ft.ListView(expand=1, spacing=10, padding=20, auto_scroll=True)
@@ -25,21 +28,34 @@ class PageTransformers(ft.Row):
             ft.Divider(),
             self.lv
         ], expand=True)
-        self._set_transformers_column()
 
         return col
 
+    def load(self) -> None:
+        with self._load_lock:
+            if self._loaded:
+                return
+            self.lv.controls = [ft.Text('Läser in transformationer...')]
+            self.lv.update()
+            try:
+                self._set_transformers_column()
+            except Exception as e:
+                self.lv.controls = [ft.Text(f'Kunde inte läsa in transformationerna: {e}')]
+                self.lv.update()
+                raise
+            self._loaded = True
+            self.lv.update()
+
     def _set_transformers_column(self) -> None:
-        pub = ArchivePublisher()
-        info = pub.all_transformers
-        self.lv.controls.append(ft.Text('Utförs alltid', weight=ft.FontWeight('bold')))
+        info = transformer_registry.get_transformer_info()
+        self.lv.controls = [ft.Text('Utförs alltid', weight=ft.FontWeight('bold'))]
         for tran in info['mandatory']:
             self.lv.controls.append(ft.Row([ft.Text(tran.description),
-                                            ft.Text(f'({tran.__class__.__name__})')],
+                                            ft.Text(f'({tran.name})')],
                                            alignment=ft.MainAxisAlignment.SPACE_BETWEEN))
         self.lv.controls.append(ft.Divider())
         self.lv.controls.append(ft.Text('Utförs om begränsad åtkomst är vald', weight=ft.FontWeight('bold')))
         for tran in info['restricted']:
             self.lv.controls.append(ft.Row([ft.Text(tran.description),
-                                            ft.Text(f'({tran.__class__.__name__})')],
+                                            ft.Text(f'({tran.name})')],
                                            alignment=ft.MainAxisAlignment.SPACE_BETWEEN))
@@ -2,10 +2,8 @@ import pathlib
 
 import flet as ft
 import yaml
-from sharkadm import utils
 
-USER_DIR = utils.get_root_directory() / 'zip_archive_publisher'
-USER_DIR.mkdir(parents=True, exist_ok=True)
+from sharkadm_zip_publisher.flet_app import utils
 
 
 class PublisherSaves:
@@ -30,11 +28,19 @@ class PublisherSaves:
 
     @property
     def save_path(self):
-        return pathlib.Path(USER_DIR, f'zip_archive_publisher_saves_{self._env}.yaml').resolve()
+        return pathlib.Path(utils.get_user_directory(), f'zip_archive_publisher_saves_{self._env}.yaml').resolve()
+
+    def get_saved_values(self, env: str) -> dict:
+        """Returns the saved values for env without touching any controls"""
+        path = pathlib.Path(utils.get_user_directory(), f'zip_archive_publisher_saves_{env.strip().upper()}.yaml')
+        if not path.exists():
+            return {}
+        with open(path) as fid:
+            return yaml.safe_load(fid) or {}
 
     @property
     def valid_save_paths(self):
-        return [pathlib.Path(USER_DIR, f'zip_archive_publisher_saves_{env}.yaml') for env in self.envs]
+        return [pathlib.Path(utils.get_user_directory(), f'zip_archive_publisher_saves_{env}.yaml') for env in self.envs]
 
     def add_control(self, name: str, control: ft.Control):
         self._controls[name] = control
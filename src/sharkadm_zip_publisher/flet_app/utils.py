@@ -1,13 +1,18 @@
-from sharkadm import utils
 import pathlib
 
+from sharkadm_zip_publisher import utils
 
-USER_DIR = utils.get_root_directory() / 'zip_archive_publisher'
-USER_DIR.mkdir(parents=True, exist_ok=True)
-SAVES_PATH = pathlib.Path(USER_DIR, 'zip_archive_publisher_saves.yaml').resolve()
 
-LOG_DIRECTORY = USER_DIR / 'logs'
-LOG_DIRECTORY.mkdir(parents=True, exist_ok=True)
+def get_user_directory() -> pathlib.Path:
+    directory = utils.get_user_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def get_log_directory() -> pathlib.Path:
+    directory = get_user_directory() / 'logs'
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
 
 
 def fix_url_str(url: str) -> str:
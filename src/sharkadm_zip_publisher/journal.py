@@ -0,0 +1,171 @@
+import datetime
+import json
+import os
+import pathlib
+import threading
+
+from sharkadm_zip_publisher import utils
+
+UPDATED = 'updated'
+COPIED_SHARKDATA = 'copied_sharkdata'
+COPIED_ZIP_DIRECTORY = 'copied_zip_directory'
+PUBLISH_NOT_ALLOWED = 'publish_not_allowed'
+
+# Number of finished journals kept in the journal directory
+KEEP_FINISHED_JOURNALS = 20
+
+
+def get_journal_directory() -> pathlib.Path:
+    return utils.get_user_directory() / 'journal'
+
+
+def remove_finished_journals(directory: str | pathlib.Path = None,
+                             keep: int = None) -> list[pathlib.Path]:
+    """Removes finished journals except the latest keep (default KEEP_FINISHED_JOURNALS). Unfinished
+    journals are kept so that their runs can be resumed. Returns the removed paths"""
+    if keep is None:
+        keep = KEEP_FINISHED_JOURNALS
+    directory = pathlib.Path(directory or get_journal_directory())
+    if not directory.exists():
+        return []
+    removed = []
+    nr_finished = 0
+    for path in sorted(directory.glob('*.jsonl'), reverse=True):
+        if not RunJournal(path).finished:
+            continue
+        nr_finished += 1
+        if nr_finished <= keep:
+            continue
+        try:
+            path.unlink()
+        except OSError:
+            continue
+        removed.append(path)
+    return removed
+
+
+class RunJournal:
+    """Records how far each package has come in a publish run so that an interrupted run can be resumed.
+
+    The journal is a json lines file. The first line describes the run, then there is one line per
+    package and stage (with path, size and checksum of the output) and a last line when the run is finished.
+    Every line is flushed to disk directly so that the journal survives a crash.
+    A stage only counts as done if its output still exists with the same size, since the temp directory
+    (where updated packages are written) is cleared when a new run starts."""
+
+    def __init__(self, path: str | pathlib.Path):
+        self._path = pathlib.Path(path)
+        self._info = {}
+        self._stages: dict[str, dict[str, dict]] = {}
+        self._finished = False
+        self._needs_newline = False
+        self._lock = threading.Lock()
+        if self._path.exists():
+            self._load()
+
+    @classmethod
+    def create(cls, env: str, packages: list[str] = None, directory: str | pathlib.Path = None, **options) -> 'RunJournal':
+        directory = pathlib.Path(directory or get_journal_directory())
+        directory.mkdir(parents=True, exist_ok=True)
+        remove_finished_journals(directory)
+        now = datetime.datetime.now()
+        journal = cls(directory / f'{now.strftime("%Y%m%d_%H%M%S_%f")}_{env}.jsonl')
+        journal._write(dict(run=dict(env=env,
+                                     started=now.isoformat(timespec='seconds'),
+                                     packages=sorted(packages or []),
+                                     options=options)))
+        journal._info = dict(env=env, packages=sorted(packages or []), options=options)
+        return journal
+
+    @classmethod
+    def get_latest_unfinished(cls, env: str, directory: str | pathlib.Path = None) -> 'RunJournal | None':
+        directory = pathlib.Path(directory or get_journal_directory())
+        if not directory.exists():
+            return None
+        for path in sorted(directory.glob(f'*_{env}.jsonl'), reverse=True):
+            journal = cls(path)
+            if not journal.finished:
+                return journal
+        return None
+
+    @classmethod
+    def get_or_create(cls, env: str, resume: bool = False, **kwargs) -> 'RunJournal':
+        """Returns the latest unfinished journal for env if resume, else (or if there is none) a new journal"""
+        if resume:
+            journal = cls.get_latest_unfinished(env, directory=kwargs.get('directory'))
+            if journal:
+                return journal
+        return cls.create(env, **kwargs)
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self._path
+
+    @property
+    def env(self) -> str:
+        return self._info.get('env', '')
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def _load(self) -> None:
+        with open(self._path, encoding='utf8') as fid:
+            for line in fid:
+                self._needs_newline = not line.endswith('\n')
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # The last line can be incomplete after a crash
+                    continue
+                if 'run' in item:
+                    self._info = item['run']
+                elif 'finished' in item:
+                    self._finished = True
+                elif 'package' in item:
+                    self._stages.setdefault(item['package'], {})[item['stage']] = item
+
+    def _write(self, item: dict) -> None:
+        with open(self._path, 'a', encoding='utf8') as fid:
+            if self._needs_newline:
+                fid.write('\n')
+                self._needs_newline = False
+            fid.write(json.dumps(item) + '\n')
+            fid.flush()
+            os.fsync(fid.fileno())
+
+    def mark(self, package: str, stage: str, path: str | pathlib.Path = None, checksum: str = None) -> None:
+        item = dict(package=package, stage=stage, time=datetime.datetime.now().isoformat(timespec='seconds'))
+        if path:
+            path = pathlib.Path(path)
+            item['path'] = str(path)
+            item['size'] = path.stat().st_size
+        if checksum:
+            item['checksum'] = checksum
+        with self._lock:
+            self._write(item)
+            self._stages.setdefault(package, {})[stage] = item
+
+    def finish(self) -> None:
+        with self._lock:
+            self._write(dict(finished=datetime.datetime.now().isoformat(timespec='seconds')))
+            self._finished = True
+
+    def get(self, package: str, stage: str) -> dict | None:
+        return self._stages.get(package, {}).get(stage)
+
+    @staticmethod
+    def _output_exists(item: dict) -> bool:
+        if 'path' not in item:
+            return True
+        try:
+            return os.stat(item['path']).st_size == item['size']
+        except OSError:
+            return False
+
+    def is_done(self, package: str, stages: list[str]) -> bool:
+        for stage in stages:
+            item = self.get(package, stage)
+            if not item or not self._output_exists(item):
+                return False
+        return True
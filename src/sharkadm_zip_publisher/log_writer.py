@@ -0,0 +1,109 @@
+import pathlib
+import threading
+
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 3
+FLUSH_INTERVAL = 2.0
+MAX_BUFFERED_LINES = 500
+
+
+class BufferedLogWriter:
+    """Appends lines to a log file without opening the file for every line.
+
+    Lines are buffered and written when MAX_BUFFERED_LINES are waiting or at the latest every
+    flush_interval seconds (by a background thread). When the file would grow past max_bytes it is
+    rotated to <name>.1, <name>.2 ... <name>.<backup_count>. Can be used from any thread."""
+
+    def __init__(self,
+                 path: str | pathlib.Path,
+                 encoding: str = 'utf8',
+                 max_bytes: int = MAX_BYTES,
+                 backup_count: int = BACKUP_COUNT,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 max_buffered_lines: int = MAX_BUFFERED_LINES):
+        self._path = pathlib.Path(path)
+        self._encoding = encoding
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._flush_interval = flush_interval
+        self._max_buffered_lines = max_buffered_lines
+        self._buffer: list[str] = []
+        self._fid = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flush_thread = None
+        if flush_interval:
+            self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True, name='log_writer')
+            self._flush_thread.start()
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self._path
+
+    @property
+    def backup_paths(self) -> list[pathlib.Path]:
+        return [self._path.with_name(f'{self._path.name}.{i}') for i in range(1, self._backup_count + 1)]
+
+    def write(self, text: str) -> None:
+        with self._lock:
+            self._buffer.append(f'{text}\n')
+            if len(self._buffer) >= self._max_buffered_lines:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self._flush_interval):
+            self.flush()
+
+    def _open(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._fid = open(self._path, 'a', encoding=self._encoding, errors='replace')
+        self._size = self._fid.tell()
+
+    def _rotate(self) -> None:
+        if self._fid:
+            self._fid.close()
+            self._fid = None
+        if self._backup_count:
+            backups = self.backup_paths
+            backups[-1].unlink(missing_ok=True)
+            for src, dst in zip(reversed(backups[:-1]), reversed(backups[1:])):
+                if src.exists():
+                    src.replace(dst)
+            if self._path.exists():
+                self._path.replace(backups[0])
+        else:
+            self._path.unlink(missing_ok=True)
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer)
+        self._buffer = []
+        if not self._fid:
+            self._open()
+        # The size is counted in characters which is close enough for the encodings used
+        if self._size and self._size + len(data) > self._max_bytes:
+            self._rotate()
+            self._open()
+        self._fid.write(data)
+        self._fid.flush()
+        self._size += len(data)
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._lock:
+            self._flush()
+            if self._fid:
+                self._fid.close()
+                self._fid = None
+
+    def remove(self) -> None:
+        """Closes the writer and removes the log file and its backups"""
+        self.close()
+        for path in [self._path, *self.backup_paths]:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,149 @@
+import queue
+import threading
+import time
+from typing import Callable, Iterable
+
+_DONE = object()
+
+
+class Stage:
+    """One step in a Pipeline. func is called with the output of the previous stage (or with the input item
+    for the first stage) and the return value is handed to the next stage. The stage takes its input from a
+    queue of at most queue_depth items. size(item) is the number of units (e.g. packages) in an item."""
+
+    def __init__(self, name: str, func: Callable, queue_depth: int = 1, size: Callable[[object], int] = None):
+        self.name = name
+        self.func = func
+        self.queue_depth = max(1, int(queue_depth or 1))
+        self.size = size
+        self.input: queue.Queue = queue.Queue(maxsize=self.queue_depth)
+        self.nr_done = 0
+        self.nr_failed = 0
+        self.busy_seconds = 0.0
+
+    def _get_size(self, item) -> int:
+        return self.size(item) if self.size else 1
+
+    @property
+    def per_minute(self) -> float:
+        """Units handled per minute of work in this stage"""
+        if not self.busy_seconds:
+            return 0.0
+        return 60 * self.nr_done / self.busy_seconds
+
+    def get_stats(self) -> dict:
+        return dict(done=self.nr_done,
+                    failed=self.nr_failed,
+                    queued=self.input.qsize(),
+                    busy_seconds=round(self.busy_seconds, 2),
+                    per_minute=round(self.per_minute, 2))
+
+
+class Pipeline:
+    """Runs items through the stages in order, each stage in its own thread.
+
+    While one stage works on item n the previous stage can work on the next items, but never more than
+    the queue depth of the stage in between, so a slow stage holds back its producer instead of letting
+    work (and temporary files) pile up.
+
+    If an item fails, on_error(stage_name, item, exception) is called and the item is not passed on.
+    Without on_error the pipeline stops taking new items and run() raises the first exception.
+    If cancel_event is set no new items are started. Items already in the pipeline are finished."""
+
+    def __init__(self,
+                 stages: list[Stage],
+                 on_progress: Callable[['Pipeline'], None] = None,
+                 on_error: Callable[[str, object, Exception], None] = None,
+                 cancel_event: threading.Event = None):
+        self._stages = stages
+        self._on_progress = on_progress
+        self._on_error = on_error
+        self._cancel_event = cancel_event or threading.Event()
+        self._error: Exception | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def stages(self) -> list[Stage]:
+        return list(self._stages)
+
+    @property
+    def stats(self) -> dict[str, dict]:
+        return {stage.name: stage.get_stats() for stage in self._stages}
+
+    def wait_until_idle(self, stage_name: str) -> None:
+        """Blocks until the named stage has handled everything in its queue. Called from the stage before
+        it, this means that nothing is in flight downstream (e.g. before clearing temporary files)"""
+        for stage in self._stages:
+            if stage.name == stage_name:
+                stage.input.join()
+                return
+        raise KeyError(stage_name)
+
+    def run(self, items: Iterable) -> list:
+        """Blocks until all items have passed all stages. Returns the outputs of the last stage"""
+        outputs = []
+        threads = []
+        for i, stage in enumerate(self._stages):
+            next_stage = self._stages[i + 1] if i + 1 < len(self._stages) else None
+            thread = threading.Thread(target=self._run_stage, args=(stage, next_stage, outputs),
+                                      name=f'pipeline_{stage.name}', daemon=True)
+            thread.start()
+            threads.append(thread)
+        try:
+            for item in items:
+                if self._cancel_event.is_set():
+                    break
+                self._stages[0].input.put(item)
+        finally:
+            self._stages[0].input.put(_DONE)
+            for thread in threads:
+                thread.join()
+        if self._error:
+            raise self._error
+        return outputs
+
+    def _run_stage(self, stage: Stage, next_stage: Stage | None, outputs: list) -> None:
+        while True:
+            item = stage.input.get()
+            try:
+                if item is _DONE:
+                    if next_stage:
+                        next_stage.input.put(_DONE)
+                    return
+                if self._error:
+                    # Stopping after an error. Let the remaining items drain
+                    continue
+                self._run_item(stage, next_stage, item, outputs)
+            finally:
+                stage.input.task_done()
+
+    def _run_item(self, stage: Stage, next_stage: Stage | None, item, outputs: list) -> None:
+        t0 = time.perf_counter()
+        try:
+            result = stage.func(item)
+        except Exception as e:
+            stage.busy_seconds += time.perf_counter() - t0
+            stage.nr_failed += stage._get_size(item)
+            self._handle_error(stage, item, e)
+            return
+        stage.busy_seconds += time.perf_counter() - t0
+        stage.nr_done += stage._get_size(item)
+        self._report_progress()
+        if next_stage:
+            next_stage.input.put(result)
+        else:
+            outputs.append(result)
+
+    def _handle_error(self, stage: Stage, item, exc: Exception) -> None:
+        if self._on_error:
+            self._on_error(stage.name, item, exc)
+            self._report_progress()
+            return
+        with self._lock:
+            if not self._error:
+                self._error = exc
+        self._cancel_event.set()
+
+    def _report_progress(self) -> None:
+        if self._on_progress:
+            self._on_progress(self)
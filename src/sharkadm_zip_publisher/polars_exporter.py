@@ -0,0 +1,79 @@
+import os
+import pathlib
+
+import polars as pl
+
+SEPARATOR = '\t'
+QUOTE_CHAR = '"'
+
+
+class PolarsSHARKdataTxtExporter:
+    """Writes shark_data.txt directly from a polars DataFrame.
+
+    The output is byte-identical to exporting the pandas version of the frame with
+    DataFrame.to_csv(sep='\\t', index=False, encoding=encoding), that is csv.QUOTE_MINIMAL with
+    os.linesep as line terminator, but without the conversion to pandas. The rows are encoded
+    and written in chunks. Only frames where all columns are strings can be exported
+    (see can_export), other dtypes are formatted differently by pandas."""
+
+    def __init__(self,
+                 export_file_path: str | pathlib.Path,
+                 encoding: str = 'cp1252',
+                 exclude_columns: tuple[str, ...] = (),
+                 chunk_size: int = 100_000,
+                 line_terminator: str = os.linesep):
+        self._export_file_path = pathlib.Path(export_file_path)
+        self._encoding = encoding
+        self._exclude_columns = exclude_columns
+        self._chunk_size = chunk_size
+        self._line_terminator = line_terminator
+
+    @property
+    def export_file_path(self) -> pathlib.Path:
+        return self._export_file_path
+
+    @staticmethod
+    def can_export(data: pl.DataFrame) -> bool:
+        return all(dtype == pl.String for dtype in data.dtypes)
+
+    @property
+    def _quote_pattern(self) -> str:
+        chars = {SEPARATOR, QUOTE_CHAR, *self._line_terminator}
+        return '[' + ''.join(sorted(chars)).replace('\n', '\\n').replace('\r', '\\r').replace('\t', '\\t') + ']'
+
+    def _quote(self, value: str) -> str:
+        if any(char in value for char in (SEPARATOR, QUOTE_CHAR, *self._line_terminator)):
+            return QUOTE_CHAR + value.replace(QUOTE_CHAR, QUOTE_CHAR * 2) + QUOTE_CHAR
+        return value
+
+    def _get_field_expr(self, column: str, single_column: bool) -> pl.Expr:
+        value = pl.col(column).fill_null('')
+        quoted = pl.lit(QUOTE_CHAR) + value.str.replace_all(QUOTE_CHAR, QUOTE_CHAR * 2, literal=True) + pl.lit(QUOTE_CHAR)
+        needs_quote = value.str.contains(self._quote_pattern)
+        if single_column:
+            # The csv module quotes a row consisting of one empty field
+            needs_quote = needs_quote | (value == '')
+        return pl.when(needs_quote).then(quoted).otherwise(value)
+
+    def _get_line_expr(self, columns: list[str]) -> pl.Expr:
+        fields = [self._get_field_expr(col, len(columns) == 1) for col in columns]
+        return pl.concat_str(fields, separator=SEPARATOR).alias('line')
+
+    def _get_header(self, columns: list[str]) -> str:
+        if len(columns) == 1 and not columns[0]:
+            return QUOTE_CHAR * 2
+        return SEPARATOR.join(self._quote(col) for col in columns)
+
+    def export(self, data: pl.DataFrame) -> pathlib.Path:
+        if not self.can_export(data):
+            raise TypeError('Only frames where all columns are strings can be exported')
+        columns = [col for col in data.columns if col not in self._exclude_columns]
+        line_expr = self._get_line_expr(columns)
+        self._export_file_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._export_file_path, 'wb') as fid:
+            fid.write((self._get_header(columns) + self._line_terminator).encode(self._encoding))
+            for offset in range(0, data.height, self._chunk_size):
+                lines = data.slice(offset, self._chunk_size).select(line_expr).to_series()
+                text = self._line_terminator.join(lines) + self._line_terminator
+                fid.write(text.encode(self._encoding))
+        return self._export_file_path
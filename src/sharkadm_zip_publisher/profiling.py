@@ -0,0 +1,144 @@
+import contextlib
+import csv
+import ctypes
+import datetime
+import json
+import pathlib
+import sys
+import time
+from typing import Callable
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+FIELDS = [
+    'package',
+    'stage',
+    'name',
+    'seconds',
+    'rows_before',
+    'rows_after',
+    'peak_rss_delta_mb',
+]
+
+
+def _get_windows_peak_rss() -> int | None:
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ('cb', ctypes.c_ulong),
+            ('PageFaultCount', ctypes.c_ulong),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+    try:
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        return None
+
+
+def get_peak_rss() -> int | None:
+    """Returns the peak resident set size (bytes) of the current process or None if not available"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            return peak
+        return peak * 1024
+    if sys.platform == 'win32':
+        return _get_windows_peak_rss()
+    return None
+
+
+class TransformerProfiler:
+    """Records wall time, number of rows before/after and the increase in peak RSS for each step.
+
+    Peak RSS is a high-water mark for the whole process, so peak_rss_delta_mb shows how much a step
+    raised the peak. It is 0 for steps that stayed below an earlier peak."""
+
+    def __init__(self):
+        self._records: list[dict] = []
+
+    @property
+    def records(self) -> list[dict]:
+        return list(self._records)
+
+    def pop_records(self) -> list[dict]:
+        records = self._records
+        self._records = []
+        return records
+
+    def extend(self, records: list[dict]) -> None:
+        self._records.extend(records)
+
+    @staticmethod
+    def _get_rows(get_rows: Callable[[], int] | None) -> int | None:
+        if get_rows is None:
+            return None
+        try:
+            return get_rows()
+        except Exception:
+            return None
+
+    @contextlib.contextmanager
+    def measure(self, package: str, stage: str, name: str, get_rows: Callable[[], int] = None):
+        rows_before = self._get_rows(get_rows)
+        peak_before = get_peak_rss()
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            peak_after = get_peak_rss()
+            peak_delta = None
+            if peak_before is not None and peak_after is not None:
+                peak_delta = round((peak_after - peak_before) / 1024 / 1024, 3)
+            self._records.append(dict(
+                package=package,
+                stage=stage,
+                name=name,
+                seconds=round(seconds, 6),
+                rows_before=rows_before,
+                rows_after=self._get_rows(get_rows),
+                peak_rss_delta_mb=peak_delta,
+            ))
+
+    def get_summary(self) -> list[dict]:
+        """Total time per step, slowest first"""
+        summary = {}
+        for record in self._records:
+            key = (record['stage'], record['name'])
+            item = summary.setdefault(key, dict(stage=record['stage'], name=record['name'],
+                                                count=0, seconds=0.0, max_peak_rss_delta_mb=0.0))
+            item['count'] += 1
+            item['seconds'] += record['seconds']
+            item['max_peak_rss_delta_mb'] = max(item['max_peak_rss_delta_mb'], record['peak_rss_delta_mb'] or 0)
+        return sorted(summary.values(), key=lambda x: x['seconds'], reverse=True)
+
+    def save(self, directory: str | pathlib.Path, tag: str = 'transformer_profile') -> list[pathlib.Path]:
+        """Saves the records as csv and the records and summary as json. Returns the saved paths"""
+        if not self._records:
+            return []
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = f'{datetime.datetime.now().strftime("%Y%m%d_%H%M%S")}_{tag}'
+        csv_path = directory / f'{stem}.csv'
+        with open(csv_path, 'w', newline='', encoding='utf8') as fid:
+            writer = csv.DictWriter(fid, fieldnames=FIELDS, delimiter='\t')
+            writer.writeheader()
+            writer.writerows(self._records)
+        json_path = directory / f'{stem}.json'
+        with open(json_path, 'w', encoding='utf8') as fid:
+            json.dump(dict(summary=self.get_summary(), records=self._records), fid, indent=2)
+        return [csv_path, json_path]
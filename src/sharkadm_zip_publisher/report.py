@@ -0,0 +1,269 @@
+import contextlib
+import csv
+import datetime
+import pathlib
+from typing import Iterator
+
+from sharkadm_zip_publisher.exceptions import LogReportError
+
+LEVELS = ('debug', 'info', 'warning', 'error', 'critical')
+
+COLUMNS = ('log_type', 'level', 'msg', 'count', 'items')
+
+FORMATS = ('xlsx', 'csv', 'parquet')
+
+# Rows per sheet in xlsx (the limit is 1048576 including the header)
+XLSX_MAX_ROWS = 1_000_000
+PARQUET_BATCH_SIZE = 10_000
+
+
+class ReportFilter:
+    """Selects log events for one report. level is like '>warning' (above warning), '>=info' or 'error'"""
+
+    def __init__(self, tag: str = '', level: str = None, log_types: list[str] = None):
+        self.tag = tag
+        self._log_types = {log_type.lower() for log_type in log_types or []}
+        self._levels = set(LEVELS)
+        if level:
+            self._levels = self._get_levels(level.lower())
+
+    @staticmethod
+    def _get_levels(level: str) -> set[str]:
+        for op in ('>=', '<=', '>', '<', '='):
+            if level.startswith(op):
+                break
+        else:
+            op = '='
+        name = level[len(op):] if level.startswith(op) else level
+        index = LEVELS.index(name)
+        if op == '>':
+            return set(LEVELS[index + 1:])
+        if op == '>=':
+            return set(LEVELS[index:])
+        if op == '<':
+            return set(LEVELS[:index])
+        if op == '<=':
+            return set(LEVELS[:index + 1])
+        return {name}
+
+    def match(self, event: dict) -> bool:
+        if self._log_types and str(event['log_type']).lower() not in self._log_types:
+            return False
+        return str(event['level']).lower() in self._levels
+
+
+# The same reports as before: all logs, transformation above warning and validation above info
+DEFAULT_FILTERS = (
+    ReportFilter(),
+    ReportFilter('transformation', '>warning', ['transformation']),
+    ReportFilter('validation', '>info', ['validation']),
+)
+
+
+def _to_cell(value) -> str | int | float | None:
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, (list, tuple, set)):
+        return '; '.join(str(item) for item in value)
+    return str(value)
+
+
+def get_log_data(logger) -> dict:
+    """All data in sharkadm's logger. reset_filter() clears the filter set by SHARKadmLogger.filter and
+    data is the (filtered) log: log_type -> level -> msg -> info. This is what create_xlsx_report reads"""
+    try:
+        return logger.reset_filter().data
+    except AttributeError as e:
+        raise LogReportError(f'Can not read the log data from {type(logger).__name__}: {e}') from e
+
+
+def get_count(event: dict) -> int:
+    """Number of times the event was logged"""
+    count = _to_int(event.get('count'))
+    return 1 if count is None else count
+
+
+def iter_log_events(data: dict) -> Iterator[dict]:
+    """Flattens logger data (log_type -> level -> msg -> info) to one dict per message.
+    Raises LogReportError if data does not have that structure"""
+    if not isinstance(data, dict):
+        raise LogReportError(f'Unknown log data: {type(data)}')
+    for log_type, level_data in data.items():
+        if not isinstance(level_data, dict):
+            raise LogReportError(f'Unknown log data for {log_type}')
+        for level, msg_data in level_data.items():
+            if not isinstance(msg_data, dict):
+                raise LogReportError(f'Unknown log data for {log_type}/{level}')
+            if str(level).lower() not in LEVELS:
+                raise LogReportError(f'Unknown log level for {log_type}: {level}')
+            for msg, info in msg_data.items():
+                event = dict(log_type=log_type, level=level, msg=msg)
+                if isinstance(info, dict):
+                    for key, value in info.items():
+                        event[key] = _to_cell(value)
+                else:
+                    event['count'] = _to_cell(info)
+                if event.get('count') is not None and _to_int(event['count']) is None:
+                    raise LogReportError(f'Count is not a number for {log_type}/{level}/{msg}: {event["count"]}')
+                yield event
+
+
+def get_log_events(data: dict) -> list[dict]:
+    """All events in data. Every event is checked, so a LogReportError is raised before anything is written"""
+    return list(iter_log_events(data))
+
+
+class ReportWriter:
+    suffix = ''
+
+    def __init__(self, path: pathlib.Path, columns: tuple[str, ...] = COLUMNS):
+        self.path = path.with_suffix(self.suffix)
+        self.columns = columns
+        self.nr_rows = 0
+
+    def _row(self, event: dict) -> list:
+        return [event.get(col) for col in self.columns]
+
+    def write(self, event: dict) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+
+class XlsxReportWriter(ReportWriter):
+    """Streams rows to the file with openpyxl in write only mode. Memory use does not grow with the number of rows"""
+    suffix = '.xlsx'
+
+    def __init__(self, *args, **kwargs):
+        import openpyxl
+        super().__init__(*args, **kwargs)
+        self._workbook = openpyxl.Workbook(write_only=True)
+        self._sheet = None
+        self._nr_sheet_rows = XLSX_MAX_ROWS
+
+    def _new_sheet(self) -> None:
+        title = 'log' if not self._workbook.worksheets else f'log_{len(self._workbook.worksheets) + 1}'
+        self._sheet = self._workbook.create_sheet(title)
+        self._sheet.append(list(self.columns))
+        self._nr_sheet_rows = 0
+
+    def write(self, event: dict) -> None:
+        if self._nr_sheet_rows >= XLSX_MAX_ROWS:
+            self._new_sheet()
+        self._sheet.append(self._row(event))
+        self._nr_sheet_rows += 1
+        self.nr_rows += 1
+
+    def close(self) -> None:
+        if not self._sheet:
+            self._new_sheet()
+        self._workbook.save(self.path)
+
+
+class CsvReportWriter(ReportWriter):
+    suffix = '.csv'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._fid = open(self.path, 'w', encoding='utf8', newline='')
+        self._writer = csv.writer(self._fid, delimiter='\t')
+        self._writer.writerow(self.columns)
+
+    def write(self, event: dict) -> None:
+        self._writer.writerow(self._row(event))
+        self.nr_rows += 1
+
+    def close(self) -> None:
+        self._fid.close()
+
+
+class ParquetReportWriter(ReportWriter):
+    """Writes row groups of PARQUET_BATCH_SIZE rows with pyarrow"""
+    suffix = '.parquet'
+
+    def __init__(self, *args, **kwargs):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        super().__init__(*args, **kwargs)
+        self._pa = pa
+        self._schema = pa.schema([(col, pa.int64() if col == 'count' else pa.string()) for col in self.columns])
+        self._writer = pq.ParquetWriter(self.path, self._schema)
+        self._batch: list[dict] = []
+
+    def write(self, event: dict) -> None:
+        self._batch.append({col: (_to_int(event.get(col)) if col == 'count' else _to_str(event.get(col)))
+                            for col in self.columns})
+        self.nr_rows += 1
+        if len(self._batch) >= PARQUET_BATCH_SIZE:
+            self._write_batch()
+
+    def _write_batch(self) -> None:
+        if not self._batch:
+            return
+        self._writer.write_table(self._pa.Table.from_pylist(self._batch, schema=self._schema))
+        self._batch = []
+
+    def close(self) -> None:
+        self._write_batch()
+        self._writer.close()
+
+
+def _to_str(value) -> str | None:
+    if value is None:
+        return None
+    return str(value)
+
+
+def _to_int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+WRITERS = {
+    'xlsx': XlsxReportWriter,
+    'csv': CsvReportWriter,
+    'parquet': ParquetReportWriter,
+}
+
+
+def create_reports(data: dict,
+                   export_directory: str | pathlib.Path,
+                   fmt: str = 'xlsx',
+                   filters: tuple[ReportFilter, ...] = DEFAULT_FILTERS,
+                   name: str = 'sharkadm_log') -> list[pathlib.Path]:
+    """Writes one report per filter in a single pass over the log events.
+    Raises LogReportError if the log data is not understood. No files are created in that case,
+    and files already created are removed if writing fails"""
+    if fmt not in WRITERS:
+        raise ValueError(f'Unknown report format: {fmt}. Choose from {FORMATS}')
+    events = get_log_events(data)
+    export_directory = pathlib.Path(export_directory)
+    export_directory.mkdir(parents=True, exist_ok=True)
+    time_str = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    writers = []
+    try:
+        for filt in filters:
+            file_name = '_'.join(part for part in [time_str, name, filt.tag] if part)
+            writers.append((filt, WRITERS[fmt](export_directory / file_name)))
+        for event in events:
+            for filt, writer in writers:
+                if filt.match(event):
+                    writer.write(event)
+        for _, writer in writers:
+            writer.close()
+    except Exception:
+        for _, writer in writers:
+            with contextlib.suppress(Exception):
+                writer.close()
+            writer.path.unlink(missing_ok=True)
+        raise
+    return [writer.path for _, writer in writers]
+
+
+def create_log_reports(logger, export_directory: str | pathlib.Path, fmt: str = 'xlsx') -> list[pathlib.Path]:
+    """Reports for all logs, transformation (>warning) and validation (>info) from the sharkadm logger.
+    Raises LogReportError if the log data can not be read"""
+    return create_reports(get_log_data(logger), export_directory, fmt=fmt)
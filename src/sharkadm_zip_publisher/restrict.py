@@ -1,7 +1,8 @@
+import pathlib
+
 from sharkadm import utils
 
 CONFIG_DIR = utils.get_root_directory() / 'zip_archive_publisher' / 'config'
-CONFIG_DIR.mkdir(parents=True, exist_ok=True)
 
 UNRESTRICTED_PACKAGES_PATH = CONFIG_DIR / 'unrestricted_packages.txt'  # Is not valid at the moment
 
@@ -247,7 +248,13 @@ REMOVE_VALUES_FOR_PARAMETERS.extend(REMOVE_PARAMETERS)
 # ]
 
 
+def get_config_directory() -> pathlib.Path:
+    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    return CONFIG_DIR
+
+
 def _reset_unrestricted_packages() -> None:
+    get_config_directory()
     with open(UNRESTRICTED_PACKAGES_PATH, 'w') as fid:
         pass
 
@@ -0,0 +1,225 @@
+import functools
+import re
+
+import polars as pl
+from sharkadm import adm_logger, transformers
+
+from sharkadm_zip_publisher import restrict
+
+# Column groups in restrict that are given as regular expressions
+COLUMN_GROUPS = dict(
+    remove_values=restrict.REMOVE_VALUES_FOR_COLUMNS,
+    comments=restrict.COMMENT_COLUMNS,
+    all_but_ox=restrict.ALL_BUT_OX,
+)
+
+# Number of schemas (column lists) for which the matching columns are remembered
+MAX_CACHED_SCHEMAS = 256
+
+
+def compile_patterns(patterns: list[str]) -> re.Pattern:
+    """One regular expression that fullmatches a column matching any of patterns (duplicates removed)"""
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in dict.fromkeys(patterns)))
+
+
+class RestrictionRuleSet:
+    """The restrict settings compiled once per process (see get_rule_set).
+
+    Parameters are deduplicated into a frozenset, each column group is compiled into one regular
+    expression and the columns matching a group are resolved once per schema."""
+
+    def __init__(self, column_groups: dict[str, list[str]], parameters: list[str]):
+        self.parameters = frozenset(parameters)
+        # Sorted so that the transformers (and the cache fingerprint) are the same in every process
+        self.sorted_parameters = tuple(sorted(self.parameters))
+        self._unique_patterns = {name: tuple(dict.fromkeys(patterns)) for name, patterns in column_groups.items()}
+        self._patterns = {name: compile_patterns(patterns) for name, patterns in self._unique_patterns.items()}
+        self._columns: dict[tuple[str, tuple[str, ...]], tuple[str, ...]] = {}
+        self._parameter_exprs: dict[str, pl.Expr] = {}
+
+    @classmethod
+    def from_restrict_settings(cls) -> 'RestrictionRuleSet':
+        return cls(column_groups=COLUMN_GROUPS, parameters=restrict.REMOVE_VALUES_FOR_PARAMETERS)
+
+    @property
+    def column_groups(self) -> list[str]:
+        return list(self._patterns)
+
+    def get_patterns(self, group: str) -> tuple[str, ...]:
+        """The patterns of group without duplicates"""
+        return self._unique_patterns[group]
+
+    def get_columns(self, group: str, columns: list[str]) -> tuple[str, ...]:
+        """Columns (in schema order) matching any of the patterns in group"""
+        key = (group, tuple(columns))
+        matching = self._columns.get(key)
+        if matching is None:
+            pattern = self._patterns[group]
+            matching = tuple(col for col in columns if pattern.fullmatch(col))
+            if len(self._columns) >= MAX_CACHED_SCHEMAS:
+                self._columns.clear()
+            self._columns[key] = matching
+        return matching
+
+    def get_parameter_expr(self, parameter_column: str = 'parameter') -> pl.Expr:
+        """True for rows with a parameter to restrict"""
+        expr = self._parameter_exprs.get(parameter_column)
+        if expr is None:
+            expr = pl.col(parameter_column).is_in(self.sorted_parameters)
+            self._parameter_exprs[parameter_column] = expr
+        return expr
+
+
+@functools.cache
+def get_rule_set() -> RestrictionRuleSet:
+    return RestrictionRuleSet.from_restrict_settings()
+
+
+class ReplaceRule:
+    """Replace the value in the columns of column_group (or column, or value_column for the parameters
+    in the rule set if parameters is True) where data_filter is True"""
+
+    def __init__(self,
+                 replace_value: str,
+                 data_filter,
+                 column_group: str = None,
+                 column: str = None,
+                 parameters: bool = False,
+                 valid_data_types: tuple[str, ...] = (),
+                 rule_set: RestrictionRuleSet = None):
+        self.replace_value = replace_value
+        self.data_filter = data_filter
+        self.column_group = column_group
+        self.column = column
+        self.parameters = parameters
+        self.valid_data_types = tuple(valid_data_types)
+        self.rule_set = rule_set or get_rule_set()
+
+    def is_valid_for(self, data_holder) -> bool:
+        if not self.valid_data_types:
+            return True
+        return data_holder.data_type_internal in self.valid_data_types
+
+    def get_columns(self, columns: list[str], value_column: str, parameter_column: str) -> list[str]:
+        if self.parameters:
+            return [value_column] if value_column in columns and parameter_column in columns else []
+        if self.column:
+            return [self.column] if self.column in columns else []
+        if self.column_group:
+            return list(self.rule_set.get_columns(self.column_group, columns))
+        return []
+
+    def get_row_expr(self, parameter_column: str) -> pl.Expr | None:
+        if not self.parameters:
+            return None
+        return self.rule_set.get_parameter_expr(parameter_column)
+
+
+class PolarsRestrictData(transformers.PolarsTransformer):
+    """Applies all value replacements of the restricted transformers in one pass.
+
+    Replaces the chain of PolarsRemoveValueInColumns, PolarsRemoveValueInRowsForParameters and
+    PolarsReplaceColumnWithMask. Each distinct filter mask is evaluated once on the incoming frame
+    and all replacements are done in a single with_columns in a lazy plan. For a column targeted by
+    several rules the last rule wins, as in the chain. This gives the same result as the chain as long
+    as no rule replaces a column that a later rule's filter reads (true for the rules in restrict)."""
+
+    def __init__(self, rules: list[ReplaceRule],
+                 parameter_column: str = 'parameter',
+                 value_column: str = 'value',
+                 **kwargs):
+        super().__init__(**kwargs)
+        self._rules = rules
+        self._parameter_column = parameter_column
+        self._value_column = value_column
+
+    @staticmethod
+    def get_transformer_description() -> str:
+        return 'Replaces restricted values (depth, secchi, comments, parameters, cover and ox) in one pass'
+
+    @classmethod
+    def from_restrict_settings(cls,
+                               main_filter,
+                               r_filter,
+                               par_cover_filter,
+                               rep_par_cover_filter,
+                               secchi_qf_filter) -> 'PolarsRestrictData':
+        """Same rules (and order) as the restricted transformers in archive_publisher.create_transformers"""
+        rules = [
+            ReplaceRule(column_group='remove_values',
+                        replace_value=restrict.REPLACE_COLUMN_VALUE,
+                        data_filter=main_filter),
+            ReplaceRule(column_group='comments',
+                        replace_value=restrict.REPLACE_COMMENT_VALUE,
+                        data_filter=main_filter),
+            ReplaceRule(parameters=True,
+                        replace_value=restrict.REPLACE_PARAMETER_VALUE,
+                        data_filter=main_filter),
+            ReplaceRule(column='scientific_name',
+                        valid_data_types=('epibenthos',),
+                        replace_value=restrict.REPLACE_SCIENTIFIC_NAME_VALUE,
+                        data_filter=main_filter & par_cover_filter),
+            ReplaceRule(column='reported_scientific_name',
+                        valid_data_types=('epibenthos',),
+                        replace_value=restrict.REPLACE_SCIENTIFIC_NAME_VALUE,
+                        data_filter=main_filter & rep_par_cover_filter),
+            ReplaceRule(column='quality_flag',
+                        valid_data_types=('physicalchemical',),
+                        replace_value=restrict.REPLACE_SECCHI_VALUE,
+                        data_filter=main_filter & secchi_qf_filter),
+            # No ox
+            ReplaceRule(column_group='all_but_ox',
+                        replace_value=restrict.REPLACE_COLUMN_VALUE,
+                        data_filter=r_filter),
+        ]
+        return cls(rules)
+
+    def _get_replacement_exprs(self, data_holder, mask_columns: dict[int, str]) -> list[pl.Expr]:
+        columns = data_holder.data.columns
+        column_rules: dict[str, list[tuple[ReplaceRule, str]]] = {}
+        for rule in self._rules:
+            if not rule.is_valid_for(data_holder):
+                continue
+            for col in rule.get_columns(columns, self._value_column, self._parameter_column):
+                column_rules.setdefault(col, []).append((rule, mask_columns[id(rule.data_filter)]))
+
+        exprs = []
+        for col, rules in column_rules.items():
+            expr = None
+            # The last rule has the highest priority
+            for rule, mask_column in reversed(rules):
+                condition = pl.col(mask_column)
+                row_expr = rule.get_row_expr(self._parameter_column)
+                if row_expr is not None:
+                    condition = condition & row_expr
+                if expr is None:
+                    expr = pl.when(condition).then(pl.lit(rule.replace_value))
+                else:
+                    expr = expr.when(condition).then(pl.lit(rule.replace_value))
+            exprs.append(expr.otherwise(pl.col(col)).alias(col))
+        return exprs
+
+    def _get_masks(self, data_holder) -> dict[int, pl.Series]:
+        masks = {}
+        for rule in self._rules:
+            if not rule.is_valid_for(data_holder) or id(rule.data_filter) in masks:
+                continue
+            if not rule.get_columns(data_holder.data.columns, self._value_column, self._parameter_column):
+                continue
+            masks[id(rule.data_filter)] = rule.data_filter.get_filter_mask(data_holder)
+        return masks
+
+    def _transform(self, data_holder) -> None:
+        masks = self._get_masks(data_holder)
+        if not masks:
+            return
+        mask_columns = {key: f'__restrict_mask_{i}' for i, key in enumerate(masks)}
+        exprs = self._get_replacement_exprs(data_holder, mask_columns)
+        data_holder.data = (
+            data_holder.data.lazy()
+            .with_columns([pl.lit(mask).fill_null(False).alias(mask_columns[key]) for key, mask in masks.items()])
+            .with_columns(exprs)
+            .drop(list(mask_columns.values()))
+            .collect()
+        )
+        adm_logger.log_transformation(f'Restricted values in {len(exprs)} columns', level=adm_logger.DEBUG)
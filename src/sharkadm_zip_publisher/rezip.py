@@ -0,0 +1,128 @@
+import copy
+import pathlib
+import shutil
+import struct
+import zipfile
+import zlib
+
+LOCAL_HEADER_SIZE = 30
+DATA_DESCRIPTOR_FLAG = 0x08
+ZIP64_EXTRA_ID = 0x0001
+CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_CHANGED_MEMBERS = ('shark_data.txt',)
+
+
+def _strip_zip64_extra(extra: bytes) -> bytes:
+    """The zip64 extra field is added again by ZipInfo.FileHeader if needed"""
+    stripped = b''
+    i = 0
+    while i + 4 <= len(extra):
+        header_id, size = struct.unpack('<HH', extra[i:i + 4])
+        if header_id != ZIP64_EXTRA_ID:
+            stripped += extra[i:i + 4 + size]
+        i += 4 + size
+    return stripped
+
+
+def _get_data_offset(source_fid, info: zipfile.ZipInfo) -> int:
+    source_fid.seek(info.header_offset)
+    header = source_fid.read(LOCAL_HEADER_SIZE)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    return info.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length
+
+
+def _copy_raw_member(source_fid, info: zipfile.ZipInfo, target_zip: zipfile.ZipFile) -> None:
+    """Copies the compressed bytes of a member without decompressing them"""
+    new_info = copy.copy(info)
+    new_info.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+    new_info.extra = _strip_zip64_extra(info.extra)
+    new_info.header_offset = target_zip.fp.tell()
+    target_zip.fp.write(new_info.FileHeader())
+
+    source_fid.seek(_get_data_offset(source_fid, info))
+    remaining = info.compress_size
+    while remaining:
+        chunk = source_fid.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise EOFError(f'Unexpected end of archive when copying {info.filename}')
+        target_zip.fp.write(chunk)
+        remaining -= len(chunk)
+
+    target_zip.filelist.append(new_info)
+    target_zip.NameToInfo[new_info.filename] = new_info
+    target_zip.start_dir = target_zip.fp.tell()
+    target_zip._didModify = True
+
+
+def _get_crc(path: pathlib.Path) -> int:
+    crc = 0
+    with open(path, 'rb') as fid:
+        while chunk := fid.read(CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _is_unchanged(path: pathlib.Path, info: zipfile.ZipInfo) -> bool:
+    """The file on disk has the same size and crc as the member in the zip"""
+    if path.stat().st_size != info.file_size:
+        return False
+    return _get_crc(path) == info.CRC
+
+
+def _get_directory_members(directory: pathlib.Path) -> dict[str, pathlib.Path]:
+    members = {}
+    for path in sorted(directory.rglob('*')):
+        arcname = path.relative_to(directory).as_posix()
+        if path.is_dir():
+            arcname += '/'
+        members[arcname] = path
+    return members
+
+
+def rezip_directory(directory: str | pathlib.Path,
+                    source_zip_path: str | pathlib.Path,
+                    target_zip_path: str | pathlib.Path,
+                    changed_members: tuple[str, ...] = DEFAULT_CHANGED_MEMBERS) -> pathlib.Path:
+    """Creates target_zip_path with the content of the (unzipped and modified) directory.
+
+    Members in changed_members, members whose size or crc differs from the source zip and new files
+    are compressed from the directory. All other members are copied from source_zip_path as raw
+    compressed bytes. Reading a file for its crc is much faster than compressing it.
+    Members no longer present in the directory are left out.
+    Falls back to compressing the whole directory if the layout does not match the source zip."""
+    directory = pathlib.Path(directory)
+    target_zip_path = pathlib.Path(target_zip_path)
+    disk_members = _get_directory_members(directory)
+
+    with zipfile.ZipFile(source_zip_path) as source_zip:
+        source_infos = source_zip.infolist()
+        if not any(info.filename in disk_members for info in source_infos if not info.is_dir()):
+            return zip_directory(directory, target_zip_path)
+
+        with open(source_zip_path, 'rb') as source_fid, \
+                zipfile.ZipFile(target_zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as target_zip:
+            written = set()
+            for info in source_infos:
+                path = disk_members.get(info.filename)
+                if path is None or info.filename in written:
+                    continue
+                written.add(info.filename)
+                if info.is_dir():
+                    _copy_raw_member(source_fid, info, target_zip)
+                elif info.filename in changed_members or not _is_unchanged(path, info):
+                    target_zip.write(path, info.filename)
+                else:
+                    _copy_raw_member(source_fid, info, target_zip)
+            for arcname, path in disk_members.items():
+                if arcname in written:
+                    continue
+                target_zip.write(path, arcname)
+    return target_zip_path
+
+
+def zip_directory(directory: str | pathlib.Path, target_zip_path: str | pathlib.Path) -> pathlib.Path:
+    """Compresses the whole directory the same way as shutil.make_archive"""
+    target_zip_path = pathlib.Path(target_zip_path)
+    base_name = str(target_zip_path.parent / target_zip_path.name.removesuffix('.zip'))
+    return pathlib.Path(shutil.make_archive(base_name, 'zip', str(directory)))
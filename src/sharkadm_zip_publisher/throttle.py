@@ -0,0 +1,40 @@
+import threading
+import time
+
+
+class Throttle:
+    """Limits the number of packages handled per minute. max_per_minute=0 means no limit"""
+
+    def __init__(self, max_per_minute: float = 0):
+        self._max_per_minute = max(0.0, float(max_per_minute or 0))
+        self._next_time = None
+
+    @property
+    def max_per_minute(self) -> float:
+        return self._max_per_minute
+
+    @property
+    def interval(self) -> float:
+        if not self._max_per_minute:
+            return 0.0
+        return 60 / self._max_per_minute
+
+    def reset(self) -> None:
+        self._next_time = None
+
+    def wait(self, nr: int = 1, cancel_event: threading.Event = None) -> float:
+        """Blocks until nr more packages are allowed to start (or cancel_event is set).
+        Returns the number of seconds slept"""
+        if not self._max_per_minute:
+            return 0.0
+        now = time.monotonic()
+        if self._next_time is None or self._next_time < now:
+            self._next_time = now
+        sleep_time = self._next_time - now
+        if sleep_time > 0:
+            if cancel_event:
+                cancel_event.wait(sleep_time)
+            else:
+                time.sleep(sleep_time)
+        self._next_time += self.interval * nr
+        return sleep_time
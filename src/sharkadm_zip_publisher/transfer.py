@@ -0,0 +1,127 @@
+import concurrent.futures
+import contextlib
+import hashlib
+import os
+import pathlib
+import shutil
+import uuid
+
+from sharkadm_zip_publisher.exceptions import CopyVerificationError
+
+TEMP_SUFFIX = '.tmp'
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def get_temp_path(target_path: pathlib.Path) -> pathlib.Path:
+    """Hidden name that does not end with .zip so that a partly written file is never picked up as a package"""
+    return target_path.with_name(f'.{target_path.name}.{uuid.uuid4().hex[:8]}{TEMP_SUFFIX}')
+
+
+def get_sha256(path: str | pathlib.Path, chunk_size: int = CHUNK_SIZE) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as fid:
+        while chunk := fid.read(chunk_size):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def verify_copy(source_path: str | pathlib.Path, target_path: str | pathlib.Path, checksum: str = None) -> None:
+    """Raises CopyVerificationError if the size of target_path differs from source_path or, if checksum
+    (sha256 of the source) is given, if the target is read back with another checksum"""
+    source_size = os.stat(source_path).st_size
+    target_size = os.stat(target_path).st_size
+    if source_size != target_size:
+        raise CopyVerificationError(
+            f'Size of {target_path} ({target_size}) differs from {source_path} ({source_size})')
+    if checksum is None:
+        return
+    target_checksum = get_sha256(target_path)
+    if target_checksum != checksum:
+        raise CopyVerificationError(
+            f'Checksum of {target_path} ({target_checksum}) differs from {source_path} ({checksum})')
+
+
+def atomic_copy(source_path: str | pathlib.Path, target_path: str | pathlib.Path) -> pathlib.Path:
+    """Copies to a temporary name in the target directory, verifies the copy (size and sha256) and renames
+    it to target_path. target_path is replaced if it exists. Other processes see either the old or the
+    complete new file."""
+    target_path = pathlib.Path(target_path)
+    temp_path = get_temp_path(target_path)
+    try:
+        shutil.copy2(source_path, temp_path)
+        verify_copy(source_path, temp_path, checksum=get_sha256(source_path))
+        os.replace(temp_path, target_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return target_path
+
+
+def _is_same_filesystem(path_1: pathlib.Path, path_2: pathlib.Path) -> bool:
+    try:
+        return os.stat(path_1).st_dev == os.stat(path_2).st_dev
+    except OSError:
+        return False
+
+
+def _link_or_copy(source_path: pathlib.Path, temp_path: pathlib.Path) -> bool:
+    """Returns True if temp_path is a hardlink to source_path"""
+    try:
+        os.link(source_path, temp_path)
+        return True
+    except OSError:
+        shutil.copy2(source_path, temp_path)
+        return False
+
+
+def fan_out_copy(source_path: str | pathlib.Path,
+                 *target_paths: str | pathlib.Path,
+                 chunk_size: int = CHUNK_SIZE,
+                 verify_checksums: bool = False) -> str:
+    """Copies source_path to all target_paths reading the source only once. Returns the sha256 of the source.
+
+    The source is read in chunks and each chunk is written to all targets at the same time while the
+    checksum is computed. Targets on the same filesystem as an already written target are hardlinked
+    to it instead (copied if hardlinks are not supported). As in atomic_copy every target is written
+    to a temporary name, verified and then renamed in place. The verification compares the size of each
+    target with the source, the data written is the data the checksum is computed from. With
+    verify_checksums the copies are also read back and compared with the checksum, which doubles the
+    I/O on the targets. A hardlink shares the data of the target it links to and is never read again."""
+    source_path = pathlib.Path(source_path)
+    target_paths = [pathlib.Path(path) for path in target_paths]
+    written_targets: list[pathlib.Path] = []
+    linked_targets: dict[pathlib.Path, pathlib.Path] = {}
+    for path in target_paths:
+        same = [target for target in written_targets if _is_same_filesystem(target.parent, path.parent)]
+        if same:
+            linked_targets[path] = same[0]
+        else:
+            written_targets.append(path)
+
+    temp_paths = {path: get_temp_path(path) for path in target_paths}
+    sha = hashlib.sha256()
+    try:
+        with contextlib.ExitStack() as stack:
+            fids = [stack.enter_context(open(temp_paths[path], 'wb')) for path in written_targets]
+            source = stack.enter_context(open(source_path, 'rb'))
+            executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(fids))))
+            while chunk := source.read(chunk_size):
+                writes = [executor.submit(fid.write, chunk) for fid in fids]
+                sha.update(chunk)
+                for write in writes:
+                    write.result()
+        checksum = sha.hexdigest()
+        for path in written_targets:
+            shutil.copystat(source_path, temp_paths[path])
+            verify_copy(source_path, temp_paths[path], checksum=checksum if verify_checksums else None)
+        for path, linked_to in linked_targets.items():
+            is_link = _link_or_copy(temp_paths[linked_to], temp_paths[path])
+            verify_copy(source_path, temp_paths[path],
+                        checksum=checksum if verify_checksums and not is_link else None)
+        for path in target_paths:
+            os.replace(temp_paths[path], path)
+    except BaseException:
+        for temp_path in temp_paths.values():
+            temp_path.unlink(missing_ok=True)
+        raise
+    return checksum
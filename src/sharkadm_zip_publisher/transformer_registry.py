@@ -0,0 +1,21 @@
+import functools
+from typing import NamedTuple
+
+
+class TransformerInfo(NamedTuple):
+    name: str
+    description: str
+
+
+@functools.cache
+def get_transformer_info(fused_restriction: bool = False) -> dict[str, tuple[TransformerInfo, ...]]:
+    """Name and description of the mandatory and restricted transformers in the order they are run.
+
+    Only the transformers are created (no controller, no data) and the result is cached for the process."""
+    from sharkadm_zip_publisher.archive_publisher import create_transformers
+
+    all_transformers = create_transformers(restrict_data=True, fused_restriction=fused_restriction)
+    return {
+        key: tuple(TransformerInfo(trans.__class__.__name__, trans.description) for trans in all_transformers[key])
+        for key in ('mandatory', 'restricted')
+    }
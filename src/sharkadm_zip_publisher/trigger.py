@@ -1,16 +1,56 @@
-import requests
+import logging
+import threading
+from typing import TYPE_CHECKING
 
 from sharkadm_zip_publisher.exceptions import ImportNotAvailable
 
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeout in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+_session: 'requests.Session | None' = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> 'requests.Session':
+    """Keep-alive session shared by all triggers in the process.
+    Status requests (GET) are retried on connection errors and 502/503/504. The trigger (POST) is not retried.
+    requests is imported here so that jobs that never talk to sharkdata don't pay for it."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(total=3,
+                          backoff_factor=0.5,
+                          status_forcelist=(502, 503, 504),
+                          allowed_methods=frozenset(['GET']),
+                          raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+            _session = requests.Session()
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
 
 class Trigger:
 
     def __init__(self,
                  trigger_url: str = None,
                  status_url: str = None,
+                 timeout: float | tuple[float, float] = DEFAULT_TIMEOUT,
+                 session: 'requests.Session' = None,
                  **kwargs):
         self._status_url = status_url
         self._trigger_url = trigger_url
+        self._timeout = timeout
+        self._session = session
 
     @property
     def status_url(self) -> str:
@@ -20,14 +60,22 @@ class Trigger:
     def trigger_url(self) -> str:
         return self._trigger_url
 
+    @property
+    def session(self) -> 'requests.Session':
+        return self._session or get_session()
+
+    def get_import_status(self) -> str:
+        return self.session.get(self.status_url, timeout=self._timeout).content.decode()
+
     @property
     def import_status_is_available(self):
-        print(f'{requests.get(self.status_url).content.decode()=}')
-        if requests.get(self.status_url).content.decode() == 'AVAILABLE':
+        status = self.get_import_status()
+        logger.debug('Import status: %s', status)
+        if status == 'AVAILABLE':
             return True
         return False
 
     def trigger_import(self):
         if not self.import_status_is_available:
             raise ImportNotAvailable()
-        requests.post(self.trigger_url)
\ No newline at end of file
+        self.session.post(self.trigger_url, timeout=self._timeout)
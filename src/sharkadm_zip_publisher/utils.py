@@ -1,4 +1,52 @@
+import os
 import pathlib
+import sys
+
+# Packages per call to ArchivePublisher.update_zip_archives when updating in several processes. The worker
+# processes are kept busy within a call, so only the last packages of a batch wait for the slowest one
+PARALLEL_BATCH_SIZE = 20
+
+
+# Overrides the user directory
+USER_DIRECTORY_ENV = 'SHARKADM_ZIP_PUBLISHER_DIRECTORY'
+# The user directory is remembered here when it is resolved by sharkadm
+USER_DIRECTORY_POINTER_PATH = pathlib.Path.home() / '.sharkadm_zip_publisher'
+
+
+def _read_user_directory_pointer() -> pathlib.Path | None:
+    try:
+        text = USER_DIRECTORY_POINTER_PATH.read_text(encoding='utf8').strip()
+    except OSError:
+        return None
+    return pathlib.Path(text) if text else None
+
+
+def _get_user_directory_from_sharkadm() -> pathlib.Path:
+    from sharkadm import utils as sharkadm_utils
+    directory = sharkadm_utils.get_root_directory() / 'zip_archive_publisher'
+    if _read_user_directory_pointer() != directory:
+        try:
+            USER_DIRECTORY_POINTER_PATH.write_text(str(directory), encoding='utf8')
+        except OSError:
+            pass
+    return directory
+
+
+def get_known_user_directory() -> pathlib.Path | None:
+    """Returns the user directory if it is known without importing sharkadm (which loads polars and
+    pandas), that is if USER_DIRECTORY_ENV is set, sharkadm is already imported or the directory has
+    been resolved by sharkadm before. Else None"""
+    if os.environ.get(USER_DIRECTORY_ENV):
+        return pathlib.Path(os.environ[USER_DIRECTORY_ENV])
+    if 'sharkadm' in sys.modules:
+        return _get_user_directory_from_sharkadm()
+    return _read_user_directory_pointer()
+
+
+def get_user_directory() -> pathlib.Path:
+    """zip_archive_publisher in the sharkadm root directory. sharkadm is only imported if the directory
+    is not known (see get_known_user_directory)"""
+    return get_known_user_directory() or _get_user_directory_from_sharkadm()
 
 
 def get_zip_name_without_date(zip_name: str) -> str:
@@ -13,3 +61,9 @@ def get_zip_name_path_mapping(directory: str | pathlib.Path) -> dict[str, pathli
         mapped[get_zip_name_without_date(path.stem)] = path
     return mapped
 
+
+def get_batches(paths: list, nr_processes: int = 1) -> list[list]:
+    """One package per batch, or PARALLEL_BATCH_SIZE (at least nr_processes) packages per batch
+    when the packages are updated in several processes"""
+    size = 1 if nr_processes <= 1 else max(nr_processes, PARALLEL_BATCH_SIZE)
+    return [paths[i:i + size] for i in range(0, len(paths), size)]
@@ -0,0 +1,57 @@
+"""Log events from worker processes.
+
+adm_logger lives in each process, so events logged while a package is updated in a worker process
+never reach the logger of the main process (and so not the log reports or the GUI log). The worker
+collects the events it logged for each package (LogCollector) and they are logged again in the
+main process (replay_events)."""
+import sys
+
+from sharkadm_zip_publisher import report
+from sharkadm_zip_publisher.exceptions import LogReportError
+
+# (log_type, level, msg, number of times logged)
+LogEvent = tuple[str, str, str, int]
+
+
+def _get_counts(logger) -> dict[tuple[str, str, str], int]:
+    counts = {}
+    for event in report.iter_log_events(report.get_log_data(logger)):
+        key = (str(event['log_type']), str(event['level']), str(event['msg']))
+        counts[key] = report.get_count(event)
+    return counts
+
+
+class LogCollector:
+    """Returns the events logged to logger since the last call to pop_events"""
+
+    def __init__(self, logger):
+        self._logger = logger
+        self._counts = {}
+        self._broken = False
+        self.pop_events()
+
+    def pop_events(self) -> list[LogEvent]:
+        if self._broken:
+            return []
+        try:
+            counts = _get_counts(self._logger)
+        except LogReportError as e:
+            # Reported once. stdout is left alone since the cli writes its summary there
+            self._broken = True
+            print(f'Could not collect log events in worker process: {e}', file=sys.stderr)
+            return []
+        events = [(*key, nr - self._counts.get(key, 0)) for key, nr in counts.items()
+                  if nr > self._counts.get(key, 0)]
+        self._counts = counts
+        return events
+
+
+def replay_events(logger, events: list[LogEvent]) -> None:
+    """Logs the events from a worker process to logger (log_workflow, log_transformation, log_validation...)"""
+    for log_type, level, msg, nr in events:
+        log = getattr(logger, f'log_{log_type}', None)
+        if log is None:
+            log = logger.log_workflow
+            msg = f'[{log_type}] {msg}'
+        for _ in range(nr):
+            log(msg, level=level)
@@ -20,3 +20,7 @@ class ZipPath(ft.UserControl):
 
     def _delete(self, e):
         self._on_delete(self)
+
+
+class ConfigPath(ZipPath):
+    """Same control for config files"""
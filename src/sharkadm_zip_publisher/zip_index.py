@@ -0,0 +1,161 @@
+import contextlib
+import hashlib
+import json
+import os
+import pathlib
+import threading
+
+from sharkadm_zip_publisher import utils
+
+_indexes: dict[str, 'ZipDirectoryIndex'] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index_directory() -> pathlib.Path:
+    return utils.get_user_directory() / 'zip_index'
+
+
+class ZipDirectoryIndex:
+    """Mapping from zip name without version to the current path in a zip directory.
+
+    The directory is listed once. After that the index is updated with add/discard when this
+    process copies or removes zips, and the directory is only listed again if its modification
+    time has changed by someone else. With persist=True the index is saved between sessions
+    and reused as long as the modification time of the directory is the same.
+
+    Copies made by this process (temporary files and renames) run inside own_change, so that
+    they do not make the index list the directory again."""
+
+    def __init__(self, directory: str | pathlib.Path, persist: bool = False, index_directory: str | pathlib.Path = None):
+        self._directory = pathlib.Path(directory)
+        self._persist = persist
+        self._index_directory = pathlib.Path(index_directory or get_index_directory())
+        self._mapping: dict[str, pathlib.Path] = {}
+        self._mtime = None
+        self._nr_own_changes = 0
+        self._lock = threading.RLock()
+
+    @property
+    def directory(self) -> pathlib.Path:
+        return self._directory
+
+    @property
+    def index_file_path(self) -> pathlib.Path:
+        name = hashlib.sha256(str(self._directory.resolve()).encode()).hexdigest()[:16]
+        return self._index_directory / f'{name}.json'
+
+    @property
+    def mapping(self) -> dict[str, pathlib.Path]:
+        with self._lock:
+            self._sync()
+            return dict(self._mapping)
+
+    def _get_mtime(self) -> int:
+        return os.stat(self._directory).st_mtime_ns
+
+    def _sync(self) -> None:
+        if self._mtime is not None and self._nr_own_changes:
+            # The modification time is changed by our own copies in progress
+            return
+        mtime = self._get_mtime()
+        if mtime == self._mtime:
+            return
+        if self._mtime is None and self._persist and self._load(mtime):
+            return
+        self._mapping = utils.get_zip_name_path_mapping(self._directory)
+        self._mtime = mtime
+        self.save()
+
+    def _load(self, mtime: int) -> bool:
+        try:
+            with open(self.index_file_path, encoding='utf8') as fid:
+                saved = json.load(fid)
+        except (OSError, ValueError):
+            return False
+        if saved.get('directory') != str(self._directory) or saved.get('mtime') != mtime:
+            return False
+        self._mapping = {key: self._directory / name for key, name in saved['mapping'].items()}
+        self._mtime = mtime
+        return True
+
+    def save(self) -> None:
+        if not self._persist:
+            return
+        self._index_directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_file_path.with_name(f'{self.index_file_path.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf8') as fid:
+            json.dump(dict(directory=str(self._directory),
+                           mtime=self._mtime,
+                           mapping={key: path.name for key, path in self._mapping.items()}), fid)
+        os.replace(tmp_path, self.index_file_path)
+
+    def get(self, name: str) -> pathlib.Path | None:
+        """Returns the current zip with the same name (without version) as name"""
+        with self._lock:
+            self._sync()
+            return self._mapping.get(utils.get_zip_name_without_date(name))
+
+    def add(self, path: str | pathlib.Path) -> None:
+        """Call after path has been copied to the directory"""
+        path = pathlib.Path(path)
+        with self._lock:
+            if self._mtime is None:
+                self._sync()
+                return
+            self._mapping[utils.get_zip_name_without_date(path.stem)] = self._directory / path.name
+            self._after_own_change()
+
+    def discard(self, path: str | pathlib.Path) -> None:
+        """Call after path has been removed from the directory"""
+        path = pathlib.Path(path)
+        key = utils.get_zip_name_without_date(path.stem)
+        with self._lock:
+            if self._mtime is None:
+                self._sync()
+                return
+            if self._mapping.get(key) == self._directory / path.name:
+                self._mapping.pop(key)
+            self._after_own_change()
+
+    @contextlib.contextmanager
+    def own_change(self):
+        """Wrap lookups and changes of the directory made by this process (for example writing a temporary
+        file, renaming it and removing the old zip). While any own change is in progress the directory
+        is not listed again, and when the last one is done the new modification time is taken as known.
+        The mapping is updated with add and discard as usual."""
+        with self._lock:
+            self._nr_own_changes += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._nr_own_changes -= 1
+                if not self._nr_own_changes and self._mtime is not None:
+                    self._after_own_change()
+
+    def _after_own_change(self) -> None:
+        """The new modification time is our own change, so no need to list the directory again.
+        Assumes that no one else has changed the directory since the last lookup."""
+        self._mtime = self._get_mtime()
+        self.save()
+
+    def refresh(self) -> None:
+        """Lists the directory again"""
+        with self._lock:
+            mtime = self._get_mtime()
+            self._mapping = utils.get_zip_name_path_mapping(self._directory)
+            self._mtime = mtime
+            self.save()
+
+
+def get_zip_directory_index(directory: str | pathlib.Path, persist: bool = False) -> ZipDirectoryIndex:
+    """Returns the index for directory shared by everything in this process"""
+    key = str(pathlib.Path(directory).resolve())
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = ZipDirectoryIndex(directory, persist=persist)
+            _indexes[key] = index
+        elif persist:
+            index._persist = True
+        return index
@@ -0,0 +1,19 @@
+import pathlib
+import sys
+
+import pytest
+
+BENCHMARKS_DIRECTORY = pathlib.Path(__file__).parents[1] / 'benchmarks'
+
+
+@pytest.fixture
+def create_synthetic_package(tmp_path):
+    """Creates a synthetic SHARK package (see benchmarks/synthetic_packages.py)"""
+    if str(BENCHMARKS_DIRECTORY) not in sys.path:
+        sys.path.insert(0, str(BENCHMARKS_DIRECTORY))
+    import synthetic_packages
+
+    def create(data_type: str, nr_rows: int = 500) -> pathlib.Path:
+        return synthetic_packages.create_package(tmp_path / 'packages', data_type, nr_rows)
+
+    return create
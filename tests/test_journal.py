@@ -0,0 +1,29 @@
+from sharkadm_zip_publisher import journal
+from sharkadm_zip_publisher.journal import RunJournal
+
+
+def test_old_finished_journals_are_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, 'KEEP_FINISHED_JOURNALS', 3)
+    unfinished = RunJournal.create('TEST', directory=tmp_path)
+    finished = []
+    for _ in range(5):
+        run_journal = RunJournal.create('TEST', directory=tmp_path)
+        run_journal.finish()
+        finished.append(run_journal.path)
+    latest = RunJournal.create('TEST', directory=tmp_path)
+
+    assert sorted(tmp_path.iterdir()) == sorted([unfinished.path, *finished[-3:], latest.path])
+    assert RunJournal.get_latest_unfinished('TEST', directory=tmp_path).path == latest.path
+
+
+def test_resume_run(tmp_path):
+    package_path = tmp_path / 'SHARK_Test.zip'
+    package_path.write_bytes(b'zip')
+    run_journal = RunJournal.create('TEST', packages=[package_path.name], directory=tmp_path / 'journal')
+    run_journal.mark(package_path.name, journal.UPDATED, path=package_path)
+
+    resumed = RunJournal.get_or_create('TEST', resume=True, directory=tmp_path / 'journal')
+    assert resumed.path == run_journal.path
+    assert resumed.is_done(package_path.name, [journal.UPDATED])
+    package_path.write_bytes(b'changed zip')
+    assert not resumed.is_done(package_path.name, [journal.UPDATED])
@@ -0,0 +1,80 @@
+import json
+import os
+import pathlib
+import subprocess
+import sys
+
+import pytest
+
+SRC_DIRECTORY = pathlib.Path(__file__).parents[1] / 'src'
+
+# Loaded when a run starts, not when the entry point is imported
+HEAVY_PACKAGES = ('sharkadm', 'polars', 'pandas')
+
+
+def run_code(code: str, **env_vars: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, **env_vars)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(SRC_DIRECTORY), env.get('PYTHONPATH')]))
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+
+
+def get_imported_modules(module: str) -> list[str]:
+    """Imports module in a fresh interpreter and returns the names in sys.modules"""
+    proc = run_code(f'import json, sys; import {module}; print(json.dumps(sorted(sys.modules)))')
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout)
+
+
+def run_cli(argv: list[str], **env_vars: str) -> tuple[dict, list[str]]:
+    """Runs cli.main(argv) in a fresh interpreter. Returns the summary and the names in sys.modules"""
+    code = (f'import json, sys; from sharkadm_zip_publisher import cli; exit_code = cli.main({argv!r}); '
+            f'print(json.dumps(sorted(sys.modules)), file=sys.stderr); sys.exit(exit_code)')
+    proc = run_code(code, **env_vars)
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout), json.loads(proc.stderr.strip().splitlines()[-1])
+
+
+def get_heavy_modules(modules: list[str]) -> list[str]:
+    return [name for name in modules if name.split('.')[0] in HEAVY_PACKAGES]
+
+
+@pytest.mark.parametrize('module', [
+    'sharkadm_zip_publisher',
+    'sharkadm_zip_publisher.cli',
+    'sharkadm_zip_publisher.archive_remover',
+    'sharkadm_zip_publisher.config_publisher',
+])
+def test_entry_point_does_not_import_heavy_packages(module):
+    assert get_heavy_modules(get_imported_modules(module)) == []
+
+
+def test_flet_app_does_not_import_heavy_packages():
+    pytest.importorskip('flet')
+    assert get_heavy_modules(get_imported_modules('sharkadm_zip_publisher.flet_app')) == []
+
+
+@pytest.mark.parametrize('command', ['remove', 'config'])
+def test_cli_command_does_not_import_heavy_packages(tmp_path, command):
+    (tmp_path / 'datasets').mkdir()
+    (tmp_path / 'config').mkdir()
+    if command == 'remove':
+        argv = ['remove', '--datasets-directory', str(tmp_path / 'datasets'), 'SHARK_Test']
+    else:
+        (tmp_path / 'column_info.txt').write_text('config')
+        argv = ['config', '--config-directory', str(tmp_path / 'config'), str(tmp_path / 'column_info.txt')]
+    # An empty home, so that the user directory is not known
+    summary, modules = run_cli(argv, HOME=str(tmp_path), USERPROFILE=str(tmp_path))
+    assert summary['exit_code'] == 0
+    assert get_heavy_modules(modules) == []
+
+
+def test_cli_uses_saves_without_importing_heavy_packages(tmp_path):
+    user_directory = tmp_path / 'user'
+    user_directory.mkdir()
+    datasets_directory = tmp_path / 'datasets'
+    datasets_directory.mkdir()
+    (user_directory / 'zip_archive_publisher_saves_TEST.yaml').write_text(f'_datasets_directory: {datasets_directory}\n')
+    summary, modules = run_cli(['remove', 'SHARK_Test'], SHARKADM_ZIP_PUBLISHER_DIRECTORY=str(user_directory))
+    assert summary['exit_code'] == 0
+    assert (datasets_directory / 'remove.txt').exists()
+    assert get_heavy_modules(modules) == []
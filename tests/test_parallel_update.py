@@ -0,0 +1,33 @@
+import shutil
+
+import pytest
+
+pytest.importorskip('sharkadm')
+
+from sharkadm_zip_publisher.archive_publisher import ArchivePublisher
+from sharkadm_zip_publisher.exceptions import PackageUpdateError
+
+
+def test_failing_package_does_not_stop_the_others(tmp_path, create_synthetic_package):
+    template = create_synthetic_package('physicalchemical', 200)
+    paths = []
+    for nr in range(3):
+        path = tmp_path / template.name.replace('_BENCH200_', f'_BENCH200N{nr}_')
+        shutil.copy2(template, path)
+        paths.append(path)
+    broken_path = tmp_path / template.name.replace('_BENCH200_', '_BENCH200BROKEN_')
+    broken_path.write_bytes(b'not a zip file')
+
+    with ArchivePublisher(sharkdata_dataset_directory=str(tmp_path / 'sharkdata'),
+                          zip_directory=str(tmp_path / 'zip'),
+                          trigger_url='',
+                          import_url='',
+                          restrict_data=False,
+                          nr_processes=2) as publisher:
+        publisher.set_zip_archive_paths(*paths, broken_path)
+        with pytest.raises(PackageUpdateError) as exc_info:
+            publisher.update_zip_archives()
+
+    assert list(exc_info.value.failed) == [broken_path.name]
+    assert list(publisher.failed_packages) == [broken_path.name]
+    assert sorted(path.name for path in publisher.get_paths_to_copy()) == sorted(path.name for path in paths)
@@ -0,0 +1,145 @@
+import pathlib
+import zipfile
+
+import polars as pl
+import pytest
+
+from sharkadm_zip_publisher.polars_exporter import PolarsSHARKdataTxtExporter
+
+TRICKY_VALUES = [
+    'plain',
+    'with\ttab',
+    'with "quotes"',
+    '"',
+    'crlf\r\nline',
+    'lf\nonly',
+    'cr\ronly',
+    None,
+    '',
+    ' leading and trailing ',
+    'åäö ÅÄÖ é ü € – ‰',
+    '1.50',
+    'NaN',
+]
+
+
+def get_frame(nr_rows: int = 50) -> pl.DataFrame:
+    values = [TRICKY_VALUES[i % len(TRICKY_VALUES)] for i in range(nr_rows)]
+    return pl.DataFrame({
+        'station_name': values,
+        'comment "quoted"': list(reversed(values)),
+        'parameter': ['Secchi depth'] * nr_rows,
+        'value': [None if i % 7 == 0 else f'{i / 3:.3f}' for i in range(nr_rows)],
+        'empty': [None] * nr_rows,
+    }, schema={col: pl.String for col in ['station_name', 'comment "quoted"', 'parameter', 'value', 'empty']})
+
+
+def export_with_pandas(data: pl.DataFrame, path: pathlib.Path, encoding: str, line_terminator: str) -> bytes:
+    data.to_pandas().to_csv(path, sep='\t', index=False, encoding=encoding, lineterminator=line_terminator)
+    return path.read_bytes()
+
+
+def export_with_polars(data: pl.DataFrame, path: pathlib.Path, encoding: str, line_terminator: str,
+                       **kwargs) -> bytes:
+    PolarsSHARKdataTxtExporter(path, encoding=encoding, line_terminator=line_terminator, **kwargs).export(data)
+    return path.read_bytes()
+
+
+@pytest.mark.parametrize('line_terminator', ['\r\n', '\n'])
+@pytest.mark.parametrize('encoding', ['cp1252', 'utf8'])
+def test_same_bytes_as_pandas(tmp_path, encoding, line_terminator):
+    data = get_frame()
+    expected = export_with_pandas(data, tmp_path / 'pandas.txt', encoding, line_terminator)
+    result = export_with_polars(data, tmp_path / 'polars.txt', encoding, line_terminator)
+    assert result == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100_000])
+def test_same_bytes_as_pandas_for_any_chunk_size(tmp_path, chunk_size):
+    data = get_frame(30)
+    expected = export_with_pandas(data, tmp_path / 'pandas.txt', 'cp1252', '\r\n')
+    result = export_with_polars(data, tmp_path / 'polars.txt', 'cp1252', '\r\n', chunk_size=chunk_size)
+    assert result == expected
+
+
+@pytest.mark.parametrize('values', [['a', None, ''], ['only\tone'], [None]])
+def test_same_bytes_as_pandas_for_single_column(tmp_path, values):
+    data = pl.DataFrame({'value': values}, schema={'value': pl.String})
+    expected = export_with_pandas(data, tmp_path / 'pandas.txt', 'cp1252', '\r\n')
+    result = export_with_polars(data, tmp_path / 'polars.txt', 'cp1252', '\r\n')
+    assert result == expected
+
+
+def test_same_bytes_as_pandas_for_empty_frame(tmp_path):
+    data = get_frame(0)
+    expected = export_with_pandas(data, tmp_path / 'pandas.txt', 'cp1252', '\r\n')
+    result = export_with_polars(data, tmp_path / 'polars.txt', 'cp1252', '\r\n')
+    assert result == expected
+
+
+def test_exclude_columns(tmp_path):
+    data = get_frame()
+    expected = export_with_pandas(data.drop('empty'), tmp_path / 'pandas.txt', 'cp1252', '\r\n')
+    result = export_with_polars(data, tmp_path / 'polars.txt', 'cp1252', '\r\n', exclude_columns=('empty',))
+    assert result == expected
+
+
+@pytest.mark.parametrize('column', [
+    pl.Series('value', [1, 2, None], dtype=pl.Int64),
+    pl.Series('value', [0.1, 1e20, None], dtype=pl.Float64),
+    pl.Series('value', [True, False, None], dtype=pl.Boolean),
+])
+def test_non_string_columns_are_left_to_pandas(tmp_path, column):
+    """pandas formats these differently (1.0 for integers with nulls, True, 1e+20), so they are not exported"""
+    data = get_frame(3).with_columns(column)
+    assert not PolarsSHARKdataTxtExporter.can_export(data)
+    with pytest.raises(TypeError):
+        PolarsSHARKdataTxtExporter(tmp_path / 'polars.txt').export(data)
+
+
+def test_cp1252_can_not_encode(tmp_path):
+    data = pl.DataFrame({'value': ['Ω']})
+    with pytest.raises(UnicodeEncodeError):
+        PolarsSHARKdataTxtExporter(tmp_path / 'polars.txt', encoding='cp1252').export(data)
+    with pytest.raises(UnicodeEncodeError):
+        export_with_pandas(data, tmp_path / 'pandas.txt', 'cp1252', '\r\n')
+
+
+def update_package(path, tmp_path, polars_export: bool) -> bytes:
+    from sharkadm_zip_publisher.archive_publisher import ArchivePublisher
+
+    tag = 'polars' if polars_export else 'pandas'
+    with ArchivePublisher(sharkdata_dataset_directory=str(tmp_path / f'sharkdata_{tag}'),
+                          zip_directory=str(tmp_path / f'zip_{tag}'),
+                          trigger_url='',
+                          import_url='',
+                          restrict_data=False,
+                          polars_export=polars_export,
+                          temp_subdirectory=f'rezipped_archives_{tag}') as publisher:
+        publisher.set_zip_archive_paths(path)
+        publisher.update_zip_archives()
+        [rezipped_path] = publisher.zip_archive_paths
+    with zipfile.ZipFile(rezipped_path) as zf:
+        return zf.read('shark_data.txt')
+
+
+@pytest.mark.parametrize('data_type', ['physicalchemical', 'epibenthos', 'phytoplankton'])
+def test_same_bytes_as_sharkadm_exporter(tmp_path, monkeypatch, create_synthetic_package, data_type):
+    """The whole publisher run with the polars export and with ConvertFromPolarsToPandas +
+    exporters.SHARKdataTxtAsGiven gives the same shark_data.txt"""
+    pytest.importorskip('sharkadm')
+    path = create_synthetic_package(data_type, 300)
+
+    nr_polars_exports = []
+    export = PolarsSHARKdataTxtExporter.export
+
+    def counting_export(self, data):
+        nr_polars_exports.append(data.height)
+        return export(self, data)
+
+    monkeypatch.setattr(PolarsSHARKdataTxtExporter, 'export', counting_export)
+    expected = update_package(path, tmp_path, polars_export=False)
+    assert not nr_polars_exports
+    result = update_package(path, tmp_path, polars_export=True)
+    assert len(nr_polars_exports) == 1, 'The polars export was not used'
+    assert result == expected
@@ -0,0 +1,97 @@
+import csv
+
+import pytest
+
+from sharkadm_zip_publisher import report
+from sharkadm_zip_publisher.exceptions import LogReportError
+
+
+class FakeLogger:
+    """The parts of SHARKadmLogger used by the reports"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def reset_filter(self):
+        return self
+
+
+def get_log_data() -> dict:
+    return {
+        'workflow': {
+            'info': {'Started': {'count': 1, 'items': []}},
+            'warning': {'Slow package': {'count': 2, 'items': ['A.zip', 'B.zip']}},
+        },
+        'transformation': {
+            'warning': {'Replaced value': {'count': 3, 'items': []}},
+            'error': {'Could not convert': {'count': 1, 'items': ['row 4']}},
+        },
+        'validation': {
+            'info': {'Checked': {'count': 5, 'items': []}},
+            'warning': {'Missing position': {'count': 4, 'items': []}},
+        },
+    }
+
+
+def read_csv(path) -> list[list[str]]:
+    with open(path, encoding='utf8', newline='') as fid:
+        return list(csv.reader(fid, delimiter='\t'))
+
+
+def test_csv_reports(tmp_path):
+    paths = report.create_log_reports(FakeLogger(get_log_data()), tmp_path, fmt='csv')
+    assert [path.name.split('_sharkadm_log')[1] for path in paths] == ['.csv', '_transformation.csv',
+                                                                       '_validation.csv']
+    all_rows, transformation_rows, validation_rows = [read_csv(path) for path in paths]
+    assert all_rows[0] == list(report.COLUMNS)
+    assert len(all_rows) == 7
+    assert transformation_rows[1:] == [['transformation', 'error', 'Could not convert', '1', 'row 4']]
+    assert validation_rows[1:] == [['validation', 'warning', 'Missing position', '4', '']]
+
+
+@pytest.mark.parametrize('fmt', ['xlsx', 'parquet'])
+def test_other_formats(tmp_path, fmt):
+    pytest.importorskip('openpyxl' if fmt == 'xlsx' else 'pyarrow')
+    paths = report.create_log_reports(FakeLogger(get_log_data()), tmp_path, fmt=fmt)
+    assert len(paths) == 3
+    assert all(path.suffix == f'.{fmt}' and path.exists() for path in paths)
+
+
+@pytest.mark.parametrize('data', [
+    [],
+    {'workflow': []},
+    {'workflow': {'info': ['Started']}},
+    {'workflow': {'info': {'Started': {'count': 1}}}, 'validation': {'verbose': {'Checked': {'count': 1}}}},
+    {'workflow': {'info': {'Started': {'count': 1}}}, 'validation': {'info': {'Checked': {'count': 'many'}}}},
+])
+def test_invalid_data_creates_no_files(tmp_path, data):
+    with pytest.raises(LogReportError):
+        report.create_log_reports(FakeLogger(data), tmp_path / 'reports', fmt='csv')
+    assert not (tmp_path / 'reports').exists()
+
+
+def test_unknown_logger_is_an_error(tmp_path):
+    with pytest.raises(LogReportError):
+        report.create_log_reports(object(), tmp_path, fmt='xlsx')
+    assert not list(tmp_path.iterdir())
+
+
+def test_failed_write_removes_the_files(tmp_path, monkeypatch):
+    write = report.CsvReportWriter.write
+    nr_written = []
+
+    def fail_on_third(self, event):
+        nr_written.append(event)
+        if len(nr_written) == 3:
+            raise OSError('Disk full')
+        write(self, event)
+
+    monkeypatch.setattr(report.CsvReportWriter, 'write', fail_on_third)
+    with pytest.raises(OSError):
+        report.create_log_reports(FakeLogger(get_log_data()), tmp_path, fmt='csv')
+    assert not list(tmp_path.iterdir())
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        report.create_log_reports(FakeLogger(get_log_data()), tmp_path, fmt='json')
@@ -0,0 +1,77 @@
+"""The fused restriction engine (PolarsRestrictData) must give the same data as the chain of
+sharkadm transformers it replaces"""
+import polars as pl
+import pytest
+
+pytest.importorskip('sharkadm')
+
+from polars.testing import assert_frame_equal
+from sharkadm import controller
+from sharkadm.data import get_polars_zip_archive_data_holder
+from sharkadm.utils import data_filter
+
+from sharkadm_zip_publisher import restrict
+from sharkadm_zip_publisher.archive_publisher import create_filters, create_transformers
+from sharkadm_zip_publisher.restriction import PolarsRestrictData, get_rule_set
+
+
+def get_filters() -> dict:
+    """Filters on station name so that the rules are known to hit some rows (the area filters depend
+    on the positions)"""
+    filters = create_filters()
+    filters['main_filter'] = data_filter.PolarsDataFilterMatchInColumn(column='station_name',
+                                                                      pattern='^(BY5|Å17|FLADEN).*$')
+    filters['r_filter'] = data_filter.PolarsDataFilterMatchInColumn(column='station_name',
+                                                                   pattern='^(FLADEN|SLÄGGÖ).*$')
+    return filters
+
+
+def get_replacement_transformers(fused: bool, filters: dict) -> list:
+    """The restricted transformers after PolarsRemoveProfiles (the ones replaced by the fused engine)"""
+    restricted = create_transformers(restrict_data=True, fused_restriction=fused, filters=filters)['restricted']
+    names = [trans.__class__.__name__ for trans in restricted]
+    return restricted[names.index('PolarsRemoveProfiles') + 1:]
+
+
+def add_parameter_variants(data: pl.DataFrame) -> pl.DataFrame:
+    """Rows with parameters that only partly match a restricted parameter must not be restricted"""
+    parameter = get_rule_set().sorted_parameters[0]
+    variants = [f'{parameter} extra', f'x {parameter}', parameter.lower(), parameter.upper()]
+    rows = data.head(len(variants)).with_columns(parameter=pl.Series(variants))
+    return pl.concat([data, rows])
+
+
+def run(path, transformers_to_run: list) -> pl.DataFrame:
+    data_holder = get_polars_zip_archive_data_holder(path)
+    data_holder.data = add_parameter_variants(data_holder.data)
+    cont = controller.SHARKadmPolarsController()
+    cont.set_data_holder(data_holder)
+    for trans in transformers_to_run:
+        cont.transform(trans)
+    return cont.data
+
+
+@pytest.mark.parametrize('data_type', ['physicalchemical', 'epibenthos', 'phytoplankton'])
+def test_fused_engine_gives_the_same_data_as_the_chain(create_synthetic_package, data_type):
+    path = create_synthetic_package(data_type, nr_rows=2000)
+    filters = get_filters()
+    chain = get_replacement_transformers(fused=False, filters=filters)
+    fused = get_replacement_transformers(fused=True, filters=filters)
+    assert [trans.__class__ for trans in fused] == [PolarsRestrictData]
+
+    original = run(path, [])
+    expected = run(path, chain)
+    result = run(path, fused)
+
+    # The test is only meaningful if the chain restricted something
+    assert not expected.equals(original)
+    assert_frame_equal(result, expected)
+
+
+def test_restricted_parameters_get_the_replace_value(create_synthetic_package):
+    path = create_synthetic_package('epibenthos', nr_rows=2000)
+    result = run(path, get_replacement_transformers(fused=True, filters=get_filters()))
+    restricted = result.filter(pl.col('station_name').str.contains('^(BY5|Å17|FLADEN)')
+                               & pl.col('parameter').is_in(get_rule_set().sorted_parameters))
+    assert len(restricted)
+    assert (restricted['value'] == restrict.REPLACE_PARAMETER_VALUE).all()
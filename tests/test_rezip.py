@@ -0,0 +1,54 @@
+import zipfile
+
+from sharkadm_zip_publisher import rezip
+
+MEMBERS = {
+    'shark_data.txt': 'station\tvalue\r\nA\t1\r\n',
+    'processed_data/x.txt': 'old content',
+    'received_data/y.txt': 'unchanged ' * 100,
+    'README.txt': 'readme',
+}
+
+
+def create_source(tmp_path):
+    source_zip_path = tmp_path / 'source.zip'
+    with zipfile.ZipFile(source_zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in MEMBERS.items():
+            zf.writestr(name, content)
+    directory = tmp_path / 'unzipped'
+    with zipfile.ZipFile(source_zip_path) as zf:
+        zf.extractall(directory)
+    return source_zip_path, directory
+
+
+def read_members(path) -> dict[str, str]:
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        return {info.filename: zf.read(info).decode() for info in zf.infolist() if not info.is_dir()}
+
+
+def test_unchanged_members_are_copied(tmp_path):
+    source_zip_path, directory = create_source(tmp_path)
+    target = rezip.rezip_directory(directory, source_zip_path, tmp_path / 'target.zip')
+    assert read_members(target) == MEMBERS
+
+
+def test_member_rewritten_with_the_same_size(tmp_path):
+    source_zip_path, directory = create_source(tmp_path)
+    (directory / 'processed_data' / 'x.txt').write_text('new content')
+    assert len('new content') == len(MEMBERS['processed_data/x.txt'])
+    target = rezip.rezip_directory(directory, source_zip_path, tmp_path / 'target.zip')
+    assert read_members(target)['processed_data/x.txt'] == 'new content'
+
+
+def test_changed_removed_and_new_members(tmp_path):
+    source_zip_path, directory = create_source(tmp_path)
+    (directory / 'shark_data.txt').write_text('station\tvalue\r\nB\t2\r\n', newline='')
+    (directory / 'README.txt').unlink()
+    (directory / 'new.txt').write_text('new file')
+    target = rezip.rezip_directory(directory, source_zip_path, tmp_path / 'target.zip')
+    members = read_members(target)
+    assert members['shark_data.txt'] == 'station\tvalue\r\nB\t2\r\n'
+    assert members['new.txt'] == 'new file'
+    assert 'README.txt' not in members
+    assert members['received_data/y.txt'] == MEMBERS['received_data/y.txt']
@@ -0,0 +1,89 @@
+import hashlib
+
+import pytest
+
+from sharkadm_zip_publisher import transfer
+from sharkadm_zip_publisher.exceptions import CopyVerificationError
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    path = tmp_path / 'source' / 'SHARK_Test.zip'
+    path.parent.mkdir()
+    path.write_bytes(bytes(range(256)) * 1000)
+    return path
+
+
+def corrupt_copy(source, target):
+    """Copy with the same size but one changed byte"""
+    data = bytearray(open(source, 'rb').read())
+    data[10] ^= 0xFF
+    with open(target, 'wb') as fid:
+        fid.write(bytes(data))
+
+
+def get_target_paths(tmp_path, *names: str):
+    paths = []
+    for name in names:
+        (tmp_path / name).mkdir()
+        paths.append(tmp_path / name / 'SHARK_Test.zip')
+    return paths
+
+
+def test_fan_out_copy(tmp_path, source_path):
+    target_paths = get_target_paths(tmp_path, 'sharkdata', 'zip')
+    checksum = transfer.fan_out_copy(source_path, *target_paths, chunk_size=1000)
+    assert checksum == hashlib.sha256(source_path.read_bytes()).hexdigest()
+    for path in target_paths:
+        assert path.read_bytes() == source_path.read_bytes()
+        assert [p.name for p in path.parent.iterdir()] == [path.name]
+
+
+def test_fan_out_copy_detects_corrupt_target(tmp_path, source_path, monkeypatch):
+    """Same size but other content is only found by the checksum"""
+    def link(*args):
+        raise OSError('No hardlinks')
+
+    monkeypatch.setattr(transfer.os, 'link', link)
+    monkeypatch.setattr(transfer.shutil, 'copy2', corrupt_copy)
+    target_paths = get_target_paths(tmp_path, 'sharkdata', 'zip')
+    with pytest.raises(CopyVerificationError, match='Checksum'):
+        transfer.fan_out_copy(source_path, *target_paths, verify_checksums=True)
+    for path in target_paths:
+        assert not list(path.parent.iterdir())
+
+
+def test_fan_out_copy_does_not_read_the_targets_back(tmp_path, source_path, monkeypatch):
+    def get_sha256(path, *args, **kwargs):
+        raise AssertionError(f'{path} is read back')
+
+    monkeypatch.setattr(transfer, 'get_sha256', get_sha256)
+    target_paths = get_target_paths(tmp_path, 'sharkdata', 'zip')
+    transfer.fan_out_copy(source_path, *target_paths)
+    for path in target_paths:
+        assert path.read_bytes() == source_path.read_bytes()
+
+
+def test_fan_out_copy_detects_short_target(tmp_path, source_path, monkeypatch):
+    def link(*args):
+        raise OSError('No hardlinks')
+
+    def short_copy(source, target):
+        with open(target, 'wb') as fid:
+            fid.write(open(source, 'rb').read()[:-1])
+
+    monkeypatch.setattr(transfer.os, 'link', link)
+    monkeypatch.setattr(transfer.shutil, 'copy2', short_copy)
+    target_paths = get_target_paths(tmp_path, 'sharkdata', 'zip')
+    with pytest.raises(CopyVerificationError, match='Size'):
+        transfer.fan_out_copy(source_path, *target_paths)
+    for path in target_paths:
+        assert not list(path.parent.iterdir())
+
+
+def test_atomic_copy_detects_corrupt_target(tmp_path, source_path, monkeypatch):
+    monkeypatch.setattr(transfer.shutil, 'copy2', corrupt_copy)
+    target_path, = get_target_paths(tmp_path, 'sharkdata')
+    with pytest.raises(CopyVerificationError, match='Checksum'):
+        transfer.atomic_copy(source_path, target_path)
+    assert not list(target_path.parent.iterdir())
@@ -0,0 +1,118 @@
+import http.server
+import socket
+import threading
+
+import pytest
+
+requests = pytest.importorskip('requests')
+
+from sharkadm_zip_publisher import trigger
+from sharkadm_zip_publisher.exceptions import ImportNotAvailable
+from sharkadm_zip_publisher.trigger import Trigger
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    """Local stand in for the sharkdata import API. Counts requests and TCP connections"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.status_responses = []
+        self.status = 'AVAILABLE'
+        self.requests = []
+        self.nr_connections = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server._lock:
+            self.server.nr_connections += 1
+
+    def _respond(self, code: int, body: bytes) -> None:
+        with self.server._lock:
+            self.server.requests.append((self.command, self.path))
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        code = self.server.status_responses.pop(0) if self.server.status_responses else 200
+        self._respond(code, self.server.status.encode())
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self._respond(200, b'OK')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session(monkeypatch):
+    """A fresh shared session for each test"""
+    monkeypatch.setattr(trigger, '_session', None)
+    yield trigger.get_session()
+    trigger.get_session().close()
+
+
+def get_trigger(server: StubServer) -> Trigger:
+    return Trigger(trigger_url=f'{server.url}/trigger', status_url=f'{server.url}/status')
+
+
+def test_one_status_request_and_one_post_per_trigger(server, session):
+    nr_triggers = 20
+    pub = get_trigger(server)
+    for _ in range(nr_triggers):
+        pub.trigger_import()
+    assert server.requests == [('GET', '/status'), ('POST', '/trigger')] * nr_triggers
+    assert server.nr_connections == 1
+
+
+def test_triggers_share_the_connection(server, session):
+    for _ in range(5):
+        get_trigger(server).trigger_import()
+    assert len(server.requests) == 10
+    assert server.nr_connections == 1
+
+
+def test_not_available(server, session):
+    server.status = 'BUSY'
+    with pytest.raises(ImportNotAvailable):
+        get_trigger(server).trigger_import()
+    assert server.requests == [('GET', '/status')]
+
+
+def test_status_request_is_retried(server, session):
+    server.status_responses = [503, 503]
+    get_trigger(server).trigger_import()
+    assert server.requests == [('GET', '/status')] * 3 + [('POST', '/trigger')]
+
+
+def test_nothing_written_to_stdout(server, session, capsys):
+    """The cli writes its json summary to stdout"""
+    pub = get_trigger(server)
+    assert pub.import_status_is_available
+    pub.trigger_import()
+    assert capsys.readouterr().out == ''
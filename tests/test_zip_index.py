@@ -0,0 +1,56 @@
+import concurrent.futures
+
+from sharkadm_zip_publisher import transfer
+from sharkadm_zip_publisher import utils
+from sharkadm_zip_publisher import zip_index
+
+
+def copy_to_index(index, source_path):
+    target_path = index.directory / source_path.name
+    with index.own_change():
+        old_path = index.get(source_path.stem)
+        transfer.fan_out_copy(source_path, target_path)
+        if old_path and old_path != target_path:
+            old_path.unlink()
+            index.discard(old_path)
+        index.add(target_path)
+
+
+def test_own_copies_do_not_list_the_directory_again(tmp_path, monkeypatch):
+    source_directory = tmp_path / 'source'
+    source_directory.mkdir()
+    zip_directory = tmp_path / 'zip'
+    zip_directory.mkdir()
+    source_paths = []
+    for nr in range(20):
+        (zip_directory / f'SHARK_Test_2020_N{nr}_version_2020-01-01.zip').write_bytes(b'old')
+        path = source_directory / f'SHARK_Test_2020_N{nr}_version_2024-01-01.zip'
+        path.write_bytes(b'new' * 1000)
+        source_paths.append(path)
+
+    nr_listings = []
+    get_mapping = utils.get_zip_name_path_mapping
+
+    def count_listings(directory):
+        nr_listings.append(directory)
+        return get_mapping(directory)
+
+    monkeypatch.setattr(utils, 'get_zip_name_path_mapping', count_listings)
+    index = zip_index.ZipDirectoryIndex(zip_directory, index_directory=tmp_path / 'index')
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda path: copy_to_index(index, path), source_paths))
+
+    assert len(nr_listings) == 1
+    assert sorted(p.name for p in zip_directory.iterdir()) == sorted(p.name for p in source_paths)
+    assert index.mapping == {utils.get_zip_name_without_date(p.stem): zip_directory / p.name for p in source_paths}
+    assert len(nr_listings) == 1
+
+
+def test_changes_by_others_list_the_directory_again(tmp_path, monkeypatch):
+    zip_directory = tmp_path / 'zip'
+    zip_directory.mkdir()
+    index = zip_index.ZipDirectoryIndex(zip_directory, index_directory=tmp_path / 'index')
+    assert index.get('SHARK_Test_2020_N1_version_2024-01-01') is None
+    path = zip_directory / 'SHARK_Test_2020_N1_version_2020-01-01.zip'
+    path.write_bytes(b'old')
+    assert index.get('SHARK_Test_2020_N1_version_2024-01-01') == path